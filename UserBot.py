@@ -1,14 +1,19 @@
-import logging, pickle, os, asyncio, random
+import logging, pickle, os, asyncio, random, re, time
 from dataclasses import dataclass
 from typing import Optional, Dict
 
 from telethon import TelegramClient, events
 from telethon.tl.types import PeerUser, PeerChat, PeerChannel
 
-from ai.DeepSeek import DeepSeek
-from crm.AmoCRM import AmoCRM
+from ai.deepseek import DeepSeek
+from ai.job_queue import AIJobQueue, QueueFull
+from crm.amocrm import AmoCRM
+from crm.write_behind import CRMQueue
+from state_store import StateStore, SQLiteStateStore
+from timer_wheel import TimerWheel
+import metrics
 
-USERS_PICKLE = "users.pickle"
+USERS_PICKLE = "users.pickle"  # старый формат, переносится в базу при первом запуске
 
 NUDGE_LIST = [
     "Можем продолжить?",
@@ -17,19 +22,52 @@ NUDGE_LIST = [
     "Что-то не понравилось?",
 ]
 
+WAIT_NOTICE = "Много обращений, ответ уже готовится — напишу через пару минут."
+
+# признаки готовности купить: такие диалоги идут к ии вне очереди
+BUY_SIGNALS = re.compile(r"\b(куп|цен|стоим|оплат|заказ|прайс|тариф|сч[её]т)", re.IGNORECASE)
+
+# конец первого предложения: знак препинания и за ним пробел/перенос
+SENTENCE_END = re.compile(r"[.!?…]\s")
+
 @dataclass
 class UserState:
     session_id: Optional[str] = None
     next_parent_id: Optional[str] = None
+    account_id: Optional[str] = None  # аккаунт DeepSeek, создавший сессию
+    lead_created: bool = False  # сделка в crm уже заведена; не то же самое, что session_id
+    warmup_prompt: Optional[str] = None  # первый вопрос, ответ на который взят из кэша, пока сессии нет
     buffer: str = ""
-    debounce_task: Optional[asyncio.Task] = None
-    inactivity_task: Optional[asyncio.Task] = None
+    debounce_task: Optional[asyncio.Task] = None  # ответ ии, который сейчас готовится
+    warmup_task: Optional[asyncio.Task] = None  # сессия создаётся в фоне после ответа из кэша
+    wait_noticed: bool = False  # уже предупредили, что ответ задерживается
+    burst_started: float = 0.0  # когда пришло первое сообщение пачки, для метрики debounce
+
+class LegacyUnpickler(pickle.Unpickler):
+    """
+    users.pickle писался из main.py, когда UserState жил там: в файле класс
+    записан как __main__.UserState. Любой UserState отдаём текущим классом.
+    """
+
+    def find_class(self, module, name):
+        if name == "UserState" and module in ("__main__", "main", "UserBot"):
+            return UserState
+        return super().find_class(module, name)
 
 class UserBot():
-    def __init__(self, logger: logging, api_id: int, api_hash: str, session: str, debounce_seconds: int, inactivity_seconds: int, ai, crm):
+    def __init__(self, logger: logging, api_id: int, api_hash: str, session: str, debounce_seconds: int, inactivity_seconds: int, ai, crm,
+                 stream_replies: bool = False, stream_edit_seconds: float = 1.5,
+                 store: Optional[StateStore] = None,
+                 jobs: Optional[AIJobQueue] = None,
+                 crm_queue: Optional[CRMQueue] = None,
+                 priority_buy_signals: bool = True,
+                 client: Optional[TelegramClient] = None):
         self.logger = logger
-        self.users: Dict[int, UserState] = {} # user_id -> UserState
-        self.client = TelegramClient(
+        self.users: Dict[int, UserState] = {} # user_id -> UserState, только те, кто писал с момента запуска
+        # постоянное состояние (сессия, parent id, аккаунт) читается лениво, пишется по одному пользователю
+        self.store: StateStore = store or SQLiteStateStore(logger=logger)
+        # client можно подменить, например заглушкой в нагрузочном тесте
+        self.client = client or TelegramClient(
             session,
             api_id,
             api_hash,
@@ -41,29 +79,83 @@ class UserBot():
         )
         self.debounce_seconds = debounce_seconds
         self.inactivity_seconds = inactivity_seconds
+        # таймеры debounce и "вы ещё тут" всех пользователей живут в одном колесе, а не в задаче на каждого
+        self.timers = TimerWheel(logger=logger)
         self.ai: DeepSeek = ai
         self.crm: AmoCRM = crm
-        self.load_users()
+        # запись в crm идёт в фоне пачками и не задерживает ответ
+        self.crm_queue: CRMQueue = crm_queue or CRMQueue(crm, logger=logger)
+        # все обращения к ии идут через очередь: ограничение параллельности, один запрос на пользователя
+        self.jobs: AIJobQueue = jobs or AIJobQueue(logger=logger)
+        self.priority_buy_signals = priority_buy_signals
+        self.replying = 0  # ответов в работе; счётчик, а не обход self.users, чтобы его читал поток метрик
+        # стриминг: первое предложение сразу, дальше правим сообщение не чаще stream_edit_seconds
+        self.stream_replies = stream_replies
+        self.stream_edit_seconds = stream_edit_seconds
+        self.send_attempts = 3  # верхняя граница, реальное число повторов решает ai.retry_policy
+        self.migrate_pickle()
 
-    def load_users(self):
-        if os.path.exists(USERS_PICKLE):
+    def migrate_pickle(self):
+        """Переносит users.pickle в хранилище один раз, потом файл переименовывается"""
+        if not os.path.exists(USERS_PICKLE):
+            return
+        try:
+            with open(USERS_PICKLE, "rb") as f:
+                users = LegacyUnpickler(f).load()
+            # из старого состояния нужны только сессия и parent id; is_waiting, буфер и задачи отбрасываем
+            users = {
+                user_id: UserState(session_id=getattr(state, "session_id", None),
+                                   next_parent_id=getattr(state, "next_parent_id", None))
+                for user_id, state in users.items()
+            }
+            self.store.put_many((user_id, self.state_record(state)) for user_id, state in users.items())
+            os.replace(USERS_PICKLE, USERS_PICKLE + ".migrated")
+            self.logger.info("[UserBot] Users migrated from pickle: %d", len(users))
+        except Exception as e:
+            # файл не читается и не прочитается: убираем, чтобы ошибка не повторялась при каждом запуске
+            self.logger.error("[UserBot] Error migrating user state from pickle, renamed to %s.failed: %s",
+                              USERS_PICKLE, e)
             try:
-                with open(USERS_PICKLE, "rb") as f:
-                    users = pickle.load(f)
-                    self.logger.info("[UserBot] Users loaded from pickle: %d", len(users))
-            except Exception as e:
-                self.logger.error("[UserBot] Error loading user state from pickle: %s", e)
-                users = {}
-        else:
-            self.logger.info("[UserBot] State not found.")
-            users = {}
-
-    def save_users(self):
+                os.replace(USERS_PICKLE, USERS_PICKLE + ".failed")
+            except OSError as e:
+                self.logger.error("[UserBot] Failed to rename %s: %s", USERS_PICKLE, e)
+
+    def state_record(self, state: UserState) -> Dict:
+        if state.session_id:
+            state.account_id = self.ai.account_of(state.session_id) or state.account_id
+        return {
+            "session_id": state.session_id,
+            "next_parent_id": state.next_parent_id,
+            "account_id": state.account_id,
+            "lead_created": state.lead_created,
+        }
+
+    def load_user(self, user_id: int) -> UserState:
+        """Состояние пользователя: из памяти, иначе из хранилища (один запрос по ключу)"""
+        state = self.users.get(user_id)
+        if state is not None:
+            return state
+
+        state = UserState()
+        record = self.store.get(user_id)
+        if record is not None:
+            state.session_id = record["session_id"]
+            state.next_parent_id = record["next_parent_id"]
+            state.account_id = record["account_id"]
+            # записи до появления lead_created: сделка заводилась вместе с сессией
+            state.lead_created = bool(record.get("lead_created")) or bool(state.session_id)
+            if state.session_id:
+                # сессия должна продолжаться на том аккаунте, который её создал
+                self.ai.bind_session(state.session_id, record["account_id"])
+        self.users[user_id] = state
+        return state
+
+    def save_user(self, user_id: int):
+        """Ставит в очередь на запись только этого пользователя; коммит групповой"""
         try:
-            with open(USERS_PICKLE, "wb") as f:
-                pickle.dump(self.users, f)
+            self.store.put(user_id, self.state_record(self.users[user_id]))
         except Exception as e:
-            self.logger.error("[UserBot] Failed to save users: %s", e)
+            self.logger.error("[UserBot] Failed to save user %s: %s", user_id, e)
 
     def format_recommendations(self, text: str) -> str:
         lines = text.split("\n")
@@ -95,112 +187,329 @@ class UserBot():
 
     async def inactivity_nudge(self, entity, user_id: int):
         """
-        Ждём INACTIVITY_SECONDS после НАШЕГО ответа.
-        Если за это время не пришло новое входящее — отправляем "Ты еще тут".
-        Задача отменяется в обработчике при любом новом входящем сообщении.
+        Срабатывает через INACTIVITY_SECONDS после НАШЕГО ответа и отправляет "Ты еще тут".
+        Таймер снимается в обработчике при любом новом входящем сообщении.
         """
+        try:
+            with metrics.span("telegram_send"):
+                await self.client.send_message(entity, random.choice(NUDGE_LIST))
+        except Exception as e:
+            self.logger.error("[UserBot] Failed to nudge %s: %s", user_id, e)
+
+    async def notify_wait(self, entity, user_id: int):
+        """Ответ задерживается из-за очереди: предупреждаем один раз, а не молчим"""
         state = self.users[user_id]
+        if state.wait_noticed:
+            return
+        state.wait_noticed = True
         try:
-            await asyncio.sleep(self.inactivity_seconds)
-            await self.client.send_message(entity, random.choice(NUDGE_LIST))
-        except asyncio.CancelledError:
+            with metrics.span("telegram_send"):
+                await self.client.send_message(entity, WAIT_NOTICE)
+        except Exception as e:
+            self.logger.error("[UserBot] Failed to send wait notice to %s: %s", user_id, e)
+
+    def is_priority(self, prompt: str) -> bool:
+        return self.priority_buy_signals and BUY_SIGNALS.search(prompt) is not None
+
+    def create_lead(self, user_id: int):
+        """Заводит сделку один раз на пользователя, флаг сохраняется вместе с состоянием"""
+        if self.users[user_id].lead_created:
             return
-        finally:
-            state.inactivity_task = None
+        self.users[user_id].lead_created = True
+        self.crm_queue.create(user_id)
+
+    def fire_debounce(self, entity, user_id: int):
+        """Таймер debounce истёк: запускаем ответ; пока он готовится, новые сообщения копятся в буфере"""
+        state = self.users[user_id]
+        metrics.observe("debounce", time.monotonic() - state.burst_started)
+        state.debounce_task = asyncio.create_task(self.debounce_and_reply(entity, user_id))
+
+    async def stream_reply(self, entity, state: UserState, prompt: str) -> Dict:
+        """
+        Отправляет ответ ии по мере генерации: первое законченное предложение уходит сразу,
+        потом то же сообщение дописывается правками не чаще stream_edit_seconds.
+        """
+        response = {"next_parent_id": None, "content": ""}
+        parts = []
+        message = None
+        shown = ""
+        last_edit = 0.0
+        tail = ""  # последний символ уже полученного текста: знак и пробел часто приходят разными кусками
+
+        async for event in self.ai.send_stream(prompt, state.session_id, state.next_parent_id):
+            if event["type"] == "parent_id":
+                response["next_parent_id"] = event["next_parent_id"]
+                continue
+
+            parts.append(event["content"])
+
+            if message is None:
+                # ждём конца первого предложения: свежий кусок вместе с концом предыдущего
+                chunk = tail + event["content"]
+                tail = chunk[-1:]
+                if not SENTENCE_END.search(chunk):
+                    continue
+                shown = self.format_recommendations("".join(parts))
+                with metrics.span("telegram_send"):
+                    message = await self.client.send_message(entity, shown, parse_mode="html")
+                last_edit = time.monotonic()
+            elif time.monotonic() - last_edit >= self.stream_edit_seconds:
+                text = self.format_recommendations("".join(parts))
+                if text != shown:
+                    with metrics.span("telegram_send"):
+                        message = await self.client.edit_message(entity, message, text, parse_mode="html")
+                    shown = text
+                last_edit = time.monotonic()
+
+        response["content"] = "".join(parts)
+        text = self.format_recommendations(response["content"])
+
+        if message is None:
+            with metrics.span("telegram_send"):
+                await self.client.send_message(entity, text, parse_mode="html")
+        elif text != shown:
+            with metrics.span("telegram_send"):
+                await self.client.edit_message(entity, message, text, parse_mode="html")
+
+        return response
 
     async def debounce_and_reply(self, entity: PeerUser, user_id: int):
         """
-        Ждем DEBOUNCE_SECONDS без новых сообщений, затем отправляем в ии.
+        Вызывается через DEBOUNCE_SECONDS после первого сообщения пачки, отправляет накопленное в ии.
         После отправки ответа ставим таймер безответа на INACTIVITY_SECONDS если в нашем ответе был ?.
         """
         state = self.users[user_id]
+        requeued = False
+        # часть буфера, ушедшая в ии; что пришло позже, ждёт следующего ответа
+        sent = state.buffer
+        self.replying += 1
         try:
-            await asyncio.sleep(self.debounce_seconds)
-
             if not state.buffer.strip(): return
 
             # TODO: typing
 
-            if not state.session_id:
-                state.session_id, state.next_parent_id = await self.ai.create_thread()
-                self.crm.create_task(
-                    user_id,
-                )
+            if state.warmup_task is not None:
+                # сессия после ответа из кэша ещё догоняет первый вопрос, без неё потеряем контекст
+                await asyncio.shield(state.warmup_task)
+
+            sent = state.buffer
+            prompt = sent.strip()
+            first_turn = not state.session_id
+            # первое обращение вообще; после неудачного прогрева сессии нет, но диалог уже идёт
+            first_contact = first_turn and not state.lead_created
+            cached = self.ai.cached_reply(prompt) if first_contact else None
+
+            if cached is not None:
+                # отвечаем сразу, а сессию создаём в фоне
+                self.logger.info("[UserBot] Cached first reply for %s", user_id)
+                state.warmup_prompt = prompt
+                state.warmup_task = asyncio.create_task(self.warm_up_thread(user_id, prompt))
+                self.create_lead(user_id)
 
             response = {}
             is_error = False
-            for i in range(3):
-                self.logger.info(f"[UserBot][{state.session_id}] Attempt {i+1} of {3} to send message '{state.buffer.strip()}' to {entity} in session {state.session_id} with parent {state.next_parent_id}")
-                try:
-                    response = self.ai.send(state.buffer.strip(), state.session_id, state.next_parent_id)
-                    self.logger.info(f"[UserBot][{state.session_id}] Response: {response}")
+            if cached is not None:
+                response = {"content": cached}
+            else:
+                # ждём своей очереди к ии; при долгом ожидании пользователь получает предупреждение
+                async with self.jobs.slot(user_id, priority=self.is_priority(prompt),
+                                          on_wait=lambda: self.notify_wait(entity, user_id)):
+                    if first_turn and state.warmup_prompt is not None:
+                        # прогрев после ответа из кэша не удался: повторяем только его, сделка уже есть
+                        with metrics.span("create_thread"):
+                            state.session_id, state.next_parent_id = await self.ai.warm_thread(state.warmup_prompt)
+                        state.warmup_prompt = None
+                        state.account_id = self.ai.account_of(state.session_id)
+                    elif first_turn:
+                        with metrics.span("create_thread"):
+                            state.session_id, state.next_parent_id = await self.ai.create_thread()
+                        state.account_id = self.ai.account_of(state.session_id)
+                        self.create_lead(user_id)
+                    elif state.account_id:
+                        # ai помнит привязку только для последних сессий, восстанавливаем её из состояния
+                        self.ai.bind_session(state.session_id, state.account_id)
+
+                    if self.stream_replies:
+                        try:
+                            sent = state.buffer
+                            response = await self.stream_reply(entity, state, sent.strip())
+                        except Exception as e:
+                            self.logger.exception("[UserBot][%s] Stream error: %s", state.session_id, e)
+                            is_error = True
+                    else:
+                        # повторы согласованы с нижними слоями: общий бюджет, пауза с джиттером / Retry-After,
+                        # при открытом circuit breaker сразу сдаёмся
+                        policy = self.ai.retry_policy
+                        for attempt in range(1, self.send_attempts + 1):
+                            # полный текст и ответ только на DEBUG, форматирование ленивое
+                            sent = state.buffer
+                            message = sent.strip()
+                            self.logger.info("[UserBot][%s] Attempt %d of %d to send %d chars from user %s with parent %s",
+                                             state.session_id, attempt, self.send_attempts, len(message),
+                                             user_id, state.next_parent_id)
+                            self.logger.debug("[UserBot][%s] Message: %r", state.session_id, message)
+                            try:
+                                response = await self.ai.send(message, state.session_id, state.next_parent_id)
+                                self.logger.debug("[UserBot][%s] Response: %s", state.session_id, response)
                 
-                except Exception as e:
-                    self.logger.exception(f"[UserBot][{state.session_id}] Error: {str(e)})")
-                    self.crm.update_task(entity.user_id, status_name="error")
-                    is_error = True
-                    continue
+                            except Exception as e:
+                                self.logger.exception("[UserBot][%s] Error: %s", state.session_id, e)
+                                self.crm_queue.update(entity.user_id, status_name="error")
+                                is_error = True
+                                if not policy.should_retry(attempt, e, self.send_attempts):
+                                    break
+                                await asyncio.sleep(policy.backoff(attempt, e))
+                                continue
+
+                            if not response or "content" not in response:
+                                self.logger.warning("[UserBot][%s] Respounse is empty", state.session_id)
+                                if not policy.budget.try_withdraw():
+                                    break
+                                continue
+
+                            break
 
-                if not response or "content" not in response:
-                    self.logger.warning(f"[UserBot][{state.session_id}] Respounse is empty")
-                    continue
-                    
             if not response:
-                self.logger.error(f"[UserBot] AI is not response")
-                self.crm.update_task(entity.user_id, status_name="error")
-                state.buffer = ""
+                self.logger.error("[UserBot] AI is not response")
+                self.crm_queue.update(entity.user_id, status_name="error")
                 return
                 
             if is_error:
-                self.crm.update_task(entity.user_id, status_name="error")
+                self.crm_queue.update(entity.user_id, status_name="error")
                 
-            state.next_parent_id = response.get("next_parent_id")
+            if cached is None:
+                state.next_parent_id = response.get("next_parent_id")
+                if first_contact and not is_error:
+                    self.ai.remember_reply(prompt, response["content"])
+
             text = self.format_recommendations(response["content"])
-            await self.client.send_message(entity, text, parse_mode="html")
-            self.crm.update_task(entity.user_id, status_name="midle")
+            if cached is not None or not self.stream_replies:
+                with metrics.span("telegram_send"):
+                    await self.client.send_message(entity, text, parse_mode="html")
+            self.crm_queue.update(entity.user_id, status_name="midle")
 
-            if state.inactivity_task is not None:
-                state.inactivity_task.cancel()
-                state.inactivity_task = None
+            self.timers.cancel(("nudge", user_id))
+            state.wait_noticed = False
 
             if "?" in text:
-                state.inactivity_task = asyncio.create_task(self.inactivity_nudge(entity, user_id))
+                self.timers.schedule(("nudge", user_id), self.inactivity_seconds, self.inactivity_nudge, entity, user_id)
+
+        except QueueFull as e:
+            # очередь к ии забита: буфер сохраняем, предупреждаем и пробуем снова позже
+            self.logger.warning("[UserBot] AI queue is full, reply to %s postponed by %.0fs", user_id, e.retry_after)
+            requeued = True
+            self.timers.schedule(("debounce", user_id), e.retry_after, self.fire_debounce, entity, user_id)
+            await self.notify_wait(entity, user_id)
 
         finally:
-            state.buffer = ""
+            self.replying -= 1
             state.debounce_task = None
+            if not requeued:
+                # в стриминге пользователь видит начало ответа и может написать, пока ответ ещё идёт:
+                # убираем только отправленное, остаток получает свой таймер debounce
+                state.buffer = state.buffer[len(sent):].lstrip("\n") if state.buffer.startswith(sent) else ""
+                if state.buffer.strip() and ("debounce", user_id) not in self.timers:
+                    state.burst_started = time.monotonic()
+                    self.timers.schedule(("debounce", user_id), self.debounce_seconds, self.fire_debounce, entity, user_id)
             
-            if state.inactivity_task is None and state.debounce_task is None:
-                self.save_users()
+            if state.warmup_task is None:
+                self.save_user(user_id)
+
+    async def warm_up_thread(self, user_id: int, prompt: str):
+        """
+        Создаёт сессию для диалога, чей первый ответ взят из кэша.
+        Если не вышло — следующая реплика повторит только прогрев с тем же вопросом, сделку заново не заводит.
+        """
+        state = self.users[user_id]
+        try:
+            async with self.jobs.slot(user_id):
+                state.session_id, state.next_parent_id = await self.ai.warm_thread(prompt)
+            state.warmup_prompt = None
+        except QueueFull:
+            self.logger.warning("[UserBot] AI queue is full, skipping thread warm-up for %s", user_id)
+        except Exception as e:
+            self.logger.exception("[UserBot] Background thread warm-up failed: %s", e)
+        finally:
+            state.warmup_task = None
+            self.save_user(user_id)
                 
-    async def start(self):
-        await self.client.start()
-        me = await self.client.get_me()
-        self.logger.info("Logged in as %s", me.username or me.id)
+    async def on_message(self, event: events.NewMessage.Event):
+        """Обработчик входящих: копит сообщения в буфер и заводит таймер debounce"""
+        if event.out: return
 
-        @self.client.on(events.NewMessage(incoming=True))
-        async def handler(event: events.NewMessage.Event):
-            if event.out: return
+        user_id = self.get_peer_id(event)
+        
+        if user_id < 0: return
+        
+        entity = await event.get_input_chat()
 
-            user_id = self.get_peer_id(event)
-            
-            if user_id < 0: return
-            
-            entity = await event.get_input_chat()
+        state = self.load_user(user_id)
 
-            if user_id not in self.users:
-                self.users[user_id] = UserState()
+        self.timers.cancel(("nudge", user_id))
 
-            state = self.users[user_id]
+        msg_text = event.raw_text or ""
+        state.buffer += (("\n" if state.buffer else "") + msg_text)
 
-            if state.inactivity_task is not None:
-                state.inactivity_task.cancel()
-                state.inactivity_task = None
+        # окно debounce отсчитывается от первого сообщения пачки и не продлевается
+        if state.debounce_task is None and ("debounce", user_id) not in self.timers:
+            state.burst_started = time.monotonic()
+            self.timers.schedule(("debounce", user_id), self.debounce_seconds, self.fire_debounce, entity, user_id)
+
+    async def open(self):
+        """Запускает фоновые части бота (ии, хранилище, таймеры, очередь crm) без подключения к Telegram"""
+        await self.ai.start()
+        self.store.start()
+        self.timers.start()
+        self.crm_queue.start()
+        self.register_metrics()
+
+    def register_metrics(self):
+        """
+        Gauge для /metrics: читаются в момент запроса из потока сервера метрик,
+        поэтому только готовые счётчики и len(), без обхода словарей event loop.
+        """
+        metrics.gauge("userbot_active_users", "Users with a pending debounce or a reply in progress",
+                      lambda: self.timers.count("debounce") + self.replying)
+        metrics.gauge("userbot_debounce_pending", "Pending debounce timers", lambda: self.timers.count("debounce"))
+        metrics.gauge("userbot_ai_inflight", "AI jobs running", lambda: self.jobs.running)
+        metrics.gauge("userbot_ai_queue_depth", "AI jobs waiting for a slot", lambda: self.jobs.depth)
+        metrics.gauge("userbot_crm_pending", "Lead changes waiting to be written to amoCRM",
+                      lambda: self.crm_queue.stats()["pending"])
+        metrics.gauge("userbot_users_loaded", "User states held in memory", lambda: len(self.users))
 
-            msg_text = event.raw_text or ""
-            state.buffer += (("\n" if state.buffer else "") + msg_text)
+        # устойчивость DeepSeek: circuit breaker по аккаунтам и общий бюджет ретраев
+        resilience = self.ai.resilience_metrics
+        metrics.gauge("deepseek_breaker_open", "1 while the account's circuit breaker is open, 0.5 half-open",
+                      lambda: {account: {"open": 1, "half_open": 0.5}.get(breaker["state"], 0)
+                               for account, breaker in resilience()["breakers"].items()},
+                      label="account")
+        metrics.gauge("deepseek_breaker_failures", "Consecutive upstream failures per account",
+                      lambda: {account: breaker["consecutive_failures"]
+                               for account, breaker in resilience()["breakers"].items()},
+                      label="account")
+        metrics.gauge("deepseek_retry_budget_used", "Retries spent in the current budget window",
+                      lambda: resilience()["retry_budget"]["window_retries"])
+        metrics.gauge("deepseek_retry_budget_remaining", "Retries still allowed in the current budget window",
+                      lambda: max(resilience()["retry_budget"]["window_allowed"]
+                                  - resilience()["retry_budget"]["window_retries"], 0))
+        metrics.gauge("deepseek_retry_budget_rejected", "Retries refused by the budget since start",
+                      lambda: resilience()["retry_budget"]["total_rejected"])
 
-            if state.debounce_task is None:
-                state.debounce_task = asyncio.create_task(self.debounce_and_reply(entity, user_id))
+    async def close(self):
+        await self.timers.stop()
+        await self.crm_queue.close()
+        await self.store.close()
+        await self.ai.close()
 
-        await self.client.run_until_disconnected()
\ No newline at end of file
+    async def start(self):
+        await self.client.start()
+        await self.open()
+        me = await self.client.get_me()
+        self.logger.info("Logged in as %s", me.username or me.id)
+
+        self.client.add_event_handler(self.on_message, events.NewMessage(incoming=True))
+
+        try:
+            await self.client.run_until_disconnected()
+        finally:
+            await self.close()
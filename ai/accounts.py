@@ -0,0 +1,114 @@
+import hashlib
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Deque, Dict, List, Optional
+
+from dsk.api import AsyncDeepSeekAPI, AuthenticationError, RateLimitError
+
+
+def account_id(token: str) -> str:
+    """Короткий стабильный id аккаунта, чтобы не светить токен в логах и состоянии"""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()[:8]
+
+
+@dataclass
+class Account:
+    id: str
+    api: AsyncDeepSeekAPI
+    in_flight: int = 0
+    recent_429: Deque[float] = field(default_factory=deque)
+    cooldown_until: float = 0.0
+    disabled: bool = False  # токен отозван или истёк (401)
+
+    def is_healthy(self, now: float) -> bool:
+        return not self.disabled and self.cooldown_until <= now
+
+
+class AccountPool:
+    """
+    Несколько аккаунтов DeepSeek с учётом нагрузки.
+
+    Новые сессии получает наименее загруженный здоровый аккаунт. После 429
+    аккаунт уходит на паузу, которая растёт с числом 429 за последнее окно;
+    после 401 аккаунт выключается до перезапуска.
+    """
+
+    def __init__(self,
+                 tokens: List[str],
+                 api_factory: Callable[[str], AsyncDeepSeekAPI],
+                 cooldown: float = 30.0,
+                 rate_limit_window: float = 300.0,
+                 logger: Optional[logging.Logger] = None):
+        if not tokens:
+            raise AuthenticationError("No DeepSeek tokens provided")
+
+        self.logger: logging.Logger = logger or logging.getLogger(__name__)
+        self.cooldown = cooldown
+        self.rate_limit_window = rate_limit_window
+        self.accounts: Dict[str, Account] = {}
+        for token in tokens:
+            self.accounts.setdefault(account_id(token), Account(account_id(token), api_factory(token)))
+
+    def __iter__(self):
+        return iter(self.accounts.values())
+
+    def get(self, id: str) -> Optional[Account]:
+        return self.accounts.get(id)
+
+    def pick(self) -> Account:
+        """Наименее загруженный здоровый аккаунт; если все на паузе — тот, что освободится раньше"""
+        now = time.monotonic()
+        alive = [account for account in self.accounts.values() if not account.disabled]
+        if not alive:
+            raise AuthenticationError("All DeepSeek tokens are invalid or expired")
+
+        healthy = [account for account in alive if account.is_healthy(now)]
+        if healthy:
+            return min(healthy, key=lambda account: account.in_flight)
+        return min(alive, key=lambda account: account.cooldown_until)
+
+    def _record_429(self, account: Account, retry_after: Optional[float] = None) -> None:
+        now = time.monotonic()
+        account.recent_429.append(now)
+        while account.recent_429 and account.recent_429[0] < now - self.rate_limit_window:
+            account.recent_429.popleft()
+
+        # Retry-After от сервера важнее нашей оценки, если он длиннее
+        pause = max(self.cooldown * len(account.recent_429), retry_after or 0.0)
+        account.cooldown_until = now + pause
+        self.logger.warning("[AccountPool] Account %s rate limited, cooling down for %.0fs", account.id, pause)
+
+    @asynccontextmanager
+    async def use(self, account: Account) -> AsyncIterator[AsyncDeepSeekAPI]:
+        """Считает запрос в нагрузке аккаунта и учитывает 429/401"""
+        account.in_flight += 1
+        try:
+            yield account.api
+        except RateLimitError as e:
+            self._record_429(account, e.retry_after)
+            raise
+        except AuthenticationError:
+            account.disabled = True
+            self.logger.error("[AccountPool] Account %s disabled: authentication failed", account.id)
+            raise
+        finally:
+            account.in_flight -= 1
+
+    async def close(self) -> None:
+        for account in self.accounts.values():
+            await account.api.close()
+
+    def stats(self) -> Dict[str, Dict]:
+        now = time.monotonic()
+        return {
+            account.id: {
+                "in_flight": account.in_flight,
+                "recent_429": len(account.recent_429),
+                "cooldown_seconds": max(account.cooldown_until - now, 0.0),
+                "disabled": account.disabled,
+            }
+            for account in self.accounts.values()
+        }
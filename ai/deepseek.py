@@ -1,61 +1,243 @@
 import logging
 import asyncio
-from typing import Optional, Dict, Any, Callable
+from collections import OrderedDict
+from typing import Optional, Dict, Any, AsyncGenerator, Tuple, List, Union
 
 from ai.skeleton import Skeleton
+from ai.session_pool import SessionPool, prompt_hash
+from ai.response_cache import ResponseCache
+from ai.accounts import Account, AccountPool
+from dsk.pow import DeepSeekPOW, DeepSeekPOWPool
+from dsk.resilience import RetryBudget, RetryPolicy
 from dsk.api import (
-    DeepSeekAPI,
+    AsyncDeepSeekAPI,
     AuthenticationError,
     RateLimitError,
     NetworkError,
     APIError,
+    CircuitOpenError,
 )
 
 class DeepSeek(Skeleton):
-    def __init__(self, key: str, system_prompt: str = "", logger: Optional[logging.Logger] = None):
+    def __init__(self,
+                 key: Union[str, List[str]],
+                 system_prompt: str = "",
+                 logger: Optional[logging.Logger] = None,
+                 pool_size: int = 10,
+                 pow_pool_size: int = 0,
+                 pow_refill_interval: float = 0.5,
+                 pow_workers: int = 0,
+                 pow_backend: str = 'wasm',
+                 session_pool_size: int = 0,
+                 account_cooldown: float = 30.0,
+                 response_cache_size: int = 0,
+                 response_cache_ttl: float = 3600.0,
+                 session_map_size: int = 10000):
         self.logger: logging.Logger = logger or logging.getLogger(__name__)
-        self.api = DeepSeekAPI(key)
+        # pow_workers > 0 moves PoW solving onto a pool of processes
+        self.pow_solver = (
+            DeepSeekPOWPool(pow_workers, backend=pow_backend) if pow_workers > 0
+            else DeepSeekPOW(pow_backend)
+        )
+        # один бюджет ретраев на все слои (UserBot, этот класс, DeepSeekAPI) и все аккаунты
+        self.retry_budget = RetryBudget()
+        self.retry_policy = RetryPolicy(self.retry_budget, max_attempts=5, base_delay=1.0)
+
+        # несколько токенов = несколько аккаунтов; сессия всегда ходит через аккаунт, который её создал
+        self.accounts = AccountPool(
+            [key] if isinstance(key, str) else list(key),
+            lambda token: AsyncDeepSeekAPI(
+                token,
+                pool_size=pool_size,
+                pow_pool_size=pow_pool_size,
+                pow_refill_interval=pow_refill_interval,
+                pow_solver=self.pow_solver,
+                retry_budget=self.retry_budget,
+            ),
+            cooldown=account_cooldown,
+            logger=self.logger,
+        )
+        # session_id -> Account, последние session_map_size сессий; постоянная привязка хранится у UserBot
+        self._session_accounts: "OrderedDict[str, Account]" = OrderedDict()
+        self.session_map_size = session_map_size
         self.system_prompt = system_prompt
 
-        # настройки ретраев
-        self._max_retries = 5
-        self._base_backoff = 1  # секунды
+        # заранее прогретые сессии с применённым системным промтом
+        self.sessions: Optional[SessionPool] = (
+            SessionPool(self._new_thread, system_prompt, size=session_pool_size, logger=self.logger)
+            if session_pool_size > 0 else None
+        )
 
-    async def _to_thread(self, fn: Callable, *args, **kwargs):
-        """Запускает синхронный вызов API в отдельном треде без трюков с event loop."""
-        return await asyncio.to_thread(fn, *args, **kwargs)
+        # готовые ответы на частые первые вопросы (цена, сроки, "чем занимаетесь")
+        self.cache: Optional[ResponseCache] = (
+            ResponseCache(size=response_cache_size, ttl=response_cache_ttl)
+            if response_cache_size > 0 else None
+        )
 
-    async def _retryable(self, func: Callable, *args, **kwargs):
-        """Ретраит сеть/лимиты с экспоненциальной паузой; аутентификацию не ретраит."""
-        for attempt in range(1, self._max_retries + 1):
-            self.logger.info("[DeepSeek] Attempt %d/%d to call %s", attempt, self._max_retries, func.__name__)
+    async def _retryable(self, account: Account, method: str, *args, **kwargs):
+        """
+        Ретраит сеть/лимиты через общую RetryPolicy: пауза с джиттером или по Retry-After,
+        пока не кончится бюджет. Аутентификацию и открытый circuit breaker не ретраит.
+        """
+        attempt = 1
+        while True:
+            self.logger.info("[DeepSeek][%s] Attempt %d/%d to call %s", account.id, attempt, self.retry_policy.max_attempts, method)
             try:
-                return await self._to_thread(func, *args, **kwargs)
+                async with self.accounts.use(account) as api:
+                    return await getattr(api, method)(*args, **kwargs)
             except AuthenticationError as e:
                 self.logger.exception("[DeepSeek] Auth error on attempt %s: %s", attempt, e)
                 raise
+            except CircuitOpenError as e:
+                self.logger.warning("[DeepSeek][%s] %s, failing fast", account.id, e)
+                raise
             except (RateLimitError, NetworkError) as e:
-                if attempt == self._max_retries:
+                if not self.retry_policy.should_retry(attempt, e):
                     self.logger.exception("[DeepSeek] Failed after %s attempts: %s", attempt, e)
                     raise
-                sleep_for = self._base_backoff * (2 ** (attempt - 1))
+                sleep_for = self.retry_policy.backoff(attempt, e)
                 self.logger.warning("[DeepSeek] %s, retrying in %.2fs (attempt %d/%d)",
-                                    e.__class__.__name__, sleep_for, attempt, self._max_retries)
+                                    e.__class__.__name__, sleep_for, attempt, self.retry_policy.max_attempts)
                 await asyncio.sleep(sleep_for)
+                attempt += 1
             except APIError as e:
                 self.logger.exception("[DeepSeek] API error: %s", e)
                 raise
 
-    async def send(self, message: str, session_id: str, parent_id: Optional[str] = None) -> Dict[str, Any]:
-        return await self._retryable(self.api.chat_completion, session_id, message, parent_id)
+    async def start(self) -> None:
+        """Запускает фоновые задачи (прогрев сессий, продление cf_clearance); вызывать из работающего event loop."""
+        if self.sessions is not None:
+            self.sessions.start()
+        for account in self.accounts:
+            account.api.cookie_manager.start()
+
+    def set_system_prompt(self, system_prompt: str) -> None:
+        self.system_prompt = system_prompt
+        if self.sessions is not None:
+            self.sessions.set_system_prompt(system_prompt)
+
+    async def close(self) -> None:
+        if self.sessions is not None:
+            await self.sessions.stop()
+        for account in self.accounts:
+            account.api.cookie_manager.stop()
+        await self.accounts.close()
+        self.pow_solver.close()
+
+    def cached_reply(self, message: str) -> Optional[str]:
+        """Ответ из кэша на первый вопрос диалога, None если кэш выключен или промаха"""
+        if self.cache is None:
+            return None
+        return self.cache.get(prompt_hash(self.system_prompt), message)
+
+    def remember_reply(self, message: str, content: str) -> None:
+        """Запоминает ответ на первый вопрос диалога"""
+        if self.cache is not None:
+            self.cache.put(prompt_hash(self.system_prompt), message, content)
+
+    async def warm_thread(self, message: str) -> Tuple[str, Optional[str]]:
+        """
+        Сессия для диалога, первый ответ на который взят из кэша: вопрос всё равно
+        отправляется в DeepSeek, чтобы следующие реплики шли с контекстом.
+        """
+        session_id, parent_id = await self.create_thread()
+        response = await self.send(message, session_id, parent_id)
+        return session_id, response.get('next_parent_id')
+
+    def resilience_metrics(self) -> Dict[str, Any]:
+        """Расход бюджета ретраев и состояние circuit breaker по каждому аккаунту"""
+        return {
+            "retry_budget": self.retry_budget.metrics(),
+            "breakers": {account.id: account.api.breaker.metrics() for account in self.accounts},
+        }
+
+    def account_of(self, session_id: str) -> Optional[str]:
+        """id аккаунта, к которому привязана сессия (для сохранения между перезапусками)"""
+        account = self._session_accounts.get(session_id)
+        return account.id if account else None
+
+    def bind_session(self, session_id: str, account_id: Optional[str]) -> None:
+        """Восстанавливает привязку сессии к аккаунту после перезапуска"""
+        if account := self.accounts.get(account_id):
+            self._pin(session_id, account)
+
+    def _pin(self, session_id: str, account: Account) -> None:
+        self._session_accounts[session_id] = account
+        self._session_accounts.move_to_end(session_id)
+        while len(self._session_accounts) > self.session_map_size:
+            self._session_accounts.popitem(last=False)
 
-    async def create_thread(self) -> str:
-        session_id: str = await self._retryable(self.api.create_chat_session)
+    def _account_for(self, session_id: str) -> Account:
+        account = self._session_accounts.get(session_id)
+        if account is None:
+            # привязка потерялась (например, после перезапуска) — берём наименее загруженный
+            account = self.accounts.pick()
+            self.logger.warning("[DeepSeek] Session %s has no account, pinned to %s", session_id, account.id)
+        self._pin(session_id, account)
+        return account
 
-        if self.system_prompt:
+    async def send(self, message: str, session_id: str, parent_id: Optional[str] = None) -> Dict[str, Any]:
+        return await self._retryable(self._account_for(session_id), 'chat_completion', session_id, message, parent_id)
+
+    async def send_stream(self, message: str, session_id: str, parent_id: Optional[str] = None) -> AsyncGenerator[Dict[str, Any], None]:
+        """Стримит ответ по кускам; ретраит только пока ни одного события ещё не отдано."""
+        account = self._account_for(session_id)
+        attempt = 1
+        while True:
+            self.logger.info("[DeepSeek][%s] Attempt %d/%d to stream completion", account.id, attempt, self.retry_policy.max_attempts)
+            started = False
             try:
-                response = await self.send(self.system_prompt, session_id)
-            except Exception:
-                self.logger.exception("[DeepSeek] Failed to apply system prompt for session %s", session_id)
+                async with self.accounts.use(account) as api:
+                    async for event in api.chat_completion_stream(session_id, message, parent_id):
+                        started = True
+                        yield event
+                return
+            except CircuitOpenError as e:
+                self.logger.warning("[DeepSeek][%s] %s, failing fast", account.id, e)
+                raise
+            except (RateLimitError, NetworkError) as e:
+                # часть ответа уже ушла пользователю, повтор дал бы дубль
+                if started or not self.retry_policy.should_retry(attempt, e):
+                    self.logger.exception("[DeepSeek] Stream failed on attempt %s: %s", attempt, e)
+                    raise
+                sleep_for = self.retry_policy.backoff(attempt, e)
+                self.logger.warning("[DeepSeek] %s, retrying stream in %.2fs (attempt %d/%d)",
+                                    e.__class__.__name__, sleep_for, attempt, self.retry_policy.max_attempts)
+                await asyncio.sleep(sleep_for)
+                attempt += 1
+            except (AuthenticationError, APIError) as e:
+                self.logger.exception("[DeepSeek] Stream error: %s", e)
+                raise
+
+    async def _apply_prompt(self, session_id: str, system_prompt: str) -> Optional[str]:
+        """Отправляет системный промт в сессию, возвращает id ответа для следующего сообщения."""
+        if not system_prompt:
+            return None
+
+        response = await self.send(system_prompt, session_id)
+        return response['next_parent_id']
+
+    async def _create_session(self) -> str:
+        """Создаёт сессию на наименее загруженном аккаунте и привязывает её к нему."""
+        account = self.accounts.pick()
+        session_id: str = await self._retryable(account, 'create_chat_session')
+        self._pin(session_id, account)
+        return session_id
+
+    async def _new_thread(self, system_prompt: str) -> Tuple[str, Optional[str]]:
+        """Сессия для пула: ошибку промта пробрасываем, чтобы не положить в пул сессию без него."""
+        session_id = await self._create_session()
+        return session_id, await self._apply_prompt(session_id, system_prompt)
+
+    async def create_thread(self) -> Tuple[str, Optional[str]]:
+        if self.sessions is not None:
+            self.sessions.start()
+            return await self.sessions.acquire()
+
+        session_id = await self._create_session()
 
-        return session_id, response['next_parent_id']
+        try:
+            return session_id, await self._apply_prompt(session_id, self.system_prompt)
+        except Exception:
+            self.logger.exception("[DeepSeek] Failed to apply system prompt for session %s", session_id)
+            return session_id, None
@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import math
+import statistics
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Callable, Deque, Dict, Optional, Set
+
+import metrics
+
+
+class QueueFull(Exception):
+    """Очередь переполнена; повторить попытку через retry_after секунд"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"AI job queue is full, retry after {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("user_id", "future", "enqueued_at")
+
+    def __init__(self, user_id: int, future: asyncio.Future):
+        self.user_id = user_id
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+
+class AIJobQueue:
+    """
+    Очередь обращений к ии между UserBot и DeepSeek.
+
+    Одновременно выполняется не больше concurrency задач, у одного пользователя —
+    не больше одной (следующая ждёт, пока закончится предыдущая). Задачи с
+    priority (признаки покупки) обслуживаются раньше обычных, внутри класса —
+    в порядке поступления. Ждать могут не больше max_depth задач, остальным
+    сразу QueueFull с оценкой, когда повторить. Если задача ждёт дольше
+    notice_after, вызывается её on_wait — пользователю говорят, что ответ будет.
+    """
+
+    def __init__(self,
+                 concurrency: int = 4,
+                 max_depth: int = 200,
+                 notice_after: float = 10.0,
+                 history: int = 500,
+                 logger: Optional[logging.Logger] = None):
+        self.logger: logging.Logger = logger or logging.getLogger(__name__)
+        self.concurrency = concurrency
+        self.max_depth = max_depth
+        self.notice_after = notice_after
+
+        self._priority: Deque[_Waiter] = deque()
+        self._normal: Deque[_Waiter] = deque()
+        self._busy_users: Set[int] = set()
+        self._notices: Set[asyncio.Task] = set()
+        self.running = 0
+
+        self.durations: Deque[float] = deque(maxlen=history)
+        self.completed = 0
+        self.rejected = 0
+        self.noticed = 0
+        self.max_seen_depth = 0
+
+    @property
+    def depth(self) -> int:
+        return len(self._priority) + len(self._normal)
+
+    def retry_after(self) -> float:
+        typical = statistics.median(self.durations) if self.durations else 10.0
+        return max(1.0, math.ceil(typical * (self.depth + self.running) / self.concurrency))
+
+    @asynccontextmanager
+    async def slot(self, user_id: int, priority: bool = False, on_wait: Optional[Callable] = None):
+        """
+        Ждёт свободного места и держит его, пока выполняется тело `async with`.
+        on_wait — функция без аргументов (можно корутинную), вызывается один раз при долгом ожидании.
+        """
+        if self.depth >= self.max_depth:
+            self.rejected += 1
+            raise QueueFull(self.retry_after())
+
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(user_id, loop.create_future())
+        (self._priority if priority else self._normal).append(waiter)
+        self.max_seen_depth = max(self.max_seen_depth, self.depth)
+        self._dispatch()
+
+        notice = None
+        if on_wait is not None and not waiter.future.done():
+            notice = loop.call_later(self.notice_after, self._notify, on_wait)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # место уже выдано, но забрать его не успели
+                self._release(user_id)
+            else:
+                self._discard(waiter)
+            raise
+        finally:
+            if notice is not None:
+                notice.cancel()
+
+        # время от постановки в очередь до места: гистограмма ai_queue_wait на /metrics
+        metrics.observe("ai_queue_wait", time.monotonic() - waiter.enqueued_at)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.durations.append(time.monotonic() - start)
+            self.completed += 1
+            self._release(user_id)
+
+    def _dispatch(self) -> None:
+        """Выдаёт свободные места первым в очереди, чей пользователь сейчас не занят"""
+        for queue in (self._priority, self._normal):
+            if self.running >= self.concurrency:
+                return
+            for waiter in list(queue):
+                if self.running >= self.concurrency:
+                    return
+                if waiter.user_id in self._busy_users:
+                    continue
+                queue.remove(waiter)
+                self.running += 1
+                self._busy_users.add(waiter.user_id)
+                waiter.future.set_result(None)
+
+    def _release(self, user_id: int) -> None:
+        self.running -= 1
+        self._busy_users.discard(user_id)
+        self._dispatch()
+
+    def _discard(self, waiter: _Waiter) -> None:
+        for queue in (self._priority, self._normal):
+            try:
+                queue.remove(waiter)
+                return
+            except ValueError:
+                continue
+
+    def _notify(self, on_wait: Callable) -> None:
+        self.noticed += 1
+        try:
+            result = on_wait()
+        except Exception:
+            self.logger.exception("[AIJobQueue] Wait notice failed")
+            return
+        if asyncio.iscoroutine(result):
+            task = asyncio.create_task(result)
+            self._notices.add(task)
+            task.add_done_callback(self._notices.discard)
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        """Счётчики очереди; распределение ожидания — в metrics (этап ai_queue_wait)"""
+        return {
+            "concurrency": self.concurrency,
+            "running": self.running,
+            "queue_depth": self.depth,
+            "priority_depth": len(self._priority),
+            "max_depth_seen": self.max_seen_depth,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "noticed": self.noticed,
+        }
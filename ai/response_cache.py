@@ -0,0 +1,86 @@
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+_PUNCTUATION = re.compile(r"[^\w\s]+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_prompt(text: str) -> str:
+    """Приводит первый вопрос к каноничному виду: регистр, пунктуация, пробелы, ё/е"""
+    text = text.lower().replace("ё", "е")
+    text = _PUNCTUATION.sub(" ", text)
+    return _SPACES.sub(" ", text).strip()
+
+
+class ResponseCache:
+    """
+    LRU-кэш ответов на первый вопрос диалога с TTL.
+
+    Ключ — хэш системного промта и нормализованный текст вопроса, так что
+    после смены промта старые ответы просто перестают находиться и со временем
+    вытесняются. Кэшируются только первые реплики: дальше ответ зависит от
+    истории диалога.
+    """
+
+    def __init__(self, size: int = 256, ttl: float = 3600.0, max_prompt_length: int = 200):
+        self.size = size
+        self.ttl = ttl
+        self.max_prompt_length = max_prompt_length  # длинные сообщения почти никогда не повторяются
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, str]]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def _key(self, prompt_hash: str, prompt: str) -> Optional[Tuple[str, str]]:
+        normalized = normalize_prompt(prompt)
+        if not normalized or len(normalized) > self.max_prompt_length:
+            return None
+        return prompt_hash, normalized
+
+    def get(self, prompt_hash: str, prompt: str) -> Optional[str]:
+        key = self._key(prompt_hash, prompt)
+        entry = self._entries.get(key) if key else None
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        stored_at, content = entry
+        if time.monotonic() - stored_at > self.ttl:
+            del self._entries[key]
+            self.expired += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return content
+
+    def put(self, prompt_hash: str, prompt: str, content: str) -> None:
+        key = self._key(prompt_hash, prompt)
+        if key is None or not content:
+            return
+
+        self._entries[key] = (time.monotonic(), content)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expired": self.expired,
+        }
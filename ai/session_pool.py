@@ -0,0 +1,110 @@
+import asyncio
+import hashlib
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+Thread = Tuple[str, Optional[str]]  # (session_id, next_parent_id)
+
+
+def prompt_hash(system_prompt: str) -> str:
+    return hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:16]
+
+
+class SessionPool:
+    """
+    Держит наготове чат-сессии с уже применённым системным промтом.
+
+    Фоновая задача создаёт сессии заранее, новый пользователь забирает готовую
+    пару (session_id, next_parent_id) без трёх последовательных запросов.
+    Пул привязан к хэшу промта: после смены промта старые сессии выбрасываются.
+    """
+
+    def __init__(self,
+                 factory: Callable[[str], Awaitable[Thread]],
+                 system_prompt: str,
+                 size: int = 2,
+                 retry_interval: float = 5.0,
+                 logger: Optional[logging.Logger] = None):
+        self.logger: logging.Logger = logger or logging.getLogger(__name__)
+        self._factory = factory
+        self.size = size
+        self.retry_interval = retry_interval
+
+        self.system_prompt = system_prompt
+        self.prompt_hash = prompt_hash(system_prompt)
+        self._ready: Dict[str, Deque[Thread]] = {self.prompt_hash: deque()}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        self.hits = 0
+        self.misses = 0
+
+    def start(self) -> None:
+        """Запускает фоновое пополнение, повторный вызов ничего не делает"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refill_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def set_system_prompt(self, system_prompt: str) -> None:
+        """Меняет промт; готовые сессии со старым промтом больше не выдаются"""
+        new_hash = prompt_hash(system_prompt)
+        if new_hash == self.prompt_hash:
+            return
+
+        dropped = len(self._ready.get(self.prompt_hash, ()))
+        self.system_prompt = system_prompt
+        self.prompt_hash = new_hash
+        self._ready = {new_hash: deque()}
+        self._wakeup.set()
+        self.logger.info("[SessionPool] System prompt changed, dropped %d warm sessions", dropped)
+
+    async def acquire(self) -> Thread:
+        """Отдаёт готовую сессию, а если пул пуст — создаёт её на месте"""
+        ready = self._ready[self.prompt_hash]
+        self._wakeup.set()
+
+        if ready:
+            self.hits += 1
+            return ready.popleft()
+
+        self.misses += 1
+        return await self._factory(self.system_prompt)
+
+    async def _refill_loop(self) -> None:
+        while True:
+            current_hash = self.prompt_hash
+            ready = self._ready[current_hash]
+
+            if len(ready) >= self.size:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            try:
+                thread = await self._factory(self.system_prompt)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.logger.exception("[SessionPool] Failed to warm up a session")
+                await asyncio.sleep(self.retry_interval)
+                continue
+
+            # промт могли сменить, пока сессия создавалась
+            if current_hash == self.prompt_hash:
+                ready.append(thread)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "ready": len(self._ready[self.prompt_hash]),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
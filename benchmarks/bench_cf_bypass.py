@@ -0,0 +1,153 @@
+"""
+Turnstile bypass benchmark against a local, challenge-like static page.
+
+The page copies the structure CloudflareBypasser has to get through: a
+"Just a moment..." title, a widget host with a closed shadow root, an iframe
+whose body has another closed shadow root with the checkbox, plus `--decoys`
+nested elements the recursive search has to walk. Clicking the checkbox
+changes the title after `--clear-ms`, like a solved challenge.
+
+Compares the original locator (input scan, recursive shadow-root search) and
+its fixed 2 s polling with the JS locator and title-change wait, and prints
+the per-phase timings. Needs Chromium and DrissionPage.
+
+Run from the repository root:
+    python -m benchmarks.bench_cf_bypass [--decoys 2000] [--repeat 5] [--clear-ms 300]
+"""
+
+import argparse
+import http.server
+import statistics
+import threading
+import time
+
+from DrissionPage import ChromiumOptions, ChromiumPage
+
+from dsk.CloudflareBypasser import CloudflareBypasser
+
+PAGE = """<!DOCTYPE html>
+<html><head><title>Just a moment...</title></head>
+<body>
+{decoys}
+<div id="host">{hidden_input}</div>
+<script>
+const root = document.getElementById('host').attachShadow({{mode: 'closed'}});
+const frame = document.createElement('iframe');
+frame.src = '/challenges.cloudflare.com/turnstile';
+root.appendChild(frame);
+window.addEventListener('message', e => {{
+    if (e.data === 'clicked') setTimeout(() => {{ document.title = 'DeepSeek'; }}, {clear_ms});
+}});
+</script>
+</body></html>"""
+
+WIDGET = """<!DOCTYPE html>
+<html><body><script>
+const root = document.body.attachShadow({mode: 'closed'});
+const box = document.createElement('input');
+box.type = 'checkbox';
+box.onclick = () => parent.postMessage('clicked', '*');
+root.appendChild(box);
+</script></body></html>"""
+
+
+class LegacyCloudflareBypasser(CloudflareBypasser):
+    """Locator and polling as they were before the JS locator"""
+
+    def locate_cf_button(self):
+        button = None
+        eles = self.driver.eles("tag:input")
+        for ele in eles:
+            if "name" in ele.attrs.keys() and "type" in ele.attrs.keys():
+                if "turnstile" in ele.attrs["name"] and ele.attrs["type"] == "hidden":
+                    button = ele.parent().shadow_root.child()("tag:body").shadow_root("tag:input")
+                    break
+
+        if button:
+            return button
+        ele = self.driver.ele("tag:body")
+        iframe = self.search_recursively_shadow_root_with_iframe(ele)
+        if iframe:
+            button = self.search_recursively_shadow_root_with_cf_input(iframe("tag:body"))
+        return button
+
+    def wait_cleared(self):
+        with self.timed("clear"):
+            time.sleep(2)
+
+
+def decoys(count: int, depth: int = 5) -> str:
+    """`count` elements grouped in nested chains, so the recursive search has a real tree to walk"""
+    chains = count // depth
+    return "\n".join("<div>" * depth + f"item {i}" + "</div>" * depth for i in range(chains))
+
+
+def serve(pages: dict) -> http.server.ThreadingHTTPServer:
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            body = pages.get(self.path.split("?")[0])
+            if body is None:
+                self.send_error(404)
+                return
+            body = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("content-type", "text/html; charset=utf-8")
+            self.send_header("content-length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run(bypasser_cls, driver: ChromiumPage, url: str, repeat: int) -> dict:
+    runs = []
+    for _ in range(repeat):
+        bypasser = bypasser_cls(driver, max_retries=3, log=False)
+        bypasser.load(url)
+        bypasser.bypass()
+        if not bypasser.is_bypassed():
+            raise RuntimeError(f"{bypasser_cls.__name__} did not clear {url}")
+        runs.append(bypasser.timings)
+    phases = ("load", "locate", "click", "clear")
+    return {phase: statistics.median(timings.get(phase, 0.0) for timings in runs) * 1000 for phase in phases}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Turnstile bypass benchmark")
+    parser.add_argument("--decoys", type=int, default=2000, help="Extra elements on the page")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per case, the median is reported")
+    parser.add_argument("--clear-ms", type=int, default=300, help="Delay between the click and the title change")
+    parser.add_argument("--headless", action="store_true", help="Run Chromium headless")
+    args = parser.parse_args()
+
+    filler = decoys(args.decoys)
+    hidden_input = '<input type="hidden" name="cf-turnstile-response">'
+    server = serve({
+        "/with-input": PAGE.format(decoys=filler, hidden_input=hidden_input, clear_ms=args.clear_ms),
+        "/iframe-only": PAGE.format(decoys=filler, hidden_input="", clear_ms=args.clear_ms),
+        "/challenges.cloudflare.com/turnstile": WIDGET,
+    })
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    options = ChromiumOptions().auto_port()
+    options.headless(args.headless)
+    driver = ChromiumPage(addr_or_opts=options)
+
+    try:
+        print(f"{'page':>12} {'locator':>8} {'load ms':>9} {'locate ms':>10} {'click ms':>9} {'clear ms':>9}")
+        for page in ("with-input", "iframe-only"):
+            for name, cls in (("legacy", LegacyCloudflareBypasser), ("js", CloudflareBypasser)):
+                t = run(cls, driver, f"{base}/{page}", args.repeat)
+                print(f"{page:>12} {name:>8} {t['load']:>9.1f} {t['locate']:>10.1f} {t['click']:>9.1f} {t['clear']:>9.1f}")
+    finally:
+        driver.quit()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""
+Microbenchmarks for the dsk client hot paths, with JSON output for regression tracking.
+
+Cases (no network, the completion stream is the recorded fixture):
+  pow.hash_v1                       one DeepSeekHashV1 digest
+  pow.calculate_hash[d=N]           full scan up to difficulty N (answer at the end)
+  pow.solve_challenge[d=N]          DeepSeekPOW.solve_challenge incl. JSON/base64 encoding
+  api.get_headers / [pow]           _get_headers without / with a PoW response
+  api.validate_chunk[lines=N]       _validate_chunk over every line of a stream
+  api.chat_completion[deltas=N]     DeepSeekAPI.chat_completion over a stream cut into
+                                    socket-sized chunks (SSEParser + event accumulation)
+  api.construct                     DeepSeekAPI(...) with a shared solver
+  api.construct[own solver]         DeepSeekAPI(...) building its own DeepSeekPOW
+  startup.import_and_construct      fresh interpreter: import dsk.api + first client
+
+Every case reports the min and median time per operation over `--repeat`
+runs in microseconds. `--output` writes the JSON report, `--compare` reads an
+older one and exits with status 1 if any case got slower than `--threshold`.
+
+Run from the repository root:
+    python -m benchmarks.bench_dsk [--output dsk.json] [--compare baseline.json]
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional, Tuple
+from unittest import mock
+
+import wasmtime
+
+from dsk import api as dsk_api
+from dsk.api import DeepSeekAPI
+from dsk.pow import DeepSeekPOW, create_hasher
+
+from benchmarks.bench_sse import FIXTURE, build_stream, chunked
+
+SALT      = "bench_salt"
+EXPIRE_AT = 1700000000000
+TOKEN     = "bench-token"
+
+STARTUP_SCRIPT = """
+import json, time
+started = time.perf_counter()
+from dsk.api import DeepSeekAPI
+DeepSeekAPI("bench-token")
+print(json.dumps(time.perf_counter() - started))
+"""
+
+
+class StreamResponse:
+    """What DeepSeekAPI.chat_completion_stream reads from curl_cffi: status and iter_content"""
+
+    status_code = 200
+
+    def __init__(self, chunks: list):
+        self._chunks = chunks
+
+    def iter_content(self):
+        return iter(self._chunks)
+
+    def close(self) -> None:
+        pass
+
+
+class FixedSolver:
+    """Keeps PoW out of the stream cases, it has cases of its own"""
+
+    def solve_challenge(self, config) -> str:
+        return "pow"
+
+
+def measure(fn: Callable[[], object], repeat: int, min_time: float) -> Dict[str, float]:
+    """Per-call time in µs; loops per run grow until one run takes at least min_time"""
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time or loops >= 1 << 20:
+            break
+        loops *= 2
+
+    runs = [elapsed / loops]
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        runs.append((time.perf_counter() - started) / loops)
+
+    return {
+        "min_us": min(runs) * 1e6,
+        "median_us": statistics.median(runs) * 1e6,
+        "loops": loops,
+        "repeat": repeat,
+    }
+
+
+def startup_cost(repeat: int) -> Dict[str, float]:
+    """Import + first client in a fresh interpreter, so module and wasm caches start cold"""
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT], capture_output=True, text=True, check=True)
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {"min_us": min(runs) * 1e6, "median_us": statistics.median(runs) * 1e6, "loops": 1, "repeat": repeat}
+
+
+def build_cases(args) -> Tuple[Dict[str, Callable[[], object]], Dict[str, list]]:
+    """Returns the cases and, for the chat_completion ones, the chunks the stubbed post should stream"""
+    hasher  = create_hasher("wasm")
+    solver  = DeepSeekPOW()
+    cases: Dict[str, Callable[[], object]] = {}
+    streams: Dict[str, list] = {}
+
+    cases["pow.hash_v1"] = lambda: hasher.hash_v1(f"{SALT}_{EXPIRE_AT}_12345")
+
+    for difficulty in args.difficulties:
+        answer    = difficulty - 1
+        challenge = hasher.hash_v1(f"{SALT}_{EXPIRE_AT}_{answer}")
+        config    = {
+            "algorithm": "DeepSeekHashV1",
+            "challenge": challenge,
+            "salt": SALT,
+            "difficulty": difficulty,
+            "expire_at": EXPIRE_AT,
+            "signature": "bench",
+            "target_path": "/api/v0/chat/completion",
+        }
+        assert hasher.calculate_hash("DeepSeekHashV1", challenge, SALT, difficulty, EXPIRE_AT) == answer
+        cases[f"pow.calculate_hash[d={difficulty}]"] = (
+            lambda c=challenge, d=difficulty: hasher.calculate_hash("DeepSeekHashV1", c, SALT, d, EXPIRE_AT)
+        )
+        cases[f"pow.solve_challenge[d={difficulty}]"] = lambda c=config: solver.solve_challenge(c)
+
+    client = DeepSeekAPI(TOKEN, pow_solver=FixedSolver())
+    client._get_pow_challenge = lambda: None  # network round trip, not part of the stream loop
+    pow_response = solver.solve_challenge(config)
+    cases["api.get_headers"] = lambda: client._get_headers()
+    cases["api.get_headers[pow]"] = lambda: client._get_headers(pow_response)
+
+    recorded = FIXTURE.read_bytes()
+    for scale in args.scales:
+        stream = build_stream(recorded, scale)
+        lines  = stream.splitlines()
+        deltas = stream.count(b'data: {"v":"') + 1
+
+        def validate_all(lines=lines):
+            for line in lines:
+                client._validate_chunk(line)
+
+        cases[f"api.validate_chunk[lines={len(lines)}]"] = validate_all
+
+        name = f"api.chat_completion[deltas={deltas}]"
+        cases[name] = lambda: client.chat_completion("session", "prompt")
+        streams[name] = chunked(stream, args.chunk_size)
+
+    cases["api.construct"] = lambda: DeepSeekAPI(TOKEN, pow_solver=solver)
+    cases["api.construct[own solver]"] = lambda: DeepSeekAPI(TOKEN)
+    return cases, streams
+
+
+def run(args) -> Dict:
+    cases, streams = build_cases(args)
+    results = {}
+
+    for name, fn in cases.items():
+        if args.only and not any(part in name for part in args.only):
+            continue
+        chunks = streams.get(name)
+        if chunks is not None:
+            # the stub stays in place for the whole measurement so patching is not timed
+            with mock.patch.object(dsk_api.requests, "post", lambda *a, chunks=chunks, **k: StreamResponse(chunks)):
+                results[name] = measure(fn, args.repeat, args.min_time)
+        else:
+            results[name] = measure(fn, args.repeat, args.min_time)
+        print(f"{name:<44} {results[name]['min_us']:>14.2f} µs", file=sys.stderr)
+
+    if not args.only or any(part in "startup.import_and_construct" for part in args.only):
+        results["startup.import_and_construct"] = startup_cost(args.startup_repeat)
+        print(f"{'startup.import_and_construct':<44} {results['startup.import_and_construct']['min_us']:>14.2f} µs",
+              file=sys.stderr)
+
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "wasmtime": getattr(wasmtime, "__version__", None),
+            "chunk_size": args.chunk_size,
+        },
+        "results": results,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report: Dict, baseline: Dict, threshold: float) -> bool:
+    """Prints the change of every case present in both reports, returns False on a regression"""
+    ok = True
+    print(f"\n{'case':<44} {'baseline µs':>14} {'now µs':>14} {'change':>8}", file=sys.stderr)
+    for name, now in report["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if before is None:
+            continue
+        change = now["min_us"] / before["min_us"] - 1
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            ok = False
+        print(f"{name:<44} {before['min_us']:>14.2f} {now['min_us']:>14.2f} {change:>+7.1%}{flag}", file=sys.stderr)
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="dsk hot path microbenchmarks")
+    parser.add_argument("--difficulties", type=int, nargs="+", default=[1000, 10000, 144000])
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100],
+                        help="Repeats of the recorded deltas per stream")
+    parser.add_argument("--chunk-size", type=int, default=1024, help="Bytes per simulated socket read")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per case")
+    parser.add_argument("--min-time", type=float, default=0.05, help="Seconds one run should take at least")
+    parser.add_argument("--startup-repeat", type=int, default=3, help="Fresh interpreters for the startup case")
+    parser.add_argument("--only", nargs="+", help="Run only cases whose name contains one of these")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed slowdown before failing --compare")
+    args = parser.parse_args()
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if not compare(report, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+End-to-end load test: UserBot + ai.DeepSeek + crm.AmoCRM against local stand-ins.
+
+Starts FakeDeepSeek and FakeAmoCRM (benchmarks/stand_ins.py), builds the
+real UserBot, DeepSeek and AmoCRM on top of them with a FakeTelegram
+client, then drives `--users` simulated users through UserBot.on_message.
+Users arrive over `--ramp` seconds; each turn is a burst of 1..`--burst`
+messages with exponential gaps, then the user waits for the reply and
+thinks before the next turn.
+
+Reports throughput, time-to-first-reply (from the first message of a turn,
+so it includes the debounce window) and event-loop lag, plus the AI queue,
+CRM queue and stand-in request counters.
+
+Both reply modes run by default, plain (whole answer at once) and stream
+(first sentence early, then edits), since they take different paths through
+UserBot. A turn that gets no reply within `--timeout` is a lost turn: the
+run prints a warning and exits with status 1.
+
+Run from the repository root:
+    python -m benchmarks.bench_e2e [--users 200] [--turns 3] [--debounce 1.0] [--modes plain stream]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import metrics
+from ai.deepseek import DeepSeek
+from ai.job_queue import AIJobQueue
+from crm.amocrm import AmoCRM
+from crm.lead_index import LeadIndex
+from crm.write_behind import CRMQueue
+from state_store import SQLiteStateStore
+from UserBot import NUDGE_LIST, WAIT_NOTICE, UserBot
+
+from benchmarks.stand_ins import FakeAmoCRM, FakeDeepSeek, FakeTelegram, measure_loop_lag
+
+MESSAGES = [
+    "Здравствуйте",
+    "Посоветуйте что-нибудь почитать",
+    "Люблю фантастику",
+    "А сколько стоит доставка?",
+    "Хочу купить пару книг",
+    "Спасибо",
+]
+
+
+class Driver:
+    """Feeds synthetic users into UserBot and timestamps the replies they get"""
+
+    def __init__(self, bot: UserBot, args):
+        self.bot = bot
+        self.args = args
+        self.waiting: Dict[int, asyncio.Future] = {}
+        self.ttfr: List[float] = []
+        self.timeouts = 0
+        self.notices = 0
+        self.nudges = 0
+
+    def on_sent(self, user_id: int, text: str, at: float) -> None:
+        if text == WAIT_NOTICE:
+            self.notices += 1
+            return
+        if text in NUDGE_LIST:
+            self.nudges += 1
+            return
+        future = self.waiting.get(user_id)
+        if future is not None and not future.done():
+            future.set_result(at)
+
+    async def user(self, user_id: int) -> None:
+        args = self.args
+        await asyncio.sleep(random.uniform(0, args.ramp))
+        loop = asyncio.get_running_loop()
+
+        for _ in range(args.turns):
+            reply = self.waiting[user_id] = loop.create_future()
+            started = time.perf_counter()
+            for i in range(random.randint(1, args.burst)):
+                if i:
+                    await asyncio.sleep(random.expovariate(1 / args.gap))
+                await self.bot.on_message(FakeTelegram.new_message(user_id, random.choice(MESSAGES)))
+
+            try:
+                replied_at = await asyncio.wait_for(reply, args.timeout)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                return
+            self.ttfr.append(replied_at - started)
+            await asyncio.sleep(random.expovariate(1 / args.think))
+
+
+def fmt_ms(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value * 1000:.0f} ms"
+
+
+def summary(values: List[float]) -> str:
+    """p50/p95/p99/max of raw samples"""
+    if not values:
+        return "-"
+    cuts = statistics.quantiles(values, n=100, method="inclusive") if len(values) > 1 else values * 99
+    return f"p50 {fmt_ms(cuts[49])}, p95 {fmt_ms(cuts[94])}, p99 {fmt_ms(cuts[98])}, max {fmt_ms(max(values))}"
+
+
+def stage_summary(stage: str) -> str:
+    """p50/p95 of a stage the bot records into metrics, estimated from the histogram buckets"""
+    return f"p50 {fmt_ms(metrics.quantile(stage, 0.5))}, p95 {fmt_ms(metrics.quantile(stage, 0.95))}"
+
+
+async def run(args, stream: bool) -> int:
+    """One load test in the given reply mode, returns the number of timed out turns"""
+    # the bot migrates users.pickle and creates users.db in the working directory,
+    # keep it away from the real ones
+    os.chdir(tempfile.mkdtemp(prefix="bench_e2e_"))
+    # stage timings are process-wide, each mode reports its own
+    metrics.registry.stages.clear()
+
+    deepseek = FakeDeepSeek(args.ds_latency, args.token_rate, args.reply_tokens, args.difficulty).start()
+    amocrm = FakeAmoCRM(args.crm_latency).start()
+    deepseek.install()
+    amocrm.install()
+
+    logger = logging.getLogger("bench_e2e")
+    logger.setLevel(logging.WARNING)
+
+    telegram = FakeTelegram()
+    crm = AmoCRM("local", "local", "local", "http://localhost", amocrm.pipeline_id, lead_index=LeadIndex(":memory:"))
+    ai = DeepSeek(
+        [f"local-{i}" for i in range(args.accounts)],
+        "system prompt",
+        logger=logger,
+        pow_pool_size=args.pow_pool_size,
+        session_pool_size=args.session_pool_size,
+    )
+    bot = UserBot(
+        logger=logger,
+        api_id=0,
+        api_hash="",
+        session="bench",
+        debounce_seconds=args.debounce,
+        inactivity_seconds=args.inactivity,
+        ai=ai,
+        crm=crm,
+        stream_replies=stream,
+        store=SQLiteStateStore(":memory:", logger=logger),
+        jobs=AIJobQueue(args.ai_concurrency, args.ai_queue_depth, args.wait_notice, logger=logger),
+        crm_queue=CRMQueue(crm, logger=logger),
+        client=telegram,
+    )
+    driver = Driver(bot, args)
+    telegram.on_message = driver.on_sent
+
+    lag: List[float] = []
+    await bot.open()
+    monitor = asyncio.create_task(measure_loop_lag(lag))
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(driver.user(user_id) for user_id in range(1, args.users + 1)))
+        elapsed = time.perf_counter() - start
+    finally:
+        monitor.cancel()
+        jobs = bot.jobs.stats()
+        await bot.close()
+        crm_stats = bot.crm_queue.stats()
+        deepseek.stop()
+        amocrm.stop()
+
+    replies = len(driver.ttfr)
+    print(f"\n[{'stream' if stream else 'plain'}]")
+    print(f"users {args.users}, turns {args.turns}, replies {replies}, timeouts {driver.timeouts}, "
+          f"wait notices {driver.notices}, nudges {driver.nudges}")
+    print(f"wall {elapsed:.1f} s, throughput {replies / elapsed:.1f} replies/s")
+    print(f"time to first reply: {summary(driver.ttfr)}")
+    print(f"event loop lag: {summary(lag)}")
+    print(f"ai queue: {jobs}, wait {stage_summary('ai_queue_wait')}")
+    print(f"crm queue: {crm_stats}, flush {stage_summary('crm_flush')}")
+    print(f"deepseek requests: {dict(deepseek.requests)}")
+    print(f"amocrm requests: {dict(amocrm.requests)}")
+    return driver.timeouts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="UserBot end-to-end load test")
+    parser.add_argument("--users", type=int, default=200, help="Simulated users")
+    parser.add_argument("--turns", type=int, default=3, help="Turns per user")
+    parser.add_argument("--burst", type=int, default=3, help="Max messages per turn")
+    parser.add_argument("--gap", type=float, default=0.3, help="Mean seconds between messages of a burst")
+    parser.add_argument("--think", type=float, default=2.0, help="Mean seconds between a reply and the next turn")
+    parser.add_argument("--ramp", type=float, default=5.0, help="Seconds over which users arrive")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Seconds a user waits for a reply")
+    parser.add_argument("--debounce", type=float, default=1.0, help="UserBot debounce_seconds")
+    parser.add_argument("--inactivity", type=float, default=600.0, help="UserBot inactivity_seconds")
+    parser.add_argument("--modes", nargs="+", choices=["plain", "stream"], default=["plain", "stream"],
+                        help="Reply modes to run, each one a separate load test")
+    parser.add_argument("--stream", action="store_const", const=["stream"], dest="modes",
+                        help="Shorthand for --modes stream")
+    parser.add_argument("--accounts", type=int, default=1, help="DeepSeek accounts")
+    parser.add_argument("--ai-concurrency", type=int, default=8, help="AIJobQueue concurrency")
+    parser.add_argument("--ai-queue-depth", type=int, default=200, help="AIJobQueue max_depth")
+    parser.add_argument("--wait-notice", type=float, default=10.0, help="AIJobQueue notice_after")
+    parser.add_argument("--pow-pool-size", type=int, default=0, help="Pre-solved PoW tokens per account")
+    parser.add_argument("--session-pool-size", type=int, default=0, help="Pre-warmed sessions")
+    parser.add_argument("--ds-latency", type=float, default=0.1, help="Fake DeepSeek latency per request")
+    parser.add_argument("--token-rate", type=float, default=50.0, help="Fake DeepSeek tokens per second")
+    parser.add_argument("--reply-tokens", type=int, default=60, help="Tokens per reply")
+    parser.add_argument("--difficulty", type=int, default=144000, help="PoW difficulty the fake server asks for")
+    parser.add_argument("--crm-latency", type=float, default=0.2, help="Fake amoCRM latency per request")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    lost = {}
+    for mode in args.modes:
+        random.seed(args.seed)
+        lost[mode] = asyncio.run(run(args, stream=mode == "stream"))
+
+    if any(lost.values()):
+        print("\nWARNING: turns timed out without a reply: " + ", ".join(
+            f"{mode} {count}" for mode, count in lost.items()
+        ), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
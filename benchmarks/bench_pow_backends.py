@@ -0,0 +1,63 @@
+"""
+Cross-check and benchmark of the PoW solver backends.
+
+First verifies that the NumPy backend returns bit-exact digests and answers
+compared with the wasm solver, then reports solve times for both backends
+across difficulty levels. The answer is placed at the end of the search
+range, so every case measures a full scan.
+
+Run from the repository root:
+    python -m benchmarks.bench_pow_backends [--difficulties 1000 10000 144000]
+"""
+
+import argparse
+import random
+import time
+
+from dsk.pow import POW_BACKENDS, create_hasher
+
+SALT      = "bench_salt"
+EXPIRE_AT = 1700000000000
+
+
+def cross_check(reference, candidate, samples: int = 50) -> None:
+    rng = random.Random(0)
+    for _ in range(samples):
+        text = ''.join(rng.choice('abcdef0123456789_') for _ in range(rng.randint(0, 300)))
+        assert reference.hash_v1(text) == candidate.hash_v1(text), f"digest mismatch for {text!r}"
+
+    for answer in (0, 9, 10, 4095, 4096, 99999):
+        challenge = reference.hash_v1(f"{SALT}_{EXPIRE_AT}_{answer}")
+        expected  = reference.calculate_hash('DeepSeekHashV1', challenge, SALT, 100000, EXPIRE_AT)
+        actual    = candidate.calculate_hash('DeepSeekHashV1', challenge, SALT, 100000, EXPIRE_AT)
+        assert expected == actual == answer, f"answer mismatch: {expected} != {actual} (expected {answer})"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PoW backend benchmark")
+    parser.add_argument("--difficulties", type=int, nargs="+", default=[1000, 10000, 144000])
+    args = parser.parse_args()
+
+    hashers = {backend: create_hasher(backend) for backend in POW_BACKENDS}
+    reference = hashers['wasm']
+
+    for backend, hasher in hashers.items():
+        if hasher is not reference:
+            cross_check(reference, hasher)
+    print("backends agree bit-exactly with wasm\n")
+
+    print(f"{'difficulty':>10} " + " ".join(f"{backend + ' ms':>12}" for backend in hashers))
+    for difficulty in args.difficulties:
+        answer    = difficulty - 1
+        challenge = reference.hash_v1(f"{SALT}_{EXPIRE_AT}_{answer}")
+        timings   = []
+        for hasher in hashers.values():
+            started = time.perf_counter()
+            result  = hasher.calculate_hash('DeepSeekHashV1', challenge, SALT, difficulty, EXPIRE_AT)
+            timings.append((time.perf_counter() - started) * 1000)
+            assert result == answer
+        print(f"{difficulty:>10} " + " ".join(f"{ms:>12.1f}" for ms in timings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Micro-benchmark for the Python <-> WASM bridge of DeepSeekHash.
+
+Compares the original byte-by-byte bridge (exports() looked up on every call,
+NumPy to decode the answer) with the current one (cached export handles,
+ctypes.memmove, struct decoding). Low difficulties keep the time spent inside
+wasm small so the bridge overhead dominates.
+
+Run from the repository root:
+    python -m benchmarks.bench_pow_bridge [--seconds 2]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from dsk.pow import DeepSeekHash, WASM_PATH
+
+
+class LegacyDeepSeekHash(DeepSeekHash):
+    """The bridge as it was before the bulk-copy rewrite"""
+
+    def _write_to_memory(self, text: str) -> tuple[int, int]:
+        encoded = text.encode('utf-8')
+        length  = len(encoded)
+        ptr     = self.instance.exports(self.store)["__wbindgen_export_0"](self.store, length, 1)
+
+        memory_view = self.memory.data_ptr(self.store)
+        for i, byte in enumerate(encoded):
+            memory_view[ptr + i] = byte
+
+        return ptr, length
+
+    def calculate_hash(self, algorithm: str, challenge: str, salt: str,
+                       difficulty: int, expire_at: int) -> float:
+        prefix = f"{salt}_{expire_at}_"
+        retptr = self.instance.exports(self.store)["__wbindgen_add_to_stack_pointer"](self.store, -16)
+
+        try:
+            challenge_ptr, challenge_len = self._write_to_memory(challenge)
+            prefix_ptr, prefix_len       = self._write_to_memory(prefix)
+
+            self.instance.exports(self.store)["wasm_solve"](
+                self.store, retptr, challenge_ptr, challenge_len, prefix_ptr, prefix_len, float(difficulty)
+            )
+
+            memory_view = self.memory.data_ptr(self.store)
+            status      = int.from_bytes(bytes(memory_view[retptr:retptr + 4]), byteorder='little', signed=True)
+
+            if status == 0:
+                return None
+
+            value_bytes = bytes(memory_view[retptr + 8:retptr + 16])
+            return int(np.frombuffer(value_bytes, dtype=np.float64)[0])
+
+        finally:
+            self.instance.exports(self.store)["__wbindgen_add_to_stack_pointer"](self.store, 16)
+
+
+def make_challenge(hasher: DeepSeekHash, answer: int, salt: str = "bench_salt", expire_at: int = 1700000000000) -> dict:
+    return {
+        'challenge': hasher.hash_v1(f"{salt}_{expire_at}_{answer}"),
+        'salt': salt,
+        'expire_at': expire_at,
+        'difficulty': max(answer + 1, 1000),
+    }
+
+
+def solves_per_second(hasher: DeepSeekHash, challenge: dict, answer: int, seconds: float) -> float:
+    solves   = 0
+    deadline = time.perf_counter() + seconds
+    started  = time.perf_counter()
+    while time.perf_counter() < deadline:
+        result = hasher.calculate_hash(
+            'DeepSeekHashV1', challenge['challenge'], challenge['salt'], challenge['difficulty'], challenge['expire_at']
+        )
+        assert result == answer, f"expected {answer}, got {result}"
+        solves += 1
+    return solves / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DeepSeekHash bridge benchmark")
+    parser.add_argument("--seconds", type=float, default=2.0, help="Time budget per case")
+    args = parser.parse_args()
+
+    legacy  = LegacyDeepSeekHash().init(WASM_PATH)
+    current = DeepSeekHash().init(WASM_PATH)
+
+    print(f"{'answer':>8} {'before/s':>12} {'after/s':>12} {'speedup':>8}")
+    for answer in (0, 10, 100, 1000):
+        challenge = make_challenge(current, answer)
+        before    = solves_per_second(legacy, challenge, answer, args.seconds)
+        after     = solves_per_second(current, challenge, answer, args.seconds)
+        print(f"{answer:>8} {before:>12.0f} {after:>12.0f} {after / before:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
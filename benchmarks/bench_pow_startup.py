@@ -0,0 +1,56 @@
+"""
+Startup benchmark for the wasm PoW solver.
+
+Measures a cold compile of the wasm module, loading it back from the
+serialized cache, and the cost of each additional per-thread instance.
+
+Run from the repository root:
+    python -m benchmarks.bench_pow_startup [--repeat 5]
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+
+import wasmtime
+
+from dsk import pow as dsk_pow
+
+
+def timed(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PoW solver startup benchmark")
+    parser.add_argument("--repeat", type=int, default=5, help="Samples per case, the median is reported")
+    args = parser.parse_args()
+
+    with open(dsk_pow.WASM_PATH, 'rb') as f:
+        wasm_bytes = f.read()
+
+    engine = wasmtime.Engine()
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        dsk_pow.CACHE_DIR = cache_dir
+        dsk_pow._compile_cached(engine, wasm_bytes)  # populate the cache
+
+        cold   = timed(lambda: wasmtime.Module(engine, wasm_bytes), args.repeat)
+        cached = timed(lambda: dsk_pow._compile_cached(engine, wasm_bytes), args.repeat)
+
+        dsk_pow.load_module()
+        instance = timed(lambda: dsk_pow.DeepSeekHash().init(dsk_pow.WASM_PATH), args.repeat)
+
+    print(f"{'compile from wasm':<28} {cold:>9.2f} ms")
+    print(f"{'deserialize from cache':<28} {cached:>9.2f} ms")
+    print(f"{'extra instance (warm)':<28} {instance:>9.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
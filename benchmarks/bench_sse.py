@@ -0,0 +1,99 @@
+"""
+Parsing benchmark for completion streams.
+
+Replays a recorded /chat/completion stream (benchmarks/fixtures) at several
+lengths, cut into socket-sized byte chunks, through the original line-by-line
+json.loads + `str +=` loop and through SSEParser, and checks both produce the
+same answer.
+
+Run from the repository root:
+    python -m benchmarks.bench_sse [--chunk-size 1024] [--repeat 20]
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+from dsk.sse import SSEParser
+
+FIXTURE = Path(__file__).parent / 'fixtures' / 'completion_ru.sse'
+
+
+def build_stream(recorded: bytes, scale: int) -> bytes:
+    """Repeats the plain text deltas of the recording `scale` times"""
+    lines = recorded.split(b'\n')
+    first = next(i for i, line in enumerate(lines) if b'"o":"APPEND"' in line)
+    last  = next(i for i, line in enumerate(lines) if b'"o":"BATCH"' in line)
+    body  = lines[first + 1:last]
+    return b'\n'.join(lines[:first + 1] + body * scale + lines[last:])
+
+
+def chunked(stream: bytes, size: int) -> list:
+    return [stream[i:i + size] for i in range(0, len(stream), size)]
+
+
+def legacy_parse(chunks: list) -> str:
+    """The loop chat_completion used before SSEParser: iter_lines, json.loads per line, str +="""
+    content   = ''
+    is_append = False
+    for line in b''.join(chunks).splitlines():
+        if not line.startswith(b'data: '):
+            continue
+        data = json.loads(line[6:])
+        if not ('v' in data and data['v']):
+            continue
+        if is_append:
+            if isinstance(data['v'], str):
+                content += data['v']
+            elif data.get('o', '') == 'BATCH':
+                break
+        elif isinstance(data['v'], dict) and data['v'].get('response') is not None:
+            pass
+        elif data.get('o', '') == 'APPEND':
+            content += data['v']
+            is_append = True
+    return content
+
+
+def parser_parse(chunks: list) -> str:
+    parser = SSEParser()
+    parts  = []
+    for chunk in chunks:
+        parts.extend(event['content'] for event in parser.feed(chunk) if event['type'] == 'content')
+        if parser.finished:
+            break
+    return ''.join(parts)
+
+
+def best_of(fn, chunks: list, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(chunks)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Completion stream parsing benchmark")
+    parser.add_argument("--chunk-size", type=int, default=1024, help="Bytes per simulated socket read")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per case, the best is reported")
+    args = parser.parse_args()
+
+    recorded = FIXTURE.read_bytes()
+
+    print(f"{'deltas':>8} {'bytes':>9} {'legacy ms':>10} {'parser ms':>10} {'speedup':>8}")
+    for scale in (1, 10, 100):
+        stream = build_stream(recorded, scale)
+        chunks = chunked(stream, args.chunk_size)
+        assert legacy_parse(chunks) == parser_parse(chunks), "parsers disagree"
+
+        deltas = stream.count(b'data: {"v":"') + 1
+        before = best_of(legacy_parse, chunks, args.repeat)
+        after  = best_of(parser_parse, chunks, args.repeat)
+        print(f"{deltas:>8} {len(stream):>9} {before:>10.3f} {after:>10.3f} {before / after:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Debounce / inactivity timer benchmark with many simultaneous dialogs.
+
+Simulates `--users` users who each send a burst of `--burst` messages, the
+way UserBot handles them: every message cancels the user's nudge timer and
+the first one of a burst starts the debounce timer; when debounce fires, a
+"reply" is counted and a nudge timer is armed. Compares the original
+task-per-timer approach (asyncio.sleep inside a task, cancel + recreate) with
+TimerWheel, reporting scheduling time, wall time until every timer fired and
+peak traced memory.
+
+Run from the repository root:
+    python -m benchmarks.bench_timers [--users 100000] [--burst 3]
+"""
+
+import argparse
+import asyncio
+import gc
+import random
+import time
+import tracemalloc
+
+from timer_wheel import TimerWheel
+
+
+class TaskTimers:
+    """The original approach: one sleeping task per debounce and per nudge"""
+
+    def __init__(self, debounce: float, nudge: float):
+        self.debounce = debounce
+        self.nudge = nudge
+        self.debounce_tasks = {}
+        self.nudge_tasks = {}
+        self.replies = 0
+        self.nudges = 0
+
+    async def _debounce(self, user_id):
+        await asyncio.sleep(self.debounce)
+        self.replies += 1
+        self.debounce_tasks.pop(user_id, None)
+        self.nudge_tasks[user_id] = asyncio.create_task(self._nudge(user_id))
+
+    async def _nudge(self, user_id):
+        try:
+            await asyncio.sleep(self.nudge)
+            self.nudges += 1
+        finally:
+            self.nudge_tasks.pop(user_id, None)
+
+    def on_message(self, user_id):
+        task = self.nudge_tasks.pop(user_id, None)
+        if task is not None:
+            task.cancel()
+        if user_id not in self.debounce_tasks:
+            self.debounce_tasks[user_id] = asyncio.create_task(self._debounce(user_id))
+
+    def busy(self):
+        return bool(self.debounce_tasks or self.nudge_tasks)
+
+
+class WheelTimers:
+    """The same flow on a single TimerWheel"""
+
+    def __init__(self, debounce: float, nudge: float, tick: float):
+        self.debounce = debounce
+        self.nudge = nudge
+        self.wheel = TimerWheel(tick=tick)
+        self.wheel.start()
+        self.replies = 0
+        self.nudges = 0
+
+    def _debounce(self, user_id):
+        self.replies += 1
+        self.wheel.schedule(("nudge", user_id), self.nudge, self._nudge)
+
+    def _nudge(self):
+        self.nudges += 1
+
+    def on_message(self, user_id):
+        self.wheel.cancel(("nudge", user_id))
+        if ("debounce", user_id) not in self.wheel:
+            self.wheel.schedule(("debounce", user_id), self.debounce, self._debounce, user_id)
+
+    def busy(self):
+        return len(self.wheel) > 0
+
+
+async def simulate(timers, users: int, burst: int, waves: int) -> tuple:
+    """`waves` rounds; in each one every user sends a burst, returns (schedule seconds, total seconds)"""
+    order = [user for user in range(users) for _ in range(burst)]
+    scheduling = 0.0
+    start = time.perf_counter()
+
+    for wave in range(waves):
+        random.shuffle(order)
+        t = time.perf_counter()
+        # messages arrive in chunks, with the loop running in between like real I/O
+        for i in range(0, len(order), 1000):
+            for user in order[i:i + 1000]:
+                timers.on_message(user)
+            await asyncio.sleep(0)
+        scheduling += time.perf_counter() - t
+
+        while timers.replies < users * (wave + 1):
+            await asyncio.sleep(0.01)
+
+    while timers.busy():
+        await asyncio.sleep(0.01)
+    return scheduling, time.perf_counter() - start
+
+
+async def run_once(make, args, trace: bool):
+    gc.collect()
+    if trace:
+        tracemalloc.start()
+    timers = make()
+    scheduling, total = await simulate(timers, args.users, args.burst, args.waves)
+    peak = tracemalloc.get_traced_memory()[1] if trace else 0
+    if trace:
+        tracemalloc.stop()
+    if isinstance(timers, WheelTimers):
+        await timers.wheel.stop()
+
+    # a burst that takes longer than the debounce window to schedule gets a second reply,
+    # so more replies than users * waves means the approach could not keep up
+    assert timers.replies >= args.users * args.waves, "lost debounce timers"
+    return timers, scheduling, total, peak
+
+
+async def run_case(name, make, args):
+    # tracemalloc slows allocation down a lot, so timing and memory come from separate runs
+    timers, scheduling, total, _ = await run_once(make, args, trace=False)
+    _, _, _, peak = await run_once(make, args, trace=True)
+    print(f"{name:>7} {scheduling * 1000:>14.1f} {total:>9.2f} {peak / 2**20:>12.1f} "
+          f"{timers.replies:>9} {timers.nudges:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Debounce / nudge timer benchmark")
+    parser.add_argument("--users", type=int, default=100_000, help="Concurrent dialogs")
+    parser.add_argument("--burst", type=int, default=3, help="Messages per user per wave")
+    parser.add_argument("--waves", type=int, default=2, help="Bursts per user; each cancels the previous nudge")
+    parser.add_argument("--debounce", type=float, default=0.5, help="Debounce seconds")
+    parser.add_argument("--nudge", type=float, default=1.0, help="Nudge seconds")
+    parser.add_argument("--tick", type=float, default=0.05, help="TimerWheel resolution")
+    args = parser.parse_args()
+
+    async def run():
+        print(f"{'timers':>7} {'schedule ms':>14} {'total s':>9} {'peak MiB':>12} {'replies':>9} {'nudges':>8}")
+        await run_case("tasks", lambda: TaskTimers(args.debounce, args.nudge), args)
+        await run_case("wheel", lambda: WheelTimers(args.debounce, args.nudge, args.tick), args)
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
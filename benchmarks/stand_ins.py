@@ -0,0 +1,251 @@
+"""
+Local stand-ins for the services UserBot talks to, for load tests.
+
+- FakeDeepSeek: HTTP server with create_pow_challenge, chat_session/create
+  and an SSE chat/completion streamed at a configurable token rate.
+- FakeAmoCRM: the part of the amoCRM REST API that crm.AmoCRM uses
+  (pipeline statuses, lead search, batch POST/PATCH /leads).
+- FakeTelegram: a client with send_message/edit_message that records every
+  outgoing message, plus new_message() to build NewMessage-like events.
+
+Servers run on daemon threads and count requests per route; every request
+sleeps `latency` seconds first, like a remote service would.
+"""
+
+import asyncio
+import http.server
+import itertools
+import json
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import jwt
+from amocrm.v2 import tokens
+from amocrm.v2.interaction import BaseInteraction
+from telethon.tl.types import InputPeerUser, PeerUser
+
+from crm.amocrm import STATUS_LIST
+from dsk.api import AsyncDeepSeekAPI
+
+# DeepSeekHashV1 challenge in the format the real server sends; the solver scans
+# up to `difficulty` nonces, so the difficulty sets the PoW cost per request
+CHALLENGE = {
+    "algorithm": "DeepSeekHashV1",
+    "challenge": "502a5a7310f78220928eab9e5b927ce942212f5e7ed3cdf29fdf338add6dddb6",
+    "salt": "a1b2c3d4e5f6",
+    "signature": "local",
+    "target_path": "/api/v0/chat/completion",
+}
+
+
+class _Server:
+    """ThreadingHTTPServer on a free local port, one thread per connection"""
+
+    def __init__(self, handler: type, latency: float):
+        handler.stand_in = self
+        self.latency = latency
+        self.requests: Counter = Counter()
+        self._lock = threading.Lock()
+        self._httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, route: str) -> None:
+        with self._lock:
+            self.requests[route] += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    stand_in: _Server
+
+    def log_message(self, *args):
+        pass
+
+    def read_json(self):
+        length = int(self.headers.get("content-length", 0))
+        return json.loads(self.rfile.read(length)) if length else None
+
+    def send_json(self, data, status: int = 200) -> None:
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _DeepSeekHandler(_Handler):
+    stand_in: "FakeDeepSeek"
+
+    def do_POST(self):
+        self.read_json()
+        route = urlsplit(self.path).path.rsplit("/api/v0/", 1)[-1]
+        self.stand_in.count(route)
+        time.sleep(self.stand_in.latency)
+
+        if route == "chat/create_pow_challenge":
+            challenge = dict(CHALLENGE, difficulty=self.stand_in.difficulty, expire_at=int(time.time() * 1000) + 300_000)
+            self.send_json({"code": 0, "data": {"biz_data": {"challenge": challenge}}})
+        elif route == "chat_session/create":
+            self.send_json({"code": 0, "data": {"biz_data": {"id": f"session-{next(self.stand_in.ids)}"}}})
+        elif route == "chat/completion":
+            self.stream_completion()
+        else:
+            self.send_json({"code": 404}, 404)
+
+    def stream_completion(self) -> None:
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream")
+        self.send_header("connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        stand_in = self.stand_in
+        message_id = next(stand_in.ids)
+        events = [{"v": {"response": {"message_id": message_id, "parent_id": message_id - 1}}}]
+        for i, token in enumerate(stand_in.tokens()):
+            events.append({"p": "response/content", "o": "APPEND", "v": token} if i == 0 else {"v": token})
+        events.append({"p": "response", "o": "BATCH", "v": [{"p": "quasi_status", "v": "FINISHED"}]})
+
+        delay = 1 / stand_in.token_rate if stand_in.token_rate > 0 else 0
+        try:
+            for event in events:
+                self.wfile.write(b"data: " + json.dumps(event, ensure_ascii=False).encode() + b"\n\n")
+                self.wfile.flush()
+                if delay:
+                    time.sleep(delay)
+        except (BrokenPipeError, ConnectionResetError):
+            # the client stops reading after BATCH (SSEParser.finished) and closes the connection
+            pass
+
+
+class FakeDeepSeek(_Server):
+    """Stand-in for chat.deepseek.com; `install()` points AsyncDeepSeekAPI at it"""
+
+    def __init__(self, latency: float = 0.1, token_rate: float = 50.0, reply_tokens: int = 60,
+                 difficulty: int = 144000):
+        super().__init__(_DeepSeekHandler, latency)
+        self.token_rate = token_rate
+        self.reply_tokens = reply_tokens
+        self.difficulty = difficulty
+        self.ids = itertools.count(1)
+
+    def tokens(self) -> List[str]:
+        words = ["Подберём", "книги", "под", "ваш", "запрос.", "Какой", "жанр", "интересен?"]
+        return [words[i % len(words)] + " " for i in range(self.reply_tokens)]
+
+    def install(self) -> None:
+        AsyncDeepSeekAPI.BASE_URL = f"{self.url}/api/v0"
+
+
+class _AmoCRMHandler(_Handler):
+    stand_in: "FakeAmoCRM"
+
+    def route(self) -> str:
+        path = urlsplit(self.path).path.split("/api/v4/", 1)[-1]
+        return "leads/pipelines/{id}" if path.startswith("leads/pipelines/") else path
+
+    def do_GET(self):
+        route = self.route()
+        self.stand_in.count(f"GET {route}")
+        time.sleep(self.stand_in.latency)
+
+        if route == "leads/pipelines/{id}":
+            statuses = [{"id": 100 + i, "name": name} for i, name in enumerate(STATUS_LIST.values())]
+            self.send_json({"id": self.stand_in.pipeline_id, "_embedded": {"statuses": statuses}})
+        else:
+            # search finds nothing: every lead is created through the index
+            self.send_response(204)
+            self.send_header("content-length", "0")
+            self.end_headers()
+
+    def do_POST(self):
+        leads = self.read_json() or []
+        self.stand_in.count(f"POST {self.route()}")
+        time.sleep(self.stand_in.latency)
+        self.send_json({"_embedded": {"leads": [{"id": next(self.stand_in.ids)} for _ in leads]}})
+
+    def do_PATCH(self):
+        leads = self.read_json() or []
+        self.stand_in.count(f"PATCH {self.route()}")
+        time.sleep(self.stand_in.latency)
+        self.send_json({"_embedded": {"leads": [{"id": lead.get("id")} for lead in leads]}})
+
+
+class FakeAmoCRM(_Server):
+    """Stand-in for the amoCRM v4 API; `install()` routes amocrm.v2 requests to it"""
+
+    def __init__(self, latency: float = 0.2, pipeline_id: int = 1):
+        super().__init__(_AmoCRMHandler, latency)
+        self.pipeline_id = pipeline_id
+        self.ids = itertools.count(1)
+
+    def install(self) -> None:
+        url = self.url
+        BaseInteraction._get_url = lambda interaction, path: f"{url}/api/v4/{path}"
+        # the manager keeps the first storage it was given, so replace it outright
+        storage = tokens.MemoryTokensStorage()
+        token = jwt.encode({"exp": int(time.time()) + 86400}, "local-stand-in-signing-key-0123456789", algorithm="HS256")
+        storage.save_tokens(token, token)
+        tokens.default_token_manager._storage = storage
+
+
+class FakeTelegram:
+    """Stands in for TelegramClient in UserBot: records outgoing messages per user"""
+
+    def __init__(self, on_message: Optional[Callable[[int, str, float], None]] = None):
+        self.on_message = on_message
+        self.sent: Dict[int, int] = Counter()
+        self.edits = 0
+        self._ids = itertools.count(1)
+
+    async def send_message(self, entity, text, **kwargs):
+        self.sent[entity.user_id] += 1
+        if self.on_message is not None:
+            self.on_message(entity.user_id, text, time.perf_counter())
+        return SimpleNamespace(id=next(self._ids))
+
+    async def edit_message(self, entity, message, text, **kwargs):
+        self.edits += 1
+        return message
+
+    @staticmethod
+    def new_message(user_id: int, text: str):
+        """An incoming private message as UserBot.on_message sees it"""
+        async def get_input_chat():
+            return InputPeerUser(user_id, 0)
+
+        return SimpleNamespace(
+            out=False,
+            raw_text=text,
+            sender_id=user_id,
+            message=SimpleNamespace(peer_id=PeerUser(user_id), from_id=None),
+            get_input_chat=get_input_chat,
+        )
+
+
+async def measure_loop_lag(samples: List[float], interval: float = 0.05) -> None:
+    """Appends how late each `interval` sleep wakes up, until cancelled"""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(loop.time() - start - interval)
@@ -1,4 +1,13 @@
-from amocrm.v2 import tokens, Lead as _Lead, custom_field, Pipeline
+import threading
+import time
+from typing import Dict, List, Optional
+
+from amocrm.v2 import tokens, Lead as _Lead, custom_field, Pipeline, exceptions
+from amocrm.v2.interaction import BaseInteraction
+
+from crm.lead_index import LeadIndex
+
+BATCH_SIZE = 50  # сколько сделок amoCRM принимает в одном запросе к /leads
 
 STATUS_LIST = {
     "error" : "нужен человек",
@@ -16,9 +25,17 @@ class Lead(_Lead):
     user_name = custom_field.TextCustomField('ФИО')
  
 class AmoCRM():
-    def __init__(self, client_id: str, client_secret: str, subdomain: str, redirect_url: str, pipeline_id: int):
+    def __init__(self, client_id: str, client_secret: str, subdomain: str, redirect_url: str, pipeline_id: int,
+                 lead_index: Optional[LeadIndex] = None, status_ttl: float = 600.0):
         self.create_token(client_id, client_secret, subdomain, redirect_url)
         self.pipeline_id = pipeline_id
+        # user_id -> id сделки: обновления идут сразу по id, без поиска по имени
+        self.lead_index = lead_index if lead_index is not None else LeadIndex()
+        # статусы воронки меняются редко, держим их status_ttl секунд
+        self.status_ttl = status_ttl
+        self._status_ids: Dict[str, int] = {}
+        self._status_loaded_at = 0.0
+        self._status_lock = threading.Lock()
     
     def create_token(
         self,
@@ -53,18 +70,15 @@ class AmoCRM():
         company_direction: str = "",
         budget: int = 0,
     ):  
-        pipeline = Pipeline.objects.get(object_id=self.pipeline_id)
-        lead = Lead(
-            name=name,
-            user_name=user_name,
-            scope=scope,
-            phone_number=phone_number,
-            user_tag=user_tag,
-            company_direction=company_direction,
-            budget=budget,
-            pipeline=pipeline
-        )
-        lead.create()
+        self.create_leads([self.lead_data({
+            "name": name,
+            "user_name": user_name,
+            "scope": scope,
+            "phone_number": phone_number,
+            "user_tag": user_tag,
+            "company_direction": company_direction,
+            "budget": budget,
+        })])
         
     def update_task(
         self,
@@ -77,28 +91,79 @@ class AmoCRM():
         budget: int = None,
         status_name: str = None
     ):      
-        pipeline: Pipeline = Pipeline.objects.get(object_id=self.pipeline_id)
-        lead: Lead = Lead.objects.get(query=name)
-        if user_name:
-            lead.user_name = user_name
-        if scope:
-            lead.scope = scope
-        if phone_number:
-            lead.phone_number = phone_number
-        if user_tag:
-            lead.user_tag = user_tag
-        if company_direction:
-            lead.company_direction = company_direction
-        if budget:
-            lead.budget = budget
+        lead_id = self.find_lead_id(name)
+        if lead_id is None:
+            raise exceptions.NotFound()
+
+        # как и раньше, пустые значения не затирают то, что уже есть в сделке
+        fields = {
+            "user_name": user_name,
+            "scope": scope,
+            "phone_number": phone_number,
+            "user_tag": user_tag,
+            "company_direction": company_direction,
+            "budget": budget,
+            "status_name": status_name,
+        }
+        self.update_leads([{**self.lead_data({k: v for k, v in fields.items() if v}), "id": lead_id}])
+
+    def status_ids(self, refresh: bool = False) -> Dict[str, int]:
+        """status_name из STATUS_LIST -> id статуса в воронке, с кэшем на status_ttl секунд"""
+        with self._status_lock:
+            if refresh or not self._status_ids or time.monotonic() - self._status_loaded_at > self.status_ttl:
+                pipeline: Pipeline = Pipeline.objects.get(object_id=self.pipeline_id)
+                by_name = {status.name: status.id for status in pipeline.statuses}
+                self._status_ids = {key: by_name[name] for key, name in STATUS_LIST.items() if name in by_name}
+                self._status_loaded_at = time.monotonic()
+            return self._status_ids
+
+    def status_id(self, status_name: str) -> int:
+        status_ids = self.status_ids()
+        if status_name not in status_ids:
+            # статус могли переименовать или добавить после загрузки
+            status_ids = self.status_ids(refresh=True)
+        return status_ids[status_name]
+
+    # --- пакетные операции для CRMQueue ---
+
+    def lead_data(self, fields: Dict) -> Dict:
+        """Тело сделки для /leads: те же поля, что у create_task/update_task"""
+        fields = dict(fields)
+        status_name = fields.pop("status_name", None)
+        lead = Lead(**{key: value for key, value in fields.items() if value is not None})
+        data = dict(lead._data)
+        data["pipeline_id"] = self.pipeline_id
         if status_name:
-            for status in pipeline.statuses:
-                if status.name == STATUS_LIST[status_name]:
-                    lead.status = status
-                    break
-            
-        lead.update()
-    
+            data["status_id"] = self.status_id(status_name)
+        return data
+
+    def find_lead_id(self, name: str) -> Optional[int]:
+        """id сделки из индекса; сделки, созданные до индекса, ищутся по имени один раз"""
+        name = str(name)
+        if (lead_id := self.lead_index.get(name)) is not None:
+            return lead_id
+        try:
+            lead_id = Lead.objects.get(query=name).id
+        except StopIteration:
+            return None
+        self.lead_index.put(name, lead_id)
+        return lead_id
+
+    def create_leads(self, leads: List[Dict]) -> List[int]:
+        """Создаёт до BATCH_SIZE сделок одним запросом и запоминает их id; возвращает id в том же порядке"""
+        response, status = BaseInteraction().request("post", "leads", data=leads)
+        if status == 400:
+            raise exceptions.ValidationError(response)
+        ids = [item["id"] for item in response["_embedded"]["leads"]]
+        self.lead_index.put_many((str(lead["name"]), lead_id) for lead, lead_id in zip(leads, ids) if lead.get("name"))
+        return ids
+
+    def update_leads(self, leads: List[Dict]) -> None:
+        """Обновляет до BATCH_SIZE сделок одним запросом; у каждой должен быть id"""
+        response, status = BaseInteraction().request("patch", "leads", data=leads)
+        if status == 400:
+            raise exceptions.ValidationError(response)
+
 
 if __name__ == "__main__":
     import json
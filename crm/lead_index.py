@@ -0,0 +1,54 @@
+import sqlite3
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+
+class LeadIndex:
+    """
+    Постоянный индекс имя сделки (user_id) -> id сделки в amoCRM.
+
+    Заполняется при создании сделки, чтобы обновлять её сразу по id, а не
+    искать по имени. Читается и пишется из потоков CRMQueue, поэтому под
+    замком; всё, что уже прочитано, держится в памяти.
+    """
+
+    def __init__(self, path: str = "leads.db"):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS leads (name TEXT PRIMARY KEY, lead_id INTEGER NOT NULL)")
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self._cache: Dict[str, int] = {}
+
+    def get(self, name: str) -> Optional[int]:
+        if (lead_id := self._cache.get(name)) is not None:
+            return lead_id
+        with self._lock:
+            row = self._conn.execute("SELECT lead_id FROM leads WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return None
+        self._cache[name] = row[0]
+        return row[0]
+
+    def put_many(self, items: Iterable[Tuple[str, int]]) -> None:
+        items = list(items)
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO leads (name, lead_id) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET lead_id = excluded.lead_id",
+                items,
+            )
+            self._conn.commit()
+        self._cache.update(items)
+
+    def put(self, name: str, lead_id: int) -> None:
+        self.put_many([(name, lead_id)])
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM leads").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
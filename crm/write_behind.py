@@ -0,0 +1,210 @@
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import metrics
+from crm.amocrm import AmoCRM, BATCH_SIZE
+
+
+@dataclass
+class PendingLead:
+    create: bool = False  # сделки ещё нет в crm
+    fields: Dict[str, Any] = field(default_factory=dict)
+    attempts: int = 0
+    retry_at: float = 0.0
+
+
+class CRMQueue:
+    """
+    Отложенная запись в amoCRM, чтобы crm не тормозила ответы в Telegram.
+
+    create()/update() только запоминают изменение и сразу возвращаются.
+    Изменения одной сделки до отправки схлопываются (по каждому полю
+    побеждает последнее), а update до create просто дописывается в создание.
+    Фоновая задача раз в flush_interval отправляет всё накопленное пачками
+    по BATCH_SIZE через POST/PATCH /leads в отдельном потоке. Неудачная пачка
+    возвращается в очередь с паузой (экспонента с джиттером) и после
+    max_attempts попыток выбрасывается с ошибкой в логе.
+    """
+
+    def __init__(self,
+                 crm: AmoCRM,
+                 flush_interval: float = 2.0,
+                 max_attempts: int = 5,
+                 base_delay: float = 2.0,
+                 max_delay: float = 60.0,
+                 logger: Optional[logging.Logger] = None):
+        self.logger: logging.Logger = logger or logging.getLogger(__name__)
+        self.crm = crm
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._pending: Dict[str, PendingLead] = {}  # имя сделки (user_id) -> изменения
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+
+        self.created = 0
+        self.updated = 0
+        self.coalesced = 0
+        self.failed_batches = 0
+        self.dropped = 0
+
+    def create(self, name, **fields) -> None:
+        self._put(str(name), fields, create=True)
+
+    def update(self, name, **fields) -> None:
+        self._put(str(name), fields, create=False)
+
+    def _put(self, name: str, fields: Dict[str, Any], create: bool) -> None:
+        fields = {key: value for key, value in fields.items() if value is not None}
+        pending = self._pending.get(name)
+        if pending is None:
+            self._pending[name] = PendingLead(create=create, fields=fields)
+            if len(self._pending) >= BATCH_SIZE and self._wakeup is not None:
+                self._wakeup.set()
+            return
+        self.coalesced += 1
+        pending.create = pending.create or create
+        pending.fields.update(fields)
+
+    def start(self) -> None:
+        """Запускает фоновую отправку; вызывать из работающего event loop"""
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.logger.exception("[CRMQueue] Flush failed")
+
+    async def flush(self, force: bool = False) -> None:
+        """Отправляет накопленное; force — не дожидаясь пауз после ошибок"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            now = time.monotonic()
+            due = {
+                name: pending for name, pending in self._pending.items()
+                if force or pending.retry_at <= now
+            }
+            if not due:
+                return
+            for name in due:
+                del self._pending[name]
+
+            with metrics.span("crm_flush"):
+                failed = await asyncio.to_thread(self._send, due)
+
+            for name, pending in failed:
+                self._requeue(name, pending)
+
+    def _send(self, due: Dict[str, PendingLead]) -> List[Tuple[str, PendingLead]]:
+        """Выполняется в потоке; возвращает то, что надо повторить"""
+        failed: List[Tuple[str, PendingLead]] = []
+
+        creates = [(name, p) for name, p in due.items() if p.create]
+        updates = [(name, p) for name, p in due.items() if not p.create]
+
+        for i in range(0, len(creates), BATCH_SIZE):
+            chunk = creates[i:i + BATCH_SIZE]
+            try:
+                with metrics.span("crm_create"):
+                    self.crm.create_leads([
+                        self.crm.lead_data({"name": name, **p.fields}) for name, p in chunk
+                    ])
+                self.created += len(chunk)
+            except Exception as e:
+                self.failed_batches += 1
+                self.logger.error("[CRMQueue] Failed to create %d leads: %s", len(chunk), e)
+                failed.extend(chunk)
+
+        resolved = []
+        for name, p in updates:
+            try:
+                with metrics.span("crm_find"):
+                    lead_id = self.crm.find_lead_id(name)
+            except Exception as e:
+                self.logger.error("[CRMQueue] Failed to find lead %s: %s", name, e)
+                failed.append((name, p))
+                continue
+            if lead_id is None:
+                # сделки нет ни в индексе, ни в поиске (возможно, ещё не проиндексирована amoCRM)
+                failed.append((name, p))
+                continue
+            resolved.append((name, p, lead_id))
+
+        for i in range(0, len(resolved), BATCH_SIZE):
+            chunk = resolved[i:i + BATCH_SIZE]
+            try:
+                with metrics.span("crm_update"):
+                    self.crm.update_leads([
+                        {**self.crm.lead_data(p.fields), "id": lead_id} for _, p, lead_id in chunk
+                    ])
+                self.updated += len(chunk)
+            except Exception as e:
+                self.failed_batches += 1
+                self.logger.error("[CRMQueue] Failed to update %d leads: %s", len(chunk), e)
+                failed.extend((name, p) for name, p, _ in chunk)
+
+        return failed
+
+    def _requeue(self, name: str, pending: PendingLead) -> None:
+        pending.attempts += 1
+        if pending.attempts >= self.max_attempts:
+            self.dropped += 1
+            self.logger.error("[CRMQueue] Giving up on lead %s after %d attempts: %s", name, pending.attempts, pending.fields)
+            return
+
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** pending.attempts))
+        pending.retry_at = time.monotonic() + delay
+
+        newer = self._pending.get(name)
+        if newer is not None:
+            # пока шла отправка, пришли свежие изменения: они важнее
+            pending.create = pending.create or newer.create
+            pending.fields.update(newer.fields)
+        self._pending[name] = pending
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        try:
+            await self.flush(force=True)
+        except Exception:
+            self.logger.exception("[CRMQueue] Final flush failed, %d leads not saved", len(self._pending))
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        """Счётчики очереди; длительность сброса — в metrics (этап crm_flush)"""
+        return {
+            "pending": len(self._pending),
+            "created": self.created,
+            "updated": self.updated,
+            "coalesced": self.coalesced,
+            "failed_batches": self.failed_batches,
+            "dropped": self.dropped,
+        }
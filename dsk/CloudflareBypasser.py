@@ -1,11 +1,59 @@
 import time
+from contextlib import contextmanager
+from typing import Dict
 from DrissionPage import ChromiumPage
 
+try:
+    # private module, its path has moved between DrissionPage releases (requirements.txt pins 4.1.x);
+    # without it locate_with_cdp is skipped and the recursive locator takes over
+    from DrissionPage._elements.chromium_element import ChromiumElement
+except ImportError:
+    ChromiumElement = None
+
+# One round trip instead of one per element: finds the element that hosts the Turnstile
+# widget, descending into open shadow roots. Cloudflare's own roots are closed and its
+# iframe is cross-origin, so the last hops into them are left to CDP.
+LOCATE_TURNSTILE_HOST_JS = """
+const seen = [document];
+while (seen.length) {
+    const root = seen.pop();
+    const input = root.querySelector('input[type="hidden"][name*="turnstile"]');
+    if (input) return input.parentElement;
+    const frame = root.querySelector('iframe[src*="challenges.cloudflare.com"]');
+    if (frame) return frame.parentElement;
+    for (const el of root.querySelectorAll('*')) {
+        if (el.shadowRoot) seen.push(el.shadowRoot);
+    }
+}
+return null;
+"""
+
+CHALLENGE_FRAME_SRC = "challenges.cloudflare.com"
+CHALLENGE_TITLE = "Just a moment"
+
 class CloudflareBypasser:
-    def __init__(self, driver: ChromiumPage, max_retries=-1, log=True):
+    def __init__(self, driver: ChromiumPage, max_retries=-1, log=True, clear_timeout=10):
         self.driver = driver
         self.max_retries = max_retries
         self.log = log
+        # how long to wait for the challenge page to go away after each click
+        self.clear_timeout = clear_timeout
+        # seconds spent per phase: load, locate, click, clear
+        self.timings: Dict[str, float] = {}
+
+    @contextmanager
+    def timed(self, phase):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[phase] = self.timings.get(phase, 0.0) + time.perf_counter() - start
+
+    def load(self, url, timeout=10):
+        """Opens url and waits for the document instead of sleeping a fixed time"""
+        with self.timed("load"):
+            self.driver.get(url)
+            self.driver.wait.doc_loaded(timeout=timeout)
 
     def search_recursively_shadow_root_with_iframe(self,ele):
         if ele.shadow_root:
@@ -28,16 +76,47 @@ class CloudflareBypasser:
                 if result:
                     return result
         return None
-    
+
+    def locate_with_js(self):
+        """Finds the widget host with one JS query, then steps into its closed shadow root and iframe"""
+        host = self.driver.run_js(LOCATE_TURNSTILE_HOST_JS)
+        if not host:
+            return None
+        return host.shadow_root.child()("tag:body").shadow_root("tag:input")
+
+    def locate_with_cdp(self):
+        """
+        Finds the challenge iframe with one DOM.getDocument call; unlike page JS,
+        CDP sees inside closed shadow roots.
+        """
+        if ChromiumElement is None:
+            return None
+
+        stack = [self.driver.run_cdp("DOM.getDocument", depth=-1, pierce=True)["root"]]
+        while stack:
+            node = stack.pop()
+            if node.get("nodeName") == "IFRAME":
+                attrs = node.get("attributes", [])
+                src = dict(zip(attrs[::2], attrs[1::2])).get("src", "")
+                if CHALLENGE_FRAME_SRC in src:
+                    iframe = self.driver.get_frame(ChromiumElement(self.driver, backend_id=node["backendNodeId"]))
+                    return iframe("tag:body").shadow_root("tag:input")
+            stack.extend(node.get("children", ()))
+            stack.extend(node.get("shadowRoots", ()))
+            if node.get("contentDocument"):
+                stack.append(node["contentDocument"])
+        return None
+
     def locate_cf_button(self):
         button = None
-        eles = self.driver.eles("tag:input")
-        for ele in eles:
-            if "name" in ele.attrs.keys() and "type" in ele.attrs.keys():
-                if "turnstile" in ele.attrs["name"] and ele.attrs["type"] == "hidden":
-                    button = ele.parent().shadow_root.child()("tag:body").shadow_root("tag:input")
-                    break
-            
+        for locate in (self.locate_with_js, self.locate_with_cdp):
+            try:
+                button = locate()
+            except Exception as e:
+                self.log_message(f"{locate.__name__} failed: {e}")
+            if button:
+                break
+
         if button:
             return button
         else:
@@ -57,10 +136,12 @@ class CloudflareBypasser:
 
     def click_verification_button(self):
         try:
-            button = self.locate_cf_button()
+            with self.timed("locate"):
+                button = self.locate_cf_button()
             if button:
                 self.log_message("Verification button found. Attempting to click.")
-                button.click()
+                with self.timed("click"):
+                    button.click()
             else:
                 self.log_message("Verification button not found.")
 
@@ -70,13 +151,22 @@ class CloudflareBypasser:
     def is_bypassed(self):
         try:
             title = self.driver.title.lower()
-            return "just a moment" not in title
+            return CHALLENGE_TITLE.lower() not in title
         except Exception as e:
             self.log_message(f"Error checking page title: {e}")
             return False
 
+    def wait_cleared(self):
+        """Returns as soon as the title stops being the challenge one, or after clear_timeout"""
+        with self.timed("clear"):
+            try:
+                self.driver.wait.title_change(CHALLENGE_TITLE, exclude=True, timeout=self.clear_timeout)
+                self.driver.wait.doc_loaded(timeout=self.clear_timeout)
+            except Exception as e:
+                self.log_message(f"Error waiting for the challenge to clear: {e}")
+
     def bypass(self):
-        
+
         try_count = 0
 
         while not self.is_bypassed():
@@ -88,9 +178,12 @@ class CloudflareBypasser:
             self.click_verification_button()
 
             try_count += 1
-            time.sleep(2)
+            self.wait_cleared()
 
         if self.is_bypassed():
             self.log_message("Bypass successful.")
         else:
             self.log_message("Bypass failed.")
+
+        timings = ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in self.timings.items())
+        self.log_message(f"Timings: {timings}")
@@ -1,46 +1,37 @@
-from curl_cffi import requests
-from typing import Optional, Dict, Any, Generator, Literal
+from curl_cffi import requests, CurlHttpVersion, CurlOpt
+from typing import Optional, Dict, Any, Generator, AsyncGenerator, Literal
+import asyncio
 import json
-from .pow import DeepSeekPOW
+import time
+from .pow import DeepSeekPOW, DeepSeekPOWPool
+from .pow_pool import PowTokenPool
+from .sse import SSEParser, parse_data_line
+from .errors import (
+    DeepSeekError,
+    AuthenticationError,
+    RateLimitError,
+    NetworkError,
+    CloudflareError,
+    APIError,
+    CircuitOpenError,
+)
+from .resilience import CircuitBreaker, RetryBudget, parse_retry_after
+from .cookies import CookieManager
+from . import tracing
 # import pkg_resources
 import sys
-from pathlib import Path
-import subprocess
-import time
 
 ThinkingMode = Literal['detailed', 'simple', 'disabled']
 SearchMode = Literal['enabled', 'disabled']
 
-class DeepSeekError(Exception):
-    """Base exception for all DeepSeek API errors"""
-    pass
-
-class AuthenticationError(DeepSeekError):
-    """Raised when authentication fails"""
-    pass
-
-class RateLimitError(DeepSeekError):
-    """Raised when API rate limit is exceeded"""
-    pass
-
-class NetworkError(DeepSeekError):
-    """Raised when network communication fails"""
-    pass
-
-class CloudflareError(DeepSeekError):
-    """Raised when Cloudflare blocks the request"""
-    pass
-
-class APIError(DeepSeekError):
-    """Raised when API returns an error response"""
-    def __init__(self, message: str, status_code: Optional[int] = None):
-        super().__init__(message)
-        self.status_code = status_code
-
-class DeepSeekAPI:
+class _BaseDeepSeekAPI:
     BASE_URL = "https://chat.deepseek.com/api/v0"
 
-    def __init__(self, auth_token: str):
+    def __init__(self,
+                 auth_token: str,
+                 pow_solver: Optional[DeepSeekPOW | DeepSeekPOWPool] = None,
+                 retry_budget: Optional[RetryBudget] = None,
+                 cookie_manager: Optional[CookieManager] = None):
         if not auth_token or not isinstance(auth_token, str):
             raise AuthenticationError("Invalid auth token provided")
 
@@ -54,17 +45,18 @@ class DeepSeekAPI:
         #     print("pip install curl-cffi==0.8.1b9\033[0m", file=sys.stderr)
 
         self.auth_token = auth_token
-        self.pow_solver = DeepSeekPOW()
+        self.pow_solver = pow_solver or DeepSeekPOW()
+        # the budget is usually shared by every client and every retrying layer above them,
+        # the breaker belongs to this token only
+        self.retry_budget = retry_budget or RetryBudget()
+        self.breaker = CircuitBreaker()
 
-        # Load cookies from JSON file
-        cookies_path = Path(__file__).parent / 'cookies.json'
-        try:
-            with open(cookies_path, 'r') as f:
-                cookie_data = json.load(f)
-                self.cookies = cookie_data.get('cookies', {})
-        except (FileNotFoundError, json.JSONDecodeError) as e:
-            print(f"\033[93mWarning: Could not load cookies from {cookies_path}: {e}\033[0m", file=sys.stderr)
-            self.cookies = {}
+        # cookies come from one manager per process, so a refresh is seen by every client
+        self.cookie_manager = cookie_manager or CookieManager.default()
+
+    @property
+    def cookies(self) -> Dict[str, str]:
+        return self.cookie_manager.cookies
 
     def _get_headers(self, pow_response: Optional[str] = None) -> Dict[str, str]:
         headers = {
@@ -86,27 +78,70 @@ class DeepSeekAPI:
 
         return headers
 
-    def _refresh_cookies(self) -> None:
-        """Run the cookie refresh script and reload cookies"""
-        try:
-            # Get path to bypass.py
-            script_path = Path(__file__).parent / 'bypass.py'
-
-            # Run the script
-            subprocess.run([sys.executable, script_path], check=True)
+    def _refresh_cookies(self, seen_version: Optional[int] = None) -> None:
+        """Refresh the Cloudflare cookies, sharing a refresh already running or done since seen_version"""
+        self.cookie_manager.refresh(seen_version)
+
+    def _check_response(self, response, error_text: Optional[str] = None) -> None:
+        """Maps non-200 responses to the matching exception, keeping the server's Retry-After"""
+        if response.status_code == 200:
+            return
+
+        if error_text is None:
+            error_text = response.text
+        retry_after = parse_retry_after(response.headers.get('retry-after'))
+
+        if response.status_code == 401:
+            raise AuthenticationError("Invalid or expired authentication token")
+        elif response.status_code == 429:
+            raise RateLimitError("API rate limit exceeded", retry_after)
+        elif response.status_code >= 500:
+            raise APIError(f"Server error occurred: {error_text}", response.status_code, retry_after)
+        else:
+            raise APIError(f"API request failed: {error_text}", response.status_code)
+
+    @staticmethod
+    def _is_cloudflare_page(text: str) -> bool:
+        return "<!DOCTYPE html>" in text and "Just a moment" in text
+
+    @staticmethod
+    def _collect_event(event: Dict[str, Any], my_respounse: Dict[str, Any], parts: list) -> None:
+        if event['type'] == 'content':
+            parts.append(event['content'])
+        else:
+            my_respounse['next_parent_id'] = event['next_parent_id']
+
+    def _completion_payload(self,
+                            chat_session_id: str,
+                            prompt: str,
+                            parent_message_id: Optional[str],
+                            thinking_enabled: bool,
+                            search_enabled: bool) -> Dict[str, Any]:
+        if not prompt or not isinstance(prompt, str):
+            raise ValueError("Prompt must be a non-empty string")
+        if not chat_session_id or not isinstance(chat_session_id, str):
+            raise ValueError("Chat session ID must be a non-empty string")
 
-            # Wait briefly for cookies file to be written
-            time.sleep(2)
+        return {
+            'chat_session_id': chat_session_id,
+            'parent_message_id': parent_message_id,
+            'prompt': prompt,
+            'ref_file_ids': [],
+            'thinking_enabled': thinking_enabled,
+            'search_enabled': search_enabled,
+        }
 
-            # Reload cookies
-            cookies_path = Path(__file__).parent / 'cookies.json'
-            with open(cookies_path, 'r') as f:
-                cookie_data = json.load(f)
-                self.cookies = cookie_data.get('cookies', {})
+    def _validate_chunk(self, chunk: bytes) -> Optional[Dict[str, Any]]:
+        """Parse a SSE chunk from the API response"""
+        if not chunk:
+            return None
 
+        try:
+            return parse_data_line(chunk)
         except Exception as e:
-            print(f"\033[93mWarning: Failed to refresh cookies: {e}\033[0m", file=sys.stderr)
+            raise APIError(f"Error parsing chunk: {str(e)}")
 
+class DeepSeekAPI(_BaseDeepSeekAPI):
     def _make_request(self, method: str, endpoint: str, json_data: Dict[str, Any], pow_required: bool = False) -> Any:
         url = f"{self.BASE_URL}{endpoint}"
 
@@ -118,36 +153,37 @@ class DeepSeekAPI:
                 headers = self._get_headers()
                 if pow_required:
                     challenge = self._get_pow_challenge()
-                    pow_response = self.pow_solver.solve_challenge(challenge)
+                    with tracing.span('pow_solve'):
+                        pow_response = self.pow_solver.solve_challenge(challenge)
                     headers = self._get_headers(pow_response)
 
-                response = requests.request(
-                    method=method,
-                    url=url,
-                    headers=headers,
-                    json=json_data,
-                    cookies=self.cookies,
-                    impersonate='chrome120',
-                    timeout=None
-                )
-
-                # Check if we hit Cloudflare protection
-                if "<!DOCTYPE html>" in response.text and "Just a moment" in response.text:
+                self.retry_budget.record_request()
+                cookies_version = self.cookie_manager.version
+                try:
+                    with self.breaker.track(requests.exceptions.RequestException, CloudflareError):
+                        response = requests.request(
+                            method=method,
+                            url=url,
+                            headers=headers,
+                            json=json_data,
+                            cookies=self.cookies,
+                            impersonate='chrome120',
+                            timeout=None
+                        )
+
+                        # A challenge page instead of the answer counts as a breaker failure
+                        if self._is_cloudflare_page(response.text):
+                            raise CloudflareError("Cloudflare protection detected")
+
+                        # Handle other response codes
+                        self._check_response(response)
+                except CloudflareError:
                     print("\033[93mWarning: Cloudflare protection detected. Bypassing...\033[0m", file=sys.stderr)
-                    if retry_count < max_retries - 1:
-                        self._refresh_cookies()  # Refresh cookies
+                    if retry_count < max_retries - 1 and self.retry_budget.try_withdraw():
+                        self._refresh_cookies(cookies_version)  # Refresh cookies
                         retry_count += 1
                         continue
-
-                # Handle other response codes
-                if response.status_code == 401:
-                    raise AuthenticationError("Invalid or expired authentication token")
-                elif response.status_code == 429:
-                    raise RateLimitError("API rate limit exceeded")
-                elif response.status_code >= 500:
-                    raise APIError(f"Server error occurred: {response.text}", response.status_code)
-                elif response.status_code != 200:
-                    raise APIError(f"API request failed: {response.text}", response.status_code)
+                    break
 
                 return response.json()
 
@@ -160,11 +196,12 @@ class DeepSeekAPI:
 
     def _get_pow_challenge(self) -> Dict[str, Any]:
         try:
-            response = self._make_request(
-                'POST',
-                '/chat/create_pow_challenge',
-                {'target_path': '/api/v0/chat/completion'}
-            )
+            with tracing.span('pow_challenge'):
+                response = self._make_request(
+                    'POST',
+                    '/chat/create_pow_challenge',
+                    {'target_path': '/api/v0/chat/completion'}
+                )
             return response['data']['biz_data']['challenge']
         except KeyError:
             raise APIError("Invalid challenge response format from server")
@@ -181,7 +218,7 @@ class DeepSeekAPI:
         except KeyError:
             raise APIError("Invalid session creation response format from server")
 
-    def chat_completion(self,
+    def chat_completion_stream(self,
                     chat_session_id: str,
                     prompt: str,
                     parent_message_id: Optional[str] = None,
@@ -197,8 +234,9 @@ class DeepSeekAPI:
             thinking_enabled (bool): Whether to show the thinking process
             search_enabled (bool): Whether to enable web search for up-to-date information
 
-        Returns:
-            Generator[Dict[str, Any], None, None]: Yields message chunks with content and type
+        Yields:
+            Dict[str, Any]: {'type': 'parent_id', 'next_parent_id': ...} once the answer id is known,
+                {'type': 'content', 'content': ...} for every text delta as it arrives
 
         Raises:
             AuthenticationError: If the authentication token is invalid
@@ -206,88 +244,324 @@ class DeepSeekAPI:
             NetworkError: If a network error occurs
             APIError: If any other API error occurs
         """
-        if not prompt or not isinstance(prompt, str):
-            raise ValueError("Prompt must be a non-empty string")
-        if not chat_session_id or not isinstance(chat_session_id, str):
-            raise ValueError("Chat session ID must be a non-empty string")
-
-        json_data = {
-            'chat_session_id': chat_session_id,
-            'parent_message_id': parent_message_id,
-            'prompt': prompt,
-            'ref_file_ids': [],
-            'thinking_enabled': thinking_enabled,
-            'search_enabled': search_enabled,
-        }
+        json_data = self._completion_payload(
+            chat_session_id, prompt, parent_message_id, thinking_enabled, search_enabled
+        )
 
         try:
-            headers = self._get_headers(
-                pow_response=self.pow_solver.solve_challenge(
-                    self._get_pow_challenge()
+            challenge = self._get_pow_challenge()
+            with tracing.span('pow_solve'):
+                headers = self._get_headers(pow_response=self.pow_solver.solve_challenge(challenge))
+
+            started = time.perf_counter()
+            self.retry_budget.record_request()
+            with self.breaker.track(requests.exceptions.RequestException):
+                response = requests.post(
+                    f"{self.BASE_URL}/chat/completion",
+                    headers=headers,
+                    json=json_data,
+                    cookies=self.cookies,  # Add cookies
+                    impersonate='chrome120',
+                    stream=True,
+                    timeout=None
                 )
-            )
 
-            response = requests.post(
-                f"{self.BASE_URL}/chat/completion",
-                headers=headers,
-                json=json_data,
-                cookies=self.cookies,  # Add cookies
+                if response.status_code != 200:
+                    try:
+                        error_text = next(response.iter_lines(), b'').decode('utf-8', 'ignore')
+                    finally:
+                        response.close()
+                    self._check_response(response, error_text)
+
+            try:
+                parser = SSEParser()
+                first = True
+
+                for chunk in response.iter_content():
+                    if first:
+                        tracing.record('completion_ttfb', time.perf_counter() - started)
+                        first = False
+                    try:
+                        events = parser.feed(chunk)
+                    except Exception as e:
+                        raise APIError(f"Error parsing response chunk: {str(e)}")
+
+                    yield from events
+                    if parser.finished:
+                        break
+                else:
+                    yield from parser.close()
+
+            finally:
+                response.close()
+                # includes the time the caller spends between events, as the user sees it
+                tracing.record('completion_stream', time.perf_counter() - started)
+
+        except requests.exceptions.RequestException as e:
+            raise NetworkError(f"Network error occurred during streaming: {str(e)}")
+
+    def chat_completion(self,
+                    chat_session_id: str,
+                    prompt: str,
+                    parent_message_id: Optional[str] = None,
+                    thinking_enabled: bool = False,
+                    search_enabled: bool = False) -> Dict[str, Any]:
+        """
+        Send a message and wait for the full answer
+
+        Same arguments and exceptions as chat_completion_stream.
+
+        Returns:
+            Dict[str, Any]: {'next_parent_id': ..., 'content': ...}
+        """
+        my_respounse = {'next_parent_id': None, 'content': ''}
+        parts = []
+
+        for event in self.chat_completion_stream(
+            chat_session_id, prompt, parent_message_id, thinking_enabled, search_enabled
+        ):
+            self._collect_event(event, my_respounse, parts)
+
+        my_respounse['content'] = ''.join(parts)
+        return my_respounse
+
+class AsyncDeepSeekAPI(_BaseDeepSeekAPI):
+    """
+    Asyncio client on top of one long-lived curl_cffi AsyncSession.
+
+    The session keeps TCP/TLS connections alive and multiplexes requests over
+    HTTP/2, so challenge fetches, session creation and completions reuse the
+    same handful of connections instead of handshaking on every call.
+    """
+
+    def __init__(self,
+                 auth_token: str,
+                 pool_size: int = 10,
+                 pow_pool_size: int = 0,
+                 pow_refill_interval: float = 0.5,
+                 pow_solver: Optional[DeepSeekPOW | DeepSeekPOWPool] = None,
+                 retry_budget: Optional[RetryBudget] = None,
+                 cookie_manager: Optional[CookieManager] = None):
+        """
+        Args:
+            auth_token (str): DeepSeek bearer token
+            pool_size (int): Maximum number of concurrent connections
+            pow_pool_size (int): Pre-solved PoW tokens to keep ready, 0 disables the pool
+            pow_refill_interval (float): Minimum pause in seconds between PoW pool refills
+            pow_solver (Optional[DeepSeekPOW | DeepSeekPOWPool]): Solver to use, may be shared between clients
+            retry_budget (Optional[RetryBudget]): Retry budget to draw from, may be shared between clients
+            cookie_manager (Optional[CookieManager]): Cloudflare cookie source, the process-wide one by default
+        """
+        super().__init__(auth_token, pow_solver, retry_budget, cookie_manager)
+        self.pool_size = pool_size
+        self._session: Optional[requests.AsyncSession] = None
+        self.pow_pool: Optional[PowTokenPool] = (
+            PowTokenPool(self, size=pow_pool_size, refill_interval=pow_refill_interval)
+            if pow_pool_size > 0 else None
+        )
+
+    @property
+    def session(self) -> requests.AsyncSession:
+        """Lazily created so the session binds to the running event loop"""
+        if self._session is None:
+            self._session = requests.AsyncSession(
+                max_clients=self.pool_size,
                 impersonate='chrome120',
-                stream=True,
-                timeout=None
+                http_version=CurlHttpVersion.V2TLS,
+                curl_options={CurlOpt.TCP_KEEPALIVE: 1},
+                timeout=None,
             )
+        return self._session
+
+    async def close(self) -> None:
+        if self.pow_pool is not None:
+            await self.pow_pool.stop()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self) -> "AsyncDeepSeekAPI":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def _solve_challenge(self, challenge: Dict[str, Any]) -> str:
+        with tracing.span('pow_solve'):
+            return await self.pow_solver.solve_challenge_async(challenge)
+
+    async def _solve_pow(self) -> str:
+        if self.pow_pool is not None:
+            if self.pow_pool.auth_failed:
+                # the same token and cookies were just rejected, do not send another doomed request
+                raise AuthenticationError("Invalid or expired authentication token")
+            self.pow_pool.start()
+            if pow_response := self.pow_pool.get():
+                return pow_response
 
-            if response.status_code != 200:
-                error_text = next(response.iter_lines(), b'').decode('utf-8', 'ignore')
-                if response.status_code == 401:
-                    raise AuthenticationError("Invalid or expired authentication token")
-                elif response.status_code == 429:
-                    raise RateLimitError("API rate limit exceeded")
-                else:
-                    raise APIError(f"API request failed: {error_text}", response.status_code)
-
-            my_respounse = {
-                'next_parent_id': None,
-                'content': ''
-            }
-            
-            is_append = False
-            
-            for chunk in response.iter_lines():
+        try:
+            challenge = await self._get_pow_challenge()
+        except AuthenticationError:
+            if self.pow_pool is not None:
+                self.pow_pool.mark_auth_failed()
+            raise
+        return await self._solve_challenge(challenge)
+
+    async def _make_request(self, method: str, endpoint: str, json_data: Dict[str, Any], pow_required: bool = False) -> Any:
+        url = f"{self.BASE_URL}{endpoint}"
+
+        retry_count = 0
+        max_retries = 2
+
+        while retry_count < max_retries:
+            try:
+                headers = self._get_headers()
+                if pow_required:
+                    headers = self._get_headers(await self._solve_pow())
+
+                self.retry_budget.record_request()
+                cookies_version = self.cookie_manager.version
                 try:
-                    if data := self._validate_chunk(chunk):
-                        if is_append:
-                            if isinstance(data['v'], str):
-                                my_respounse['content'] += data['v']
-                            elif data.get("o", "") == "BATCH":
-                                return my_respounse
-                        elif isinstance(data['v'], dict) and data.get('v', {}).get('response') is not None:
-                            my_respounse['next_parent_id'] = data.get('v', {}).get('response').get('message_id')
-                        elif not is_append and data.get("o", "") == "APPEND":
-                            my_respounse['content'] += data['v']
-                            is_append = True
-                                
-                        
-                except Exception as e:
-                    raise APIError(f"Error parsing response chunk: {str(e)}")
-                
+                    with self.breaker.track(requests.exceptions.RequestException, CloudflareError):
+                        response = await self.session.request(
+                            method=method,
+                            url=url,
+                            headers=headers,
+                            json=json_data,
+                            cookies=self.cookies,
+                        )
+
+                        # A challenge page instead of the answer counts as a breaker failure
+                        if self._is_cloudflare_page(response.text):
+                            raise CloudflareError("Cloudflare protection detected")
+
+                        self._check_response(response)
+                except CloudflareError:
+                    print("\033[93mWarning: Cloudflare protection detected. Bypassing...\033[0m", file=sys.stderr)
+                    if retry_count < max_retries - 1 and self.retry_budget.try_withdraw():
+                        await self.cookie_manager.refresh_async(cookies_version)
+                        retry_count += 1
+                        continue
+                    break
+
+                return response.json()
+
+            except requests.exceptions.RequestException as e:
+                raise NetworkError(f"Network error occurred: {str(e)}")
+            except json.JSONDecodeError:
+                raise APIError("Invalid JSON response from server")
+
+        raise APIError("Failed to bypass Cloudflare protection after multiple attempts")
+
+    async def _get_pow_challenge(self) -> Dict[str, Any]:
+        try:
+            with tracing.span('pow_challenge'):
+                response = await self._make_request(
+                    'POST',
+                    '/chat/create_pow_challenge',
+                    {'target_path': '/api/v0/chat/completion'}
+                )
+            return response['data']['biz_data']['challenge']
+        except KeyError:
+            raise APIError("Invalid challenge response format from server")
+
+    async def create_chat_session(self) -> str:
+        """Creates a new chat session and returns the session ID"""
+        try:
+            response = await self._make_request(
+                'POST',
+                '/chat_session/create',
+                {'character_id': None}
+            )
+            return response['data']['biz_data']['id']
+        except KeyError:
+            raise APIError("Invalid session creation response format from server")
+
+    async def chat_completion_stream(self,
+                    chat_session_id: str,
+                    prompt: str,
+                    parent_message_id: Optional[str] = None,
+                    thinking_enabled: bool = False,
+                    search_enabled: bool = False) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Send a message and stream the answer
+
+        Same arguments, events and exceptions as DeepSeekAPI.chat_completion_stream.
+        """
+        json_data = self._completion_payload(
+            chat_session_id, prompt, parent_message_id, thinking_enabled, search_enabled
+        )
+
+        try:
+            headers = self._get_headers(pow_response=await self._solve_pow())
+
+            started = time.perf_counter()
+            self.retry_budget.record_request()
+            with self.breaker.track(requests.exceptions.RequestException):
+                response = await self.session.post(
+                    f"{self.BASE_URL}/chat/completion",
+                    headers=headers,
+                    json=json_data,
+                    cookies=self.cookies,
+                    stream=True,
+                )
+
+                if response.status_code != 200:
+                    try:
+                        error_text = (await response.acontent()).decode('utf-8', 'ignore')
+                    finally:
+                        await response.aclose()
+                    self._check_response(response, error_text)
+
+            try:
+                parser = SSEParser()
+                first = True
+
+                async for chunk in response.aiter_content():
+                    if first:
+                        tracing.record('completion_ttfb', time.perf_counter() - started)
+                        first = False
+                    try:
+                        events = parser.feed(chunk)
+                    except Exception as e:
+                        raise APIError(f"Error parsing response chunk: {str(e)}")
+
+                    for event in events:
+                        yield event
+                    if parser.finished:
+                        break
+                else:
+                    for event in parser.close():
+                        yield event
+
+            finally:
+                await response.aclose()
+                tracing.record('completion_stream', time.perf_counter() - started)
+
         except requests.exceptions.RequestException as e:
             raise NetworkError(f"Network error occurred during streaming: {str(e)}")
 
-    def _validate_chunk(self, chunk: bytes) -> Optional[Dict[str, Any]]:
-        """Parse a SSE chunk from the API response"""
-        if not chunk:
-            return None
+    async def chat_completion(self,
+                    chat_session_id: str,
+                    prompt: str,
+                    parent_message_id: Optional[str] = None,
+                    thinking_enabled: bool = False,
+                    search_enabled: bool = False) -> Dict[str, Any]:
+        """
+        Send a message and wait for the full answer
 
-        try:
-            if chunk.startswith(b'data: '):
-                data = json.loads(chunk[6:])
-                if 'v' in data and data['v']:
-                    return data
-                
-        except json.JSONDecodeError:
-            raise APIError("Invalid JSON in response chunk")
-        except Exception as e:
-            raise APIError(f"Error parsing chunk: {str(e)}")
+        Same arguments and exceptions as DeepSeekAPI.chat_completion.
+
+        Returns:
+            Dict[str, Any]: {'next_parent_id': ..., 'content': ...}
+        """
+        my_respounse = {'next_parent_id': None, 'content': ''}
+        parts = []
+
+        async for event in self.chat_completion_stream(
+            chat_session_id, prompt, parent_message_id, thinking_enabled, search_enabled
+        ):
+            self._collect_event(event, my_respounse, parts)
 
-        return None
+        my_respounse['content'] = ''.join(parts)
+        return my_respounse
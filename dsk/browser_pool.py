@@ -0,0 +1,176 @@
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from DrissionPage import ChromiumPage
+
+
+class PooledBrowser:
+    def __init__(self, driver: ChromiumPage, proxy: Optional[str]):
+        self.driver = driver
+        self.proxy = proxy
+        self.uses = 0
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class BrowserPool:
+    """
+    Keeps Chromium instances alive between requests, one idle list per proxy.
+
+    A browser is health-checked before it is handed out, recycled after
+    `max_uses` requests or `max_idle` seconds without work, and thrown away
+    when the request that used it failed. At most `max_idle_per_proxy`
+    browsers are kept per proxy; extra ones are closed on release.
+    """
+
+    def __init__(self,
+                 factory: Callable[[Optional[str]], ChromiumPage],
+                 max_uses: int = 50,
+                 max_idle: float = 600.0,
+                 max_idle_per_proxy: int = 2):
+        self.factory = factory
+        self.max_uses = max_uses
+        self.max_idle = max_idle
+        self.max_idle_per_proxy = max_idle_per_proxy
+
+        self._idle: Dict[Optional[str], List[PooledBrowser]] = defaultdict(list)
+        self._lock = threading.Lock()
+        self.in_use = 0
+
+        self.launched = 0
+        self.reused = 0
+        self.recycled = 0
+        self.unhealthy = 0
+
+    @staticmethod
+    def is_healthy(browser: PooledBrowser) -> bool:
+        try:
+            return browser.driver.run_js("return 1") == 1
+        except Exception:
+            return False
+
+    def _quit(self, browser: PooledBrowser) -> None:
+        try:
+            browser.driver.quit()
+        except Exception:
+            pass
+
+    def _take_idle(self, proxy: Optional[str]) -> Optional[PooledBrowser]:
+        while True:
+            with self._lock:
+                idle = self._idle[proxy]
+                if not idle:
+                    return None
+                browser = idle.pop()
+
+            # checks run outside the lock, a dead browser can take a while to answer
+            if time.monotonic() - browser.last_used > self.max_idle:
+                self.recycled += 1
+            elif not self.is_healthy(browser):
+                self.unhealthy += 1
+            else:
+                return browser
+            self._quit(browser)
+
+    @contextmanager
+    def acquire(self, proxy: Optional[str] = None) -> Iterator[ChromiumPage]:
+        """Lends a warm browser for `proxy`, launching one when none is idle"""
+        browser = self._take_idle(proxy)
+        if browser is None:
+            browser = PooledBrowser(self.factory(proxy), proxy)
+            self.launched += 1
+        else:
+            self.reused += 1
+
+        with self._lock:
+            self.in_use += 1
+        try:
+            yield browser.driver
+        except BaseException:
+            # the page may be stuck mid-challenge, do not hand it to the next request
+            self._quit(browser)
+            raise
+        else:
+            self._release(browser)
+        finally:
+            with self._lock:
+                self.in_use -= 1
+
+    def _release(self, browser: PooledBrowser) -> None:
+        browser.uses += 1
+        browser.last_used = time.monotonic()
+
+        if browser.uses >= self.max_uses:
+            self.recycled += 1
+            self._quit(browser)
+            return
+
+        with self._lock:
+            idle = self._idle[browser.proxy]
+            if len(idle) < self.max_idle_per_proxy:
+                idle.append(browser)
+                return
+        self._quit(browser)
+
+    def close(self) -> None:
+        with self._lock:
+            browsers = [browser for idle in self._idle.values() for browser in idle]
+            self._idle.clear()
+        for browser in browsers:
+            self._quit(browser)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            idle = sum(len(browsers) for browsers in self._idle.values())
+        return {
+            "idle": idle,
+            "in_use": self.in_use,
+            "launched": self.launched,
+            "reused": self.reused,
+            "recycled": self.recycled,
+            "unhealthy": self.unhealthy,
+        }
+
+
+class CookieCache:
+    """
+    (url, proxy) -> cookies for `ttl` seconds, never past the cf_clearance expiry.
+    """
+
+    def __init__(self, ttl: float = 300.0):
+        self.ttl = ttl
+        self._entries: Dict[Tuple[str, Optional[str]], Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, url: str, proxy: Optional[str]) -> Optional[Any]:
+        key = (url, proxy)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.time():
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, url: str, proxy: Optional[str], value: Any, expires_at: Optional[float] = None) -> None:
+        valid_until = time.time() + self.ttl
+        if expires_at is not None:
+            valid_until = min(valid_until, expires_at)
+        with self._lock:
+            self._entries[(url, proxy)] = (valid_until, value)
+
+    def invalidate(self, url: str, proxy: Optional[str]) -> None:
+        with self._lock:
+            self._entries.pop((url, proxy), None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
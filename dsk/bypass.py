@@ -4,7 +4,8 @@ import os
 import sys
 import time
 import requests
-import json
+
+from cookies import write_cookies
 
 def validate_cookies(cookies_data):
     """Validate that cf_clearance cookie is present and not empty"""
@@ -15,6 +16,12 @@ def get_and_save_cookies(server_url, cookie_file_path, max_retries=3):
     for attempt in range(max_retries):
         try:
             response = requests.get(server_url)
+            if response.status_code == 503:
+                # the server is busy with other bypasses, come back when it says so
+                wait = float(response.headers.get('Retry-After', 5))
+                print(f"Attempt {attempt + 1}: server busy, retrying in {wait:.0f}s...")
+                time.sleep(wait)
+                continue
             response.raise_for_status()
             cookies_data = response.json()
 
@@ -27,10 +34,11 @@ def get_and_save_cookies(server_url, cookie_file_path, max_retries=3):
                 'cookies': cookies_data.get('cookies', {}),
                 'user_agent': cookies_data.get('user_agent', '')
             }
+            if cookies_data.get('expires_at'):
+                cookies_to_save['expires_at'] = cookies_data['expires_at']
 
-            os.makedirs(os.path.dirname(cookie_file_path), exist_ok=True)
-            with open(cookie_file_path, 'w', encoding='utf-8') as f:
-                json.dump(cookies_to_save, f, indent=4, ensure_ascii=False)
+            # atomic replace: the bot and sibling processes read this file concurrently
+            write_cookies(cookie_file_path, cookies_to_save)
             print("Successfully obtained and saved cookies with cf_clearance!")
             return True
 
@@ -45,6 +53,17 @@ def get_and_save_cookies(server_url, cookie_file_path, max_retries=3):
     print("Failed to obtain valid cf_clearance cookie after all attempts")
     return False
 
+def wait_for_server(server_url, timeout=30, interval=0.25):
+    """Polls until the bypass server accepts connections instead of sleeping a fixed time"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(server_url.split('/cookies')[0] + '/docs', timeout=1)
+            return True
+        except requests.exceptions.RequestException:
+            time.sleep(interval)
+    return False
+
 def run_server_background():
     script_dir = os.path.dirname(os.path.abspath(__file__))
     server_script = os.path.abspath(os.path.join(script_dir, "server.py"))
@@ -69,10 +88,15 @@ if __name__ == "__main__":
     server_process = run_server_background()
 
     if server_process:
-        # Increase initial wait time to ensure server is fully started
-        time.sleep(10)
-        server_url = "http://localhost:8000/cookies?url=https://chat.deepseek.com"
-        cookie_file = "dsk/cookies.json"
+        # fresh=true: the bot only asks when its clearance was rejected or is about to lapse
+        server_url = "http://localhost:8000/cookies?url=https://chat.deepseek.com&fresh=true"
+        # the cookie manager passes the path it reads from
+        cookie_file = sys.argv[1] if len(sys.argv) > 1 else "dsk/cookies.json"
+
+        if not wait_for_server(server_url):
+            print("Server did not start in time.")
+            server_process.terminate()
+            sys.exit(1)
 
         # Increase max retries for more reliability
         success = get_and_save_cookies(server_url, cookie_file, max_retries=5)
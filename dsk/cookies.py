@@ -0,0 +1,272 @@
+"""
+Process-wide holder for the Cloudflare cookies in dsk/cookies.json.
+
+Every DeepSeekAPI instance reads its cookies from one CookieManager, so a
+refresh done for one client is seen by all of them. Refreshes are single
+flight: callers that hit the Cloudflare page while a refresh is running wait
+for it and reuse its result instead of starting their own browser. Sibling
+processes share the same file; it is replaced atomically, its mtime tells a
+process that someone else already refreshed, and an advisory file lock keeps
+two processes from refreshing at once. Async clients share one in-flight
+refresh task per event loop, run on a dedicated thread, so waiting for a
+browser never occupies the loop's default executor.
+"""
+
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, in-process single flight still works
+    fcntl = None
+
+COOKIES_PATH = Path(__file__).parent / 'cookies.json'
+BYPASS_SCRIPT = Path(__file__).parent / 'bypass.py'
+
+
+def write_cookies(path: Path, data: Dict[str, Any]) -> None:
+    """Writes cookies.json atomically so readers never see a half-written file"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=4, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+class CookieManager:
+    """
+    Loads, shares and refreshes the cf_clearance cookies.
+
+    Args:
+        path: cookies.json location, shared with sibling processes
+        ttl: assumed cf_clearance lifetime in seconds when the file has no expires_at
+             (Cloudflare's default challenge passage is 30 minutes)
+        refresh_margin: refresh this many seconds before the cookie lapses
+        check_interval: how often to stat the file for changes made by other processes
+        refresh_timeout: upper bound for one bypass run
+    """
+
+    _default: Optional["CookieManager"] = None
+    _default_lock = threading.Lock()
+
+    def __init__(self,
+                 path: Path = COOKIES_PATH,
+                 ttl: float = 1800.0,
+                 refresh_margin: float = 300.0,
+                 check_interval: float = 1.0,
+                 refresh_timeout: float = 300.0):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.check_interval = check_interval
+        self.refresh_timeout = refresh_timeout
+
+        self._cookies: Dict[str, str] = {}
+        self._expires_at: Optional[float] = None
+        self._mtime_ns: Optional[int] = None
+        self._checked_at = 0.0
+        # bumped whenever the cookies change, callers use it to tell if a refresh already happened
+        self.version = 0
+
+        self._state_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # async refreshes: one bypass thread, one task the waiters of a loop share
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dsk-cookies-refresh")
+        self._async_refresh: Optional[asyncio.Future] = None
+
+        self.refreshes = 0
+        self.shared_refreshes = 0  # refresh requests served by someone else's refresh
+        self.failures = 0
+
+        self._reload(warn=True)
+
+    @classmethod
+    def default(cls) -> "CookieManager":
+        """The manager shared by every client in this process"""
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    @property
+    def cookies(self) -> Dict[str, str]:
+        """Current cookies, picking up a file rewritten by another process"""
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            if self._file_mtime() != self._mtime_ns:
+                self._reload()
+        return self._cookies
+
+    @property
+    def expires_at(self) -> Optional[float]:
+        """Unix time when cf_clearance lapses, None when there is no cookie yet"""
+        return self._expires_at
+
+    def _file_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _reload(self, warn: bool = False) -> bool:
+        mtime = self._file_mtime()
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            if warn:
+                print(f"\033[93mWarning: Could not load cookies from {self.path}: {e}\033[0m", file=sys.stderr)
+            return False
+
+        cookies = data.get('cookies', {})
+        if 'cf_clearance' in cookies:
+            expires_at = data.get('expires_at') or (mtime / 1e9 + self.ttl if mtime else None)
+        else:
+            expires_at = None
+
+        with self._state_lock:
+            # a rewritten file counts as a refresh even if Cloudflare handed out the same values
+            changed = cookies != self._cookies or mtime != self._mtime_ns
+            self._cookies = cookies
+            self._expires_at = expires_at
+            self._mtime_ns = mtime
+            if changed:
+                self.version += 1
+        self._wakeup.set()
+        return True
+
+    def refresh(self, seen_version: Optional[int] = None) -> Dict[str, str]:
+        """
+        Gets fresh cookies, at most one refresh at a time.
+
+        Pass the `version` observed when the request was sent: if the cookies
+        changed since then (another thread or process refreshed them), they are
+        returned right away without running the bypass again.
+        """
+        with self._refresh_lock:
+            if self._already_refreshed(seen_version):
+                return self._cookies
+
+            with self._file_lock():
+                # a sibling process may have finished a refresh while we waited for the lock
+                if self._already_refreshed(seen_version):
+                    return self._cookies
+                self._run_bypass()
+
+        return self._cookies
+
+    async def refresh_async(self, seen_version: Optional[int] = None) -> Dict[str, str]:
+        """
+        refresh() for async clients: concurrent callers await one shared task
+        instead of each parking a default-executor thread on the refresh lock.
+        """
+        loop = asyncio.get_running_loop()
+        pending = self._async_refresh
+        if pending is None or pending.done() or pending.get_loop() is not loop:
+            if seen_version is not None and self.version != seen_version:
+                self.shared_refreshes += 1
+                return self._cookies
+            pending = self._async_refresh = loop.run_in_executor(self._executor, self.refresh, seen_version)
+        else:
+            self.shared_refreshes += 1
+        # a cancelled waiter must not cancel the refresh the others are waiting for
+        return await asyncio.shield(pending)
+
+    def _already_refreshed(self, seen_version: Optional[int]) -> bool:
+        if seen_version is None:
+            return False
+        if self._file_mtime() != self._mtime_ns:
+            self._reload()
+        if self.version != seen_version:
+            self.shared_refreshes += 1
+            return True
+        return False
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        if fcntl is None:
+            yield
+            return
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path.with_name(self.path.name + '.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _run_bypass(self) -> None:
+        """Runs bypass.py; it writes the file before exiting, so it is read right after"""
+        try:
+            subprocess.run(
+                [sys.executable, str(BYPASS_SCRIPT), str(self.path)],
+                check=True,
+                timeout=self.refresh_timeout,
+            )
+            if not self._reload(warn=True):
+                raise ValueError("bypass finished without writing cookies")
+            self.refreshes += 1
+        except Exception as e:
+            self.failures += 1
+            print(f"\033[93mWarning: Failed to refresh cookies: {e}\033[0m", file=sys.stderr)
+
+    def start(self) -> None:
+        """Starts proactive refreshing before cf_clearance lapses; repeated calls do nothing"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._refresh_loop, name="dsk-cookies", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _refresh_loop(self) -> None:
+        while not self._stop.is_set():
+            self._wakeup.clear()
+            # notices refreshes done by other processes before deciding whether ours is due
+            self.cookies
+
+            if self._expires_at is None:
+                # nothing to keep alive yet, the first Cloudflare page will trigger a refresh
+                self._wakeup.wait(60)
+                continue
+
+            due_in = self._expires_at - self.refresh_margin - time.time()
+            if due_in > 0:
+                self._wakeup.wait(min(due_in, 60))
+                continue
+
+            version = self.version
+            self.refresh(version)
+            if self.version == version:
+                # the refresh failed, do not hammer the bypass server
+                self._stop.wait(30)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "has_clearance": 'cf_clearance' in self._cookies,
+            "expires_in": self._expires_at - time.time() if self._expires_at else None,
+            "refreshes": self.refreshes,
+            "shared_refreshes": self.shared_refreshes,
+            "failures": self.failures,
+        }
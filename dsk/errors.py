@@ -0,0 +1,36 @@
+from typing import Optional
+
+class DeepSeekError(Exception):
+    """Base exception for all DeepSeek API errors"""
+    pass
+
+class AuthenticationError(DeepSeekError):
+    """Raised when authentication fails"""
+    pass
+
+class RateLimitError(DeepSeekError):
+    """Raised when API rate limit is exceeded"""
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class NetworkError(DeepSeekError):
+    """Raised when network communication fails"""
+    pass
+
+class CloudflareError(DeepSeekError):
+    """Raised when Cloudflare blocks the request"""
+    pass
+
+class APIError(DeepSeekError):
+    """Raised when API returns an error response"""
+    def __init__(self, message: str, status_code: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+class CircuitOpenError(DeepSeekError):
+    """Raised without calling the API while the circuit breaker is open"""
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
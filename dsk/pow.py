@@ -10,13 +10,80 @@ required for authentication or rate limiting purposes.
 
 import json
 import base64
+import ctypes
+import struct
+import asyncio
+import hashlib
+import platform
+import multiprocessing
+import importlib.metadata
 import wasmtime
-import numpy as np
-from typing import Dict, Any
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Optional, Tuple
 import os
+import threading
 
 WASM_PATH = f'{os.path.dirname(__file__)}/wasm/sha3_wasm_bg.7b9ca65ddd.wasm'
 
+# Compiled modules are cached here, override with DSK_WASM_CACHE
+CACHE_DIR = os.environ.get('DSK_WASM_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'dsk'))
+
+# wasm_solve writes (i32 status, 4 bytes padding, f64 answer) at retptr
+_SOLVE_RESULT = struct.Struct('<i4xd')
+# wasm_deepseek_hash_v1 writes (i32 ptr, i32 len) of the hex digest at retptr
+_STR_RESULT   = struct.Struct('<ii')
+
+_engine: Optional[wasmtime.Engine] = None
+_modules: Dict[str, wasmtime.Module] = {}
+_modules_lock = threading.Lock()
+
+def _wasmtime_version() -> str:
+    try:
+        return importlib.metadata.version('wasmtime')
+    except importlib.metadata.PackageNotFoundError:
+        return 'unknown'
+
+def _cache_path(wasm_bytes: bytes) -> str:
+    # serialized modules are only valid for the exact wasmtime build and CPU they came from
+    digest = hashlib.sha256(wasm_bytes).hexdigest()[:16]
+    return os.path.join(CACHE_DIR, f'{digest}-wasmtime{_wasmtime_version()}-{platform.machine()}.cwasm')
+
+def _compile_cached(engine: wasmtime.Engine, wasm_bytes: bytes) -> wasmtime.Module:
+    path = _cache_path(wasm_bytes)
+
+    try:
+        return wasmtime.Module.deserialize_file(engine, path)
+    except (OSError, wasmtime.WasmtimeError):
+        pass
+
+    module = wasmtime.Module(engine, wasm_bytes)
+
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(module.serialize())
+        # atomic so concurrently starting workers never read a half written file
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+    return module
+
+def load_module(wasm_path: str = WASM_PATH) -> Tuple[wasmtime.Engine, wasmtime.Module]:
+    """Returns the process-wide engine and compiled module, using the on-disk cache when possible"""
+    global _engine
+
+    with _modules_lock:
+        if _engine is None:
+            _engine = wasmtime.Engine()
+
+        if wasm_path not in _modules:
+            with open(wasm_path, 'rb') as f:
+                _modules[wasm_path] = _compile_cached(_engine, f.read())
+
+        return _engine, _modules[wasm_path]
+
 class DeepSeekHash:
     def __init__(self):
         self.instance = None
@@ -24,30 +91,38 @@ class DeepSeekHash:
         self.store    = None
         
     def init(self, wasm_path: str):
-        engine = wasmtime.Engine()
-        
-        with open(wasm_path, 'rb') as f:
-            wasm_bytes = f.read()
-            
-        module = wasmtime.Module(engine, wasm_bytes)
+        # Engine and Module are thread-safe and shared, only the Store is per instance
+        engine, module = load_module(wasm_path)
         
         self.store = wasmtime.Store(engine)
         linker     = wasmtime.Linker(engine)
         linker.define_wasi()
         
         self.instance = linker.instantiate(self.store, module)
-        self.memory   = self.instance.exports(self.store)["memory"]
+
+        # every exports() lookup walks the whole export table, resolve the handles once
+        exports            = self.instance.exports(self.store)
+        self.memory        = exports["memory"]
+        self._alloc        = exports["__wbindgen_export_0"]
+        self._stack_ptr    = exports["__wbindgen_add_to_stack_pointer"]
+        self._solve        = exports["wasm_solve"]
+        self._hash         = exports["wasm_deepseek_hash_v1"]
+        self._free         = exports["__wbindgen_export_2"]
         
         return self
+
+    def _memory_address(self) -> int:
+        # the linear memory can move when it grows, never cache this across wasm calls
+        return ctypes.addressof(self.memory.data_ptr(self.store).contents)
     
     def _write_to_memory(self, text: str) -> tuple[int, int]:
+        # wasm_solve takes ownership of (and frees) the buffers, so each call allocates;
+        # the allocator hands the same blocks back on the next solve anyway
         encoded = text.encode('utf-8')
         length  = len(encoded)
-        ptr     = self.instance.exports(self.store)["__wbindgen_export_0"](self.store, length, 1)
+        ptr     = self._alloc(self.store, length, 1)
         
-        memory_view = self.memory.data_ptr(self.store)
-        for i, byte in enumerate(encoded):
-            memory_view[ptr + i] = byte
+        ctypes.memmove(self._memory_address() + ptr, encoded, length)
             
         return ptr, length
     
@@ -55,13 +130,13 @@ class DeepSeekHash:
                       difficulty: int, expire_at: int) -> float:
         
         prefix = f"{salt}_{expire_at}_"  
-        retptr = self.instance.exports(self.store)["__wbindgen_add_to_stack_pointer"](self.store, -16)
+        retptr = self._stack_ptr(self.store, -16)
         
         try:
             challenge_ptr, challenge_len = self._write_to_memory(challenge)
             prefix_ptr, prefix_len       = self._write_to_memory(prefix)
             
-            self.instance.exports(self.store)["wasm_solve"](
+            self._solve(
                 self.store,
                 retptr, 
                 challenge_ptr, 
@@ -71,41 +146,146 @@ class DeepSeekHash:
                 float(difficulty)
             )
             
-            memory_view = self.memory.data_ptr(self.store)
-            status      = int.from_bytes(bytes(memory_view[retptr:retptr + 4]), byteorder='little', signed=True)
+            status, value = _SOLVE_RESULT.unpack(
+                ctypes.string_at(self._memory_address() + retptr, _SOLVE_RESULT.size)
+            )
             
             if status == 0:
                 return None
             
-            value_bytes = bytes(memory_view[retptr + 8:retptr + 16])
-            value       = np.frombuffer(value_bytes, dtype=np.float64)[0]
-            
             return int(value)
             
         finally:
-            self.instance.exports(self.store)["__wbindgen_add_to_stack_pointer"](self.store, 16)
+            self._stack_ptr(self.store, 16)
+
+    def hash_v1(self, text: str) -> str:
+        """Returns the DeepSeekHashV1 hex digest of text, as the challenge field expects it"""
+        retptr = self._stack_ptr(self.store, -16)
+
+        try:
+            text_ptr, text_len = self._write_to_memory(text)
+            self._hash(self.store, retptr, text_ptr, text_len)
+
+            address          = self._memory_address()
+            out_ptr, out_len = _STR_RESULT.unpack(ctypes.string_at(address + retptr, _STR_RESULT.size))
+            digest           = ctypes.string_at(address + out_ptr, out_len).decode()
+            self._free(self.store, out_ptr, out_len, 1)
+
+            return digest
+
+        finally:
+            self._stack_ptr(self.store, 16)
+
+def _encode_response(config: Dict[str, Any], answer: Optional[int]) -> str:
+    result = {
+        'algorithm': config['algorithm'],
+        'challenge': config['challenge'],
+        'salt': config['salt'],
+        'answer': answer,
+        'signature': config['signature'],
+        'target_path': config['target_path']
+    }
+    
+    return base64.b64encode(json.dumps(result).encode()).decode()
+
+def _calculate(hasher: DeepSeekHash, config: Dict[str, Any]) -> Optional[int]:
+    return hasher.calculate_hash(
+        config['algorithm'],
+        config['challenge'],
+        config['salt'],
+        config['difficulty'],
+        config['expire_at']
+    )
+
+# Selectable solver backends, both implement calculate_hash/hash_v1
+POW_BACKENDS = ('wasm', 'numpy')
+
+def create_hasher(backend: str = 'wasm'):
+    if backend == 'wasm':
+        return DeepSeekHash().init(WASM_PATH)
+    if backend == 'numpy':
+        from .pow_numpy import NumpyDeepSeekHash
+        return NumpyDeepSeekHash()
+    raise ValueError(f"Unknown PoW backend {backend!r}, expected one of {POW_BACKENDS}")
 
 class DeepSeekPOW:
-    def __init__(self):
-        self.hasher = DeepSeekHash().init(WASM_PATH)
+    def __init__(self, backend: str = 'wasm'):
+        self.backend = backend
+        # wasmtime.Store is not thread-safe, so every thread gets its own instance
+        self._local = threading.local()
+        # build the constructing thread's instance eagerly so a bad backend fails here
+        self.hasher
+    
+    @property
+    def hasher(self) -> DeepSeekHash:
+        hasher = getattr(self._local, 'hasher', None)
+        if hasher is None:
+            hasher = self._local.hasher = create_hasher(self.backend)
+        return hasher
     
     def solve_challenge(self, config: Dict[str, Any]) -> str:
         """Solves a proof-of-work challenge and returns the encoded response"""
-        answer = self.hasher.calculate_hash(
-            config['algorithm'],
-            config['challenge'],
-            config['salt'],
-            config['difficulty'],
-            config['expire_at']
+        return _encode_response(config, _calculate(self.hasher, config))
+
+    async def solve_challenge_async(self, config: Dict[str, Any]) -> str:
+        """Solves a challenge in a worker thread without blocking the event loop"""
+        return await asyncio.to_thread(self.solve_challenge, config)
+
+    def close(self) -> None:
+        pass
+
+# Each pool worker process keeps its own initialized hasher
+_worker_hasher: Optional[DeepSeekHash] = None
+
+def _init_worker(backend: str) -> None:
+    global _worker_hasher
+    _worker_hasher = create_hasher(backend)
+
+def _solve_in_worker(config: Dict[str, Any]) -> str:
+    return _encode_response(config, _calculate(_worker_hasher, config))
+
+class DeepSeekPOWPool:
+    """
+    Solves challenges on a pool of worker processes, one wasm instance per process.
+
+    Drop-in replacement for DeepSeekPOW when several solves have to run at once:
+    throughput scales with the number of workers instead of queueing on a single
+    wasm instance.
+    """
+
+    def __init__(self, workers: Optional[int] = None, max_pending: Optional[int] = None, backend: str = 'wasm'):
+        """
+        Args:
+            workers (Optional[int]): Number of worker processes, defaults to os.cpu_count()
+            max_pending (Optional[int]): Maximum solves queued or running through
+                solve_challenge_async, defaults to 4 per worker
+            backend (str): Solver backend each worker uses, one of POW_BACKENDS
+        """
+        if backend not in POW_BACKENDS:
+            raise ValueError(f"Unknown PoW backend {backend!r}, expected one of {POW_BACKENDS}")
+
+        self.backend     = backend
+        self.workers     = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 4
+        self._executor   = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(backend,),
         )
-        
-        result = {
-            'algorithm': config['algorithm'],
-            'challenge': config['challenge'],
-            'salt': config['salt'],
-            'answer': answer,
-            'signature': config['signature'],
-            'target_path': config['target_path']
-        }
-        
-        return base64.b64encode(json.dumps(result).encode()).decode()
\ No newline at end of file
+        self._pending: Optional[asyncio.Semaphore] = None
+
+    def solve_challenge(self, config: Dict[str, Any]) -> str:
+        """Solves a proof-of-work challenge and returns the encoded response"""
+        return self._executor.submit(_solve_in_worker, config).result()
+
+    async def solve_challenge_async(self, config: Dict[str, Any]) -> str:
+        """Solves a challenge on the pool, waiting for a free slot once max_pending solves are queued"""
+        if self._pending is None:
+            self._pending = asyncio.Semaphore(self.max_pending)
+
+        async with self._pending:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, _solve_in_worker, config)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,135 @@
+"""
+Pure NumPy implementation of DeepSeekHashV1.
+
+DeepSeekHashV1 is SHA3-256 (rate 136, 0x06 padding) with one change: the
+Keccak-f[1600] permutation skips round 0 and runs rounds 1..23 only. The
+solver searches nonces in vectorized batches, one column per candidate, and
+is interchangeable with the wasm DeepSeekHash.
+"""
+
+from typing import List, Optional
+
+import numpy as np
+
+RATE = 136
+
+ROUND_CONSTANTS = [
+    0x0000000000000001, 0x0000000000008082, 0x800000000000808A, 0x8000000080008000,
+    0x000000000000808B, 0x0000000080000001, 0x8000000080008081, 0x8000000000008009,
+    0x000000000000008A, 0x0000000000000088, 0x0000000080008009, 0x000000008000000A,
+    0x000000008000808B, 0x800000000000008B, 0x8000000000008089, 0x8000000000008003,
+    0x8000000000008002, 0x8000000000000080, 0x000000000000800A, 0x800000008000000A,
+    0x8000000080008081, 0x8000000000008080, 0x0000000080000001, 0x8000000080008008,
+]
+
+# DeepSeek's variant: round 0 is skipped
+ROUNDS = [np.uint64(rc) for rc in ROUND_CONSTANTS[1:]]
+
+# rho offsets indexed by lane x + 5 * y
+ROTATIONS = [
+     0,  1, 62, 28, 27,
+    36, 44,  6, 55, 20,
+     3, 10, 43, 25, 39,
+    41, 45, 15, 21,  8,
+    18,  2, 61, 56, 14,
+]
+
+# pi: lane x + 5 * y moves to y + 5 * ((2x + 3y) % 5)
+PI_TARGET = [y + 5 * ((2 * x + 3 * y) % 5) for y in range(5) for x in range(5)]
+
+_SHIFTS = [(np.uint64(r), np.uint64(64 - r)) for r in ROTATIONS]
+
+
+def _keccak_f(lanes: List[np.ndarray]) -> List[np.ndarray]:
+    """Runs the reduced Keccak-f[1600] on 25 lane vectors, one column per message"""
+    a = lanes
+    for rc in ROUNDS:
+        # theta
+        c = [a[x] ^ a[x + 5] ^ a[x + 10] ^ a[x + 15] ^ a[x + 20] for x in range(5)]
+        d = [c[(x - 1) % 5] ^ ((c[(x + 1) % 5] << np.uint64(1)) | (c[(x + 1) % 5] >> np.uint64(63))) for x in range(5)]
+
+        # rho + pi
+        b: List[Optional[np.ndarray]] = [None] * 25
+        for i in range(25):
+            lane = a[i] ^ d[i % 5]
+            left, right = _SHIFTS[i]
+            b[PI_TARGET[i]] = (lane << left) | (lane >> right) if ROTATIONS[i] else lane
+
+        # chi
+        a = [b[i] ^ (~b[(i % 5 + 1) % 5 + 5 * (i // 5)] & b[(i % 5 + 2) % 5 + 5 * (i // 5)]) for i in range(25)]
+
+        # iota
+        a[0] = a[0] ^ rc
+    return a
+
+
+def _hash_rows(messages: np.ndarray) -> List[np.ndarray]:
+    """Hashes equally long messages, one per row of a uint8 matrix, returns the 4 digest lanes"""
+    count, length = messages.shape
+    blocks = length // RATE + 1
+
+    padded = np.zeros((count, blocks * RATE), dtype=np.uint8)
+    padded[:, :length] = messages
+    padded[:, length] ^= 0x06
+    padded[:, -1] ^= 0x80
+
+    words = padded.view('<u8').T  # (blocks * 17, count)
+    lanes = [np.zeros(count, dtype=np.uint64) for _ in range(25)]
+    for block in range(blocks):
+        for i in range(RATE // 8):
+            lanes[i] = lanes[i] ^ words[block * (RATE // 8) + i]
+        lanes = _keccak_f(lanes)
+
+    return lanes[:4]
+
+
+class NumpyDeepSeekHash:
+    """DeepSeekHashV1 solver with the same interface as the wasm DeepSeekHash"""
+
+    def __init__(self, batch_size: int = 4096):
+        self.batch_size = batch_size
+
+    def init(self, wasm_path: Optional[str] = None):
+        # nothing to load, kept for interface parity with DeepSeekHash
+        return self
+
+    def hash_v1(self, text: str) -> str:
+        """Returns the DeepSeekHashV1 hex digest of text"""
+        message = np.frombuffer(text.encode('utf-8'), dtype=np.uint8)[None, :]
+        digest = _hash_rows(message)
+        return b''.join(int(lane[0]).to_bytes(8, 'little') for lane in digest).hex()
+
+    def _candidates(self, prefix: bytes, start: int, stop: int, digits: int) -> np.ndarray:
+        """Builds the rows prefix + str(nonce) for nonce in [start, stop), all with `digits` digits"""
+        nonces = np.arange(start, stop, dtype=np.int64)
+        rows = np.empty((stop - start, len(prefix) + digits), dtype=np.uint8)
+        rows[:, :len(prefix)] = np.frombuffer(prefix, dtype=np.uint8)
+        for position in range(digits):
+            power = 10 ** (digits - 1 - position)
+            rows[:, len(prefix) + position] = (nonces // power) % 10 + 48
+        return rows
+
+    def calculate_hash(self, algorithm: str, challenge: str, salt: str,
+                       difficulty: int, expire_at: int) -> Optional[int]:
+        if algorithm != 'DeepSeekHashV1':
+            raise ValueError(f"Unsupported PoW algorithm: {algorithm}")
+
+        prefix = f"{salt}_{expire_at}_".encode('utf-8')
+        target = [np.uint64(int.from_bytes(bytes.fromhex(challenge)[i * 8:(i + 1) * 8], 'little')) for i in range(4)]
+
+        start = 0
+        while start < difficulty:
+            digits = len(str(start))
+            # a batch never straddles a change in the number of digits
+            stop = min(start + self.batch_size, difficulty, 10 ** digits)
+
+            lanes = _hash_rows(self._candidates(prefix, start, stop, digits))
+            matches = (lanes[0] == target[0]) & (lanes[1] == target[1]) & (lanes[2] == target[2]) & (lanes[3] == target[3])
+
+            hits = np.flatnonzero(matches)
+            if hits.size:
+                return start + int(hits[0])
+
+            start = stop
+
+        return None
@@ -0,0 +1,161 @@
+"""
+Pool of pre-solved proof-of-work tokens for /chat/completion.
+
+A background task fetches challenges and solves them ahead of demand so a
+completion can pick up a ready `x-ds-pow-response` header instead of paying a
+challenge round trip plus a solve on the critical path.
+"""
+
+import asyncio
+import random
+import sys
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple, TYPE_CHECKING
+
+from .errors import AuthenticationError
+
+if TYPE_CHECKING:
+    from .api import AsyncDeepSeekAPI
+
+
+class PowTokenPool:
+    def __init__(self,
+                 api: "AsyncDeepSeekAPI",
+                 size: int = 4,
+                 refill_interval: float = 0.5,
+                 expire_margin: float = 5.0,
+                 max_backoff: float = 60.0):
+        """
+        Args:
+            api (AsyncDeepSeekAPI): Client used to fetch and solve challenges
+            size (int): How many solved tokens to keep ready
+            refill_interval (float): Minimum pause in seconds between two refills
+            expire_margin (float): Tokens closer than this many seconds to expire_at are dropped
+            max_backoff (float): Upper bound of the pause after consecutive refill failures
+        """
+        self.api = api
+        self.size = size
+        self.refill_interval = refill_interval
+        self.expire_margin = expire_margin
+        self.max_backoff = max_backoff
+
+        self._tokens: Deque[Tuple[float, str]] = deque()  # (expires_at in epoch seconds, header)
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._failures = 0  # consecutive refill errors, drives the backoff
+        # (token, cookies version) the challenge endpoint rejected; no refills until one of them changes
+        self._auth_failed_for: Optional[Tuple[str, int]] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.errors = 0
+
+    @staticmethod
+    def _expires_at(challenge: Dict[str, Any]) -> float:
+        # expire_at comes in milliseconds since epoch
+        return challenge['expire_at'] / 1000
+
+    def _credentials(self) -> Tuple[str, int]:
+        return self.api.auth_token, self.api.cookie_manager.version
+
+    @property
+    def auth_failed(self) -> bool:
+        """True while the current token and cookies are the ones the challenge endpoint rejected"""
+        return self._auth_failed_for is not None and self._auth_failed_for == self._credentials()
+
+    def mark_auth_failed(self) -> None:
+        self._auth_failed_for = self._credentials()
+
+    def start(self) -> None:
+        """Starts the refill task, safe to call repeatedly; a no-op after an auth failure until credentials change"""
+        if self.auth_failed:
+            return
+        self._auth_failed_for = None
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refill_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._tokens.clear()
+
+    def _drop_stale(self) -> None:
+        deadline = time.time() + self.expire_margin
+        while self._tokens and self._tokens[0][0] <= deadline:
+            self._tokens.popleft()
+            self.expired += 1
+
+    def get(self) -> Optional[str]:
+        """Returns a ready pow header, or None when the caller has to solve inline"""
+        self._drop_stale()
+        self._wakeup.set()
+
+        if self._tokens:
+            self.hits += 1
+            return self._tokens.popleft()[1]
+
+        self.misses += 1
+        return None
+
+    def _backoff(self, error: Exception) -> float:
+        """Exponential pause with jitter, so failing processes do not hit the endpoint in lockstep"""
+        delay = min(self.max_backoff, self.refill_interval * (2 ** self._failures))
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        retry_after = getattr(error, 'retry_after', None)
+        if retry_after:
+            delay = max(delay, retry_after)
+        return delay
+
+    async def _refill_loop(self) -> None:
+        while True:
+            self._drop_stale()
+
+            if len(self._tokens) >= self.size:
+                self._wakeup.clear()
+                # sleep until someone takes a token or the oldest one is about to go stale
+                timeout = max(self._tokens[0][0] - self.expire_margin - time.time(), self.refill_interval)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                challenge = await self.api._get_pow_challenge()
+                header = await self.api._solve_challenge(challenge)
+                self._tokens.append((self._expires_at(challenge), header))
+            except asyncio.CancelledError:
+                raise
+            except AuthenticationError as e:
+                # retrying will not fix the token; start() stays a no-op until the token or cookies change
+                self.errors += 1
+                self.mark_auth_failed()
+                print(f"\033[93mWarning: PoW pool stopped, authentication failed: {e}\033[0m", file=sys.stderr)
+                return
+            except Exception as e:
+                self.errors += 1
+                self._failures += 1
+                delay = self._backoff(e)
+                print(f"\033[93mWarning: Failed to refill PoW pool, retrying in {delay:.1f}s: {e}\033[0m",
+                      file=sys.stderr)
+                await asyncio.sleep(delay)
+                continue
+
+            self._failures = 0
+            await asyncio.sleep(self.refill_interval)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'ready': len(self._tokens),
+            'hits': self.hits,
+            'misses': self.misses,
+            'expired': self.expired,
+            'errors': self.errors,
+        }
@@ -0,0 +1,239 @@
+"""
+Retry budget, circuit breaker and backoff shared by every retrying layer.
+
+The bot retries at three levels (UserBot reply, ai.DeepSeek call, DeepSeekAPI
+request). Each level asks the same RetryPolicy whether another attempt is
+allowed, so the total number of retries is capped by one RetryBudget instead of
+multiplying across levels, and every level fails fast while the upstream's
+CircuitBreaker is open.
+"""
+
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Any, Deque, Dict, Iterator, Optional, Type
+
+from .errors import APIError, CircuitOpenError, NetworkError, RateLimitError
+
+# failures that say something about the upstream's health, and are worth retrying
+RETRYABLE_ERRORS = (RateLimitError, NetworkError)
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    if isinstance(error, RETRYABLE_ERRORS):
+        return True
+    return isinstance(error, APIError) and (error.status_code or 0) >= 500
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parses a Retry-After header given either as seconds or as an HTTP date"""
+    if not value:
+        return None
+
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryBudget:
+    """
+    Caps retries at a fraction of recent requests.
+
+    Within the sliding window, retries may not exceed
+    `ratio * requests + min_per_second * window`, so a healthy upstream
+    still gets a few retries while an unhealthy one is not flooded.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_per_second: float = 0.5, window: float = 10.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.window = window
+
+        self._requests: Deque[float] = deque()
+        self._retries: Deque[float] = deque()
+        self._lock = threading.Lock()
+
+        self.total_requests = 0
+        self.total_retries = 0
+        self.total_rejected = 0
+
+    def _trim(self, now: float) -> None:
+        horizon = now - self.window
+        while self._requests and self._requests[0] < horizon:
+            self._requests.popleft()
+        while self._retries and self._retries[0] < horizon:
+            self._retries.popleft()
+
+    def record_request(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            self._requests.append(now)
+            self.total_requests += 1
+
+    def try_withdraw(self) -> bool:
+        """Reserves one retry, returns False when the budget is spent"""
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            allowed = self.ratio * len(self._requests) + self.min_per_second * self.window
+            if len(self._retries) >= allowed:
+                self.total_rejected += 1
+                return False
+            self._retries.append(now)
+            self.total_retries += 1
+            return True
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            self._trim(time.monotonic())
+            allowed = self.ratio * len(self._requests) + self.min_per_second * self.window
+            return {
+                'window_requests': len(self._requests),
+                'window_retries': len(self._retries),
+                'window_allowed': allowed,
+                'usage': len(self._retries) / allowed if allowed else 1.0,
+                'total_requests': self.total_requests,
+                'total_retries': self.total_retries,
+                'total_rejected': self.total_rejected,
+            }
+
+
+class CircuitBreaker:
+    """
+    Classic closed -> open -> half-open breaker.
+
+    After `failure_threshold` consecutive upstream failures the breaker opens
+    and calls fail immediately with CircuitOpenError for `reset_timeout`
+    seconds (or longer, if the upstream sent a longer Retry-After). Then a
+    single probe call is let through; its outcome closes or re-opens it.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str = 'deepseek', failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_until = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+        self.total_opened = 0
+        self.total_short_circuited = 0
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self.state == self.OPEN:
+                remaining = self._opened_until - time.monotonic()
+                if remaining > 0:
+                    self.total_short_circuited += 1
+                    raise CircuitOpenError(f"Circuit '{self.name}' is open", retry_after=remaining)
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+
+            if self.state == self.HALF_OPEN:
+                if self._probe_in_flight:
+                    self.total_short_circuited += 1
+                    raise CircuitOpenError(f"Circuit '{self.name}' is half-open, probe in flight")
+                self._probe_in_flight = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self, retry_after: Optional[float] = None) -> None:
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.total_opened += 1
+                self.state = self.OPEN
+                self._opened_until = time.monotonic() + max(self.reset_timeout, retry_after or 0.0)
+            self._probe_in_flight = False
+
+    def release(self) -> None:
+        """Frees a half-open probe slot when the call ended without a verdict"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    @contextmanager
+    def track(self, *failures: Type[BaseException]) -> Iterator[None]:
+        """
+        Guards one upstream call: fails fast while open, records the outcome otherwise.
+
+        Besides rate limits, network and 5xx errors, exceptions of the given
+        `failures` types (e.g. the transport's own errors) count as failures.
+        """
+        self.before_call()
+        try:
+            yield
+        except BaseException as e:
+            if is_upstream_failure(e) or isinstance(e, failures):
+                self.record_failure(getattr(e, 'retry_after', None))
+            else:
+                self.release()
+            raise
+        else:
+            self.record_success()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self._failures,
+                'open_seconds_left': max(self._opened_until - time.monotonic(), 0.0) if self.state == self.OPEN else 0.0,
+                'total_opened': self.total_opened,
+                'total_short_circuited': self.total_short_circuited,
+            }
+
+
+class RetryPolicy:
+    """
+    Decides whether one more attempt is allowed and how long to wait for it.
+
+    Waits honour the upstream's Retry-After when there is one and use full
+    jitter exponential backoff otherwise. Errors raised by an open breaker
+    are never retried.
+    """
+
+    def __init__(self,
+                 budget: RetryBudget,
+                 max_attempts: int = 3,
+                 base_delay: float = 0.5,
+                 max_delay: float = 30.0):
+        self.budget = budget
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def should_retry(self, attempt: int, error: BaseException, max_attempts: Optional[int] = None) -> bool:
+        """`attempt` is the 1-based number of the attempt that just failed"""
+        if isinstance(error, CircuitOpenError) or not isinstance(error, RETRYABLE_ERRORS):
+            return False
+        if attempt >= (max_attempts or self.max_attempts):
+            return False
+        return self.budget.try_withdraw()
+
+    def backoff(self, attempt: int, error: Optional[BaseException] = None) -> float:
+        retry_after = getattr(error, 'retry_after', None)
+        if retry_after is not None:
+            # a little jitter on top so clients told the same deadline do not return in lockstep
+            return min(retry_after + random.uniform(0, self.base_delay), self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
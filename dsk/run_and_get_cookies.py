@@ -4,7 +4,8 @@ import os
 import sys
 import time
 import requests
-import json
+
+from cookies import write_cookies
 
 def get_and_save_cookies(server_url, cookie_file_path):
     for attempt in range(5):
@@ -18,9 +19,7 @@ def get_and_save_cookies(server_url, cookie_file_path):
                 'user_agent': cookies_data.get('user_agent', '')
             }
 
-            os.makedirs(os.path.dirname(cookie_file_path), exist_ok=True)
-            with open(cookie_file_path, 'w', encoding='utf-8') as f:
-                json.dump(cookies_to_save, f, indent=4, ensure_ascii=False)
+            write_cookies(cookie_file_path, cookies_to_save)
             return
 
         except requests.exceptions.ConnectionError as e:
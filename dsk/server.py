@@ -1,25 +1,41 @@
+import asyncio
 import json
+import math
 import re
 import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse
 
 from CloudflareBypasser import CloudflareBypasser
+from browser_pool import BrowserPool, CookieCache
 from DrissionPage import ChromiumPage, ChromiumOptions
 from fastapi import FastAPI, HTTPException, Response
 from pydantic import BaseModel
-from typing import Dict
+from typing import Callable, Dict, Optional, TypeVar
 import argparse
+import statistics
 
 from pyvirtualdisplay import Display
 import uvicorn
 import atexit
-import time
 
 # Check if running in Docker mode
 DOCKER_MODE = os.getenv("DOCKERMODE", "false").lower() == "true"
 
 SERVER_PORT = int(os.getenv("SERVER_PORT", 8000))
 
+# warm browsers: recycled after this many requests, idle ones kept per proxy
+BROWSER_MAX_USES = int(os.getenv("BROWSER_MAX_USES", 50))
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", 2))
+# seconds a (url, proxy) -> cookies answer is reused, 0 disables the cache
+COOKIE_CACHE_TTL = float(os.getenv("COOKIE_CACHE_TTL", 300))
+# bypasses running at once, requests allowed to wait for a slot and for how long
+BYPASS_WORKERS = int(os.getenv("BYPASS_WORKERS", 2))
+BYPASS_QUEUE_DEPTH = int(os.getenv("BYPASS_QUEUE_DEPTH", 8))
+BYPASS_QUEUE_TIMEOUT = float(os.getenv("BYPASS_QUEUE_TIMEOUT", 60))
+
 # Chromium options arguments
 arguments = [
     # "--remote-debugging-port=9222",  # Add this line for remote debugging
@@ -47,6 +63,15 @@ app = FastAPI()
 class CookieResponse(BaseModel):
     cookies: Dict[str, str]
     user_agent: str
+    expires_at: Optional[float] = None  # cf_clearance expiry, unix time
+
+
+def clearance_expiry(driver: ChromiumPage) -> Optional[float]:
+    """Expiry of the cf_clearance cookie, if the browser reports one"""
+    for cookie in driver.cookies(all_info=True):
+        if cookie.get("name") == "cf_clearance" and cookie.get("expiry"):
+            return float(cookie["expiry"])
+    return None
 
 
 # Function to check if the URL is safe
@@ -73,63 +98,212 @@ def verify_page_loaded(driver: ChromiumPage) -> bool:
         return False
 
 
-# Function to bypass Cloudflare protection
-def bypass_cloudflare(url: str, retries: int, log: bool, proxy: str = None) -> ChromiumPage:
-    max_load_retries = 3
+# Function to launch a browser for the pool
+def new_browser(proxy: Optional[str] = None) -> ChromiumPage:
+    options = ChromiumOptions().auto_port()
+    if DOCKER_MODE:
+        options.set_argument("--auto-open-devtools-for-tabs", "true")
+        options.set_argument("--remote-debugging-port=9222")
+        options.set_argument("--no-sandbox")  # Necessary for Docker
+        options.set_argument("--disable-gpu")  # Optional, helps in some cases
+        options.set_paths(browser_path=browser_path).headless(False)
+    else:
+        options.set_paths(browser_path=browser_path).headless(False)
 
-    for load_attempt in range(max_load_retries):
-        options = ChromiumOptions().auto_port()
-        if DOCKER_MODE:
-            options.set_argument("--auto-open-devtools-for-tabs", "true")
-            options.set_argument("--remote-debugging-port=9222")
-            options.set_argument("--no-sandbox")  # Necessary for Docker
-            options.set_argument("--disable-gpu")  # Optional, helps in some cases
-            options.set_paths(browser_path=browser_path).headless(False)
+    if proxy:
+        options.set_proxy(proxy)
+
+    return ChromiumPage(addr_or_opts=options)
+
+
+browser_pool = BrowserPool(new_browser, max_uses=BROWSER_MAX_USES, max_idle_per_proxy=BROWSER_POOL_SIZE)
+cookie_cache = CookieCache(ttl=COOKIE_CACHE_TTL)
+atexit.register(browser_pool.close)
+
+T = TypeVar("T")
+
+
+class Saturated(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__("Bypass queue is full")
+        self.retry_after = retry_after
+
+
+class BypassQueue:
+    """
+    Runs blocking bypasses on a bounded thread pool so the event loop stays free.
+
+    At most `workers` bypasses run at once, at most `depth` more wait for a
+    slot, and none waits longer than `timeout`. Anything beyond that is
+    rejected with a Retry-After estimated from recent bypass latency.
+    """
+
+    def __init__(self, workers: int, depth: int, timeout: float, history: int = 200):
+        self.workers = workers
+        self.depth = depth
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bypass")
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.waiting = 0
+        self.running = 0
+        self.latencies = deque(maxlen=history)
+
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def retry_after(self) -> int:
+        typical = statistics.median(self.latencies) if self.latencies else 30.0
+        return max(1, math.ceil(typical * (self.waiting + self.running) / self.workers))
+
+    async def run(self, fn: Callable[..., T], *args) -> T:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+
+        # waiting also counts requests that are about to take a free slot
+        if self.waiting + self.running >= self.workers + self.depth:
+            self.rejected += 1
+            raise Saturated(self.retry_after())
+
+        # not wait_for: it can time out right after the acquire went through (seen on 3.11)
+        # and the slot is never released
+        self.waiting += 1
+        acquire = asyncio.ensure_future(self._slots.acquire())
+        try:
+            await asyncio.wait((acquire,), timeout=self.timeout)
+        except BaseException:
+            # the caller went away: give back a slot that was already granted
+            if acquire.done() and not acquire.cancelled():
+                self._slots.release()
+            else:
+                acquire.cancel()
+            raise
+        finally:
+            self.waiting -= 1
+
+        if not acquire.done():
+            # a cancelled Semaphore.acquire passes on a slot it was handed in the meantime
+            acquire.cancel()
+            self.timed_out += 1
+            raise Saturated(self.retry_after())
+
+        self.running += 1
+        start = time.perf_counter()
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        except Exception:
+            self.failed += 1
+            raise
         else:
-            options.set_paths(browser_path=browser_path).headless(False)
+            self.completed += 1
+            return result
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+            self.running -= 1
+            self._slots.release()
 
-        if proxy:
-            options.set_proxy(proxy)
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
 
-        driver = ChromiumPage(addr_or_opts=options)
+    def stats(self) -> Dict[str, float]:
+        latencies = list(self.latencies)
+        # 5% steps: [9] is the median, [18] the 95th percentile
+        cuts = statistics.quantiles(latencies, n=20, method="inclusive") if len(latencies) > 1 else latencies * 19
+
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "queue_depth": self.waiting,
+            "queue_limit": self.depth,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "latency_p50": cuts[9] if cuts else None,
+            "latency_p95": cuts[18] if cuts else None,
+            "latency_max": max(latencies, default=None),
+        }
+
+
+bypass_queue = BypassQueue(BYPASS_WORKERS, BYPASS_QUEUE_DEPTH, BYPASS_QUEUE_TIMEOUT)
+atexit.register(bypass_queue.close)
+
+
+def saturated_response(e: Saturated) -> HTTPException:
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+
+# Function to bypass Cloudflare protection
+def bypass_cloudflare(driver: ChromiumPage, url: str, retries: int, log: bool, fresh: bool = False) -> Dict[str, float]:
+    """Runs the bypass on driver, returns seconds spent per phase"""
+    if fresh:
+        # a warm browser still holds the clearance the caller just saw rejected
+        driver.set.cookies.clear()
+
+    cf_bypasser = CloudflareBypasser(driver, retries, log)
+    cf_bypasser.load(url)
+
+    if not verify_page_loaded(driver):
+        raise Exception("Failed to load page properly")
+
+    cf_bypasser.bypass()
+    return cf_bypasser.timings
+
+
+# Function to run a bypass on a pooled browser and read the result before giving it back
+def with_bypassed_page(url: str, retries: int, log: bool, proxy: Optional[str],
+                       read: Callable[[ChromiumPage], T], fresh: bool = False) -> T:
+    max_load_retries = 3
+
+    for load_attempt in range(max_load_retries):
         try:
-            driver.get(url)
-            # Wait for initial page load
-            time.sleep(5)
-
-            if not verify_page_loaded(driver):
-                driver.quit()
-                if load_attempt < max_load_retries - 1:
-                    time.sleep(3)
-                    continue
-                else:
-                    raise Exception("Failed to load page properly after multiple attempts")
-
-            cf_bypasser = CloudflareBypasser(driver, retries, log)
-            cf_bypasser.bypass()
-            return driver
-        except Exception as e:
-            driver.quit()
+            # a failed browser is closed by the pool, the next attempt gets another one
+            with browser_pool.acquire(proxy) as driver:
+                bypass_cloudflare(driver, url, retries, log, fresh)
+                return read(driver)
+        except Exception:
             if load_attempt < max_load_retries - 1:
-                time.sleep(3)
                 continue
-            raise e
+            raise
+
+
+def read_cookies(driver: ChromiumPage) -> CookieResponse:
+    cookies = {cookie.get("name", ""): cookie.get("value", " ") for cookie in driver.cookies()}
+    return CookieResponse(cookies=cookies, user_agent=driver.user_agent, expires_at=clearance_expiry(driver))
+
+
+def read_html(driver: ChromiumPage) -> Response:
+    cookies_json = {cookie.get("name", ""): cookie.get("value", " ") for cookie in driver.cookies()}
+    response = Response(content=driver.html, media_type="text/html")
+    response.headers["cookies"] = json.dumps(cookies_json)
+    response.headers["user_agent"] = driver.user_agent
+    return response
 
 
 # Endpoint to get cookies
 @app.get("/cookies", response_model=CookieResponse)
-async def get_cookies(url: str, retries: int = 5, proxy: str = None):
+async def get_cookies(url: str, retries: int = 5, proxy: str = None, fresh: bool = False):
     if not is_safe_url(url):
         raise HTTPException(status_code=400, detail="Invalid URL")
+
+    # fresh=true skips the cache, for callers whose cookies were just rejected
+    if fresh:
+        cookie_cache.invalidate(url, proxy)
+    elif cached := cookie_cache.get(url, proxy):
+        return cached
+
     try:
-        driver = bypass_cloudflare(url, retries, log, proxy)
-        cookies = {cookie.get("name", ""): cookie.get("value", " ") for cookie in driver.cookies()}
-        user_agent = driver.user_agent
-        driver.quit()
-        return CookieResponse(cookies=cookies, user_agent=user_agent)
+        result = await bypass_queue.run(with_bypassed_page, url, retries, log, proxy, read_cookies, fresh)
+    except Saturated as e:
+        raise saturated_response(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    if "cf_clearance" in result.cookies:
+        cookie_cache.put(url, proxy, result, result.expires_at)
+    return result
+
 
 # Endpoint to get HTML content and cookies
 @app.get("/html")
@@ -137,18 +311,29 @@ async def get_html(url: str, retries: int = 5, proxy: str = None):
     if not is_safe_url(url):
         raise HTTPException(status_code=400, detail="Invalid URL")
     try:
-        driver = bypass_cloudflare(url, retries, log, proxy)
-        html = driver.html
-        cookies_json = {cookie.get("name", ""): cookie.get("value", " ") for cookie in driver.cookies()}
-        response = Response(content=html, media_type="text/html")
-        response.headers["cookies"] = json.dumps(cookies_json)
-        response.headers["user_agent"] = driver.user_agent
-        driver.quit()
-        return response
+        return await bypass_queue.run(with_bypassed_page, url, retries, log, proxy, read_html)
+    except Saturated as e:
+        raise saturated_response(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Endpoint to inspect the browser pool and cookie cache
+@app.get("/pool")
+async def get_pool():
+    return {"browsers": browser_pool.stats(), "cookie_cache": cookie_cache.stats()}
+
+
+# Endpoint with queue depth and bypass latency
+@app.get("/metrics")
+async def get_metrics():
+    return {
+        "bypass": bypass_queue.stats(),
+        "browsers": browser_pool.stats(),
+        "cookie_cache": cookie_cache.stats(),
+    }
+
+
 # Main entry point
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Cloudflare bypass api")
@@ -0,0 +1,115 @@
+"""
+Incremental parser for DeepSeek /chat/completion server-sent events.
+
+Works directly on the raw byte chunks read from the socket. The bulk of a
+stream is `data: {"v":"<text>"}` deltas; those are sliced out of the line
+without running a JSON decoder. Everything else goes through orjson when it is
+installed and falls back to the standard json module.
+"""
+
+import json
+from typing import Any, Dict, List, Optional
+
+try:
+    import orjson
+    _loads = orjson.loads
+    _DecodeError = orjson.JSONDecodeError
+except ImportError:
+    _loads = json.loads
+    _DecodeError = json.JSONDecodeError
+
+DATA_PREFIX  = b'data: '
+_FAST_PREFIX = b'data: {"v":"'
+_FAST_SUFFIX = b'"}'
+_FAST_START  = len(_FAST_PREFIX)
+_FAST_END    = -len(_FAST_SUFFIX)
+
+
+def parse_data_line(line: bytes) -> Optional[Dict[str, Any]]:
+    """Decodes one `data:` line, returns None for other lines and for chunks without a value"""
+    if not line.startswith(DATA_PREFIX):
+        return None
+
+    try:
+        data = _loads(line[len(DATA_PREFIX):])
+    except _DecodeError as e:
+        raise ValueError(f"Invalid JSON in response chunk: {e}") from None
+
+    if isinstance(data, dict) and data.get('v'):
+        return data
+    return None
+
+
+class SSEParser:
+    """
+    Turns a completion stream into events.
+
+    feed() accepts arbitrary byte chunks and returns the events they complete:
+    {'type': 'parent_id', 'next_parent_id': ...} once the answer id is known and
+    {'type': 'content', 'content': ...} for every text delta. The parser keeps
+    no text of its own: callers that need the full answer collect the deltas.
+    """
+
+    def __init__(self):
+        self._pending = b''
+        self._is_append = False
+        self.finished = False
+        self.next_parent_id = None
+
+    def feed(self, chunk: bytes) -> List[Dict[str, Any]]:
+        if self.finished:
+            return []
+
+        lines = (self._pending + chunk).split(b'\n') if self._pending else chunk.split(b'\n')
+        # the last piece is either empty or a line that is still being received
+        self._pending = lines.pop()
+
+        events = []
+        for line in lines:
+            # events are separated by blank lines, skip them before paying for a call
+            if not line or line == b'\r':
+                continue
+            if event := self._line_event(line.rstrip(b'\r')):
+                events.append(event)
+            if self.finished:
+                break
+        return events
+
+    def close(self) -> List[Dict[str, Any]]:
+        """Flushes a trailing line that arrived without a newline"""
+        pending, self._pending = self._pending, b''
+        if pending and not self.finished and (event := self._line_event(pending.rstrip(b'\r'))):
+            return [event]
+        return []
+
+    def _line_event(self, line: bytes) -> Optional[Dict[str, Any]]:
+        if not line:
+            return None
+
+        # fast path for plain {"v":"<text>"} deltas; a quote in the body means more keys
+        # and a backslash means escapes, both need the real decoder
+        if self._is_append and line.startswith(_FAST_PREFIX) and line.endswith(_FAST_SUFFIX):
+            body = line[_FAST_START:_FAST_END]
+            if b'"' not in body and b'\\' not in body:
+                if not body:
+                    return None
+                return {'type': 'content', 'content': body.decode('utf-8')}
+
+        data = parse_data_line(line)
+        if data is None:
+            return None
+
+        value = data['v']
+        if self._is_append:
+            if isinstance(value, str):
+                return {'type': 'content', 'content': value}
+            if data.get('o') == 'BATCH':
+                self.finished = True
+        elif isinstance(value, dict) and value.get('response') is not None:
+            self.next_parent_id = value['response'].get('message_id')
+            return {'type': 'parent_id', 'next_parent_id': self.next_parent_id}
+        elif data.get('o') == 'APPEND':
+            self._is_append = True
+            return {'type': 'content', 'content': value}
+
+        return None
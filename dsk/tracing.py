@@ -0,0 +1,44 @@
+"""
+Stage timing hook for the dsk client.
+
+dsk does not depend on any metrics library: the application installs a
+callback with set_tracer() and receives (stage, seconds) for every timed
+stage. Without a tracer, span() costs one perf_counter call per stage.
+
+Stages: pow_challenge, pow_solve, completion_ttfb, completion_stream.
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+Tracer = Callable[[str, float], None]
+
+_tracer: Optional[Tracer] = None
+
+
+def set_tracer(tracer: Optional[Tracer]) -> None:
+    """Installs the process-wide stage callback, None removes it"""
+    global _tracer
+    _tracer = tracer
+
+
+def record(stage: str, seconds: float) -> None:
+    tracer = _tracer
+    if tracer is None:
+        return
+    try:
+        tracer(stage, seconds)
+    except Exception:
+        # metrics must never break a request
+        pass
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Times the block and reports it, also when it raises"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - started)
@@ -1,12 +1,22 @@
-import json, os
+import asyncio, json, os
 from setup_logger import setup_logger
-from crm.AmoCRM import AmoCRM
+from crm.amocrm import AmoCRM
 from UserBot import UserBot
-from ai.DeepSeek import DeepSeek
+from ai.deepseek import DeepSeek
+from ai.job_queue import AIJobQueue
+from crm.write_behind import CRMQueue
+from crm.lead_index import LeadIndex
+from state_store import SQLiteStateStore
+import metrics
 
 def main():
-    # запуск логов
-    logger = setup_logger("log")
+    # запуск логов: секция logging читается раньше остального конфига,
+    # чтобы всё дальнейшее уже шло через неё (очередь, ротация, json, уровни, сэмплинг)
+    log_config = {}
+    if os.path.isfile("config.json"):
+        with open("config.json", "r", encoding="utf-8") as file:
+            log_config = json.load(file).get("logging", {})
+    logger = setup_logger("log", **log_config)
 
     logger.info("[main] Initialization started...")
     
@@ -24,10 +34,31 @@ def main():
         SUBDOMAIN = config["amocrm"]["subdomain"]
         REDIRECT_URL = config["amocrm"]["redirect_url"]
         PIPLINE_ID = config["amocrm"]["pipline_id"]
+        # изменения сделок копятся и уходят пачками раз в amocrm.flush_seconds
+        CRM_FLUSH_SECONDS = config["amocrm"].get("flush_seconds", 2.0)
+        LEAD_INDEX = config["amocrm"].get("lead_index", "leads.db")
+        STATUS_TTL = config["amocrm"].get("status_ttl", 600)
 
         # deepseek
-        DEEPSEEK_KEY       = config['deepseek_token']
+        # список deepseek_tokens распределяет диалоги по нескольким аккаунтам
+        DEEPSEEK_KEY       = config.get('deepseek_tokens') or config['deepseek_token']
         SYSTEM_PROMPT      = config['system_promt']
+        DEEPSEEK_POOL_SIZE = config.get('deepseek_pool_size', 10)
+        POW_POOL_SIZE      = config.get('pow_pool_size', 4)
+        POW_REFILL_SECONDS = config.get('pow_refill_seconds', 0.5)
+        POW_WORKERS        = config.get('pow_workers', 0)
+        POW_BACKEND        = config.get('pow_backend', 'wasm')
+        SESSION_POOL_SIZE  = config.get('session_pool_size', 2)
+        # сколько привязок сессия -> аккаунт держать в памяти, остальные восстанавливаются из состояния пользователей
+        SESSION_MAP_SIZE   = config.get('session_map_size', 10000)
+        # кэш ответов на первый вопрос, 0 выключает
+        RESPONSE_CACHE_SIZE = config.get('response_cache_size', 0)
+        RESPONSE_CACHE_TTL  = config.get('response_cache_ttl', 3600)
+        # очередь к ии: сколько ответов готовится одновременно и сколько может ждать
+        AI_CONCURRENCY      = config.get('ai_concurrency', 4)
+        AI_QUEUE_DEPTH      = config.get('ai_queue_depth', 200)
+        AI_WAIT_NOTICE      = config.get('ai_wait_notice_seconds', 10)
+        PRIORITY_BUY_SIGNALS = config.get('priority_buy_signals', True)
         
         # telegram
         API_ID             = config['api_id']
@@ -35,6 +66,11 @@ def main():
         SESSION            = config['session_name']
         DEBOUNCE_SECONDS   = config['debounce_seconds']
         INACTIVITY_SECONDS = config['inactivity_seconds']
+        STREAM_REPLIES     = config.get('stream_replies', False)
+        STREAM_EDIT_SECONDS = config.get('stream_edit_seconds', 1.5)
+        STATE_DB           = config.get('state_db', 'users.db')
+        # /metrics для Prometheus, 0 выключает
+        METRICS_PORT       = config.get('metrics_port', 0)
         
     except Exception as e:
         raise ValueError(f"Invalid config.json file format: {str(e)}") from e
@@ -44,12 +80,13 @@ def main():
     # amocrm start
     try:
         logger.info("[main] Connection to AmoCRM...")
-        crm = AmoCRM(CLIENT_ID, CLIENT_SECRET, SUBDOMAIN, REDIRECT_URL, PIPLINE_ID)
+        crm = AmoCRM(CLIENT_ID, CLIENT_SECRET, SUBDOMAIN, REDIRECT_URL, PIPLINE_ID,
+                     lead_index=LeadIndex(LEAD_INDEX), status_ttl=STATUS_TTL)
         
         while not os.path.isfile("refresh_token.txt") or not os.path.isfile("access_token.txt"):
             logger.info("[main] Tokens not found, starting authorization")
             auth_code = input("Enter 20-minute authorization code: ")
-            logger.info(f"[main] User input: {auth_code}")
+            logger.info("[main] User input: %s", auth_code)
             AmoCRM.authorization(auth_code, True)
 
     except Exception as e:
@@ -60,18 +97,33 @@ def main():
     # deepseek start
     try:
         logger.info("[main] Connection to DeepSeek...")
-        deepseek_api = DeepSeek(DEEPSEEK_KEY, SYSTEM_PROMPT)
+        deepseek_api = DeepSeek(
+            DEEPSEEK_KEY,
+            SYSTEM_PROMPT,
+            pool_size=DEEPSEEK_POOL_SIZE,
+            pow_pool_size=POW_POOL_SIZE,
+            pow_refill_interval=POW_REFILL_SECONDS,
+            pow_workers=POW_WORKERS,
+            pow_backend=POW_BACKEND,
+            session_pool_size=SESSION_POOL_SIZE,
+            response_cache_size=RESPONSE_CACHE_SIZE,
+            response_cache_ttl=RESPONSE_CACHE_TTL,
+            session_map_size=SESSION_MAP_SIZE,
+        )
     except Exception as e:
         raise Exception(f"Error connecting to DeepSeek: {str(e)}") from e
     finally:
         logger.info("[main] Connection to DeepSeek completed")
     
+    if METRICS_PORT:
+        metrics.start_server(METRICS_PORT, logger=logger)
+
     logger.info("[main] Initialization completed")
     
     # user bot start
     try:
         logger.info("[main] Connection to Telegram...")
-        UserBot(
+        asyncio.run(UserBot(
             logger=logger,
             api_id=API_ID,
             api_hash=API_HASH,
@@ -79,8 +131,14 @@ def main():
             debounce_seconds=DEBOUNCE_SECONDS,
             inactivity_seconds=INACTIVITY_SECONDS,
             ai=deepseek_api,
-            crm=crm
-        ).start()
+            crm=crm,
+            stream_replies=STREAM_REPLIES,
+            stream_edit_seconds=STREAM_EDIT_SECONDS,
+            store=SQLiteStateStore(STATE_DB, logger=logger),
+            crm_queue=CRMQueue(crm, flush_interval=CRM_FLUSH_SECONDS, logger=logger),
+            jobs=AIJobQueue(AI_CONCURRENCY, AI_QUEUE_DEPTH, AI_WAIT_NOTICE, logger=logger),
+            priority_buy_signals=PRIORITY_BUY_SIGNALS,
+        ).start())
     except Exception as e:
         raise Exception(f"Error connecting to Telegram: {str(e)}") from e
     finally:
@@ -0,0 +1,201 @@
+import bisect
+import http.server
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+import dsk.tracing
+
+# границы корзин в секундах: от быстрых вызовов crm до минутных ответов ии
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+STAGE_HISTOGRAM = "userbot_stage_seconds"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Гистограмма с набором меток; observe потокобезопасен (crm пишет из потоков)"""
+
+    def __init__(self, name: str, help: str, label: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._series: Dict[str, List] = {}  # значение метки -> [counts по корзинам, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, label_value: str, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def quantile(self, label_value: str, q: float) -> Optional[float]:
+        """Оценка квантиля по корзинам, как histogram_quantile в Prometheus; None если наблюдений нет"""
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None or not series[2]:
+                return None
+            counts = list(series[0])
+
+        rank = q * sum(counts)
+        cumulative = 0
+        for i, count in enumerate(counts):
+            if count and cumulative + count >= rank:
+                if i == len(self.buckets):
+                    # выше последней границы оценить нечем
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+
+        for label_value, (counts, total, count) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                labels = ((self.label, label_value), ("le", _number(bound)))
+                lines.append(f"{self.name}_bucket{_labels(labels)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(((self.label, label_value),))} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(((self.label, label_value),))} {count}")
+        return lines
+
+
+class Gauge:
+    """
+    Значение берётся из функции в момент запроса /metrics, хранить и обновлять ничего не нужно.
+    С label функция возвращает {значение метки: число}, например по аккаунтам.
+    """
+
+    def __init__(self, name: str, help: str, read: Callable[[], Union[float, Dict[str, float]]],
+                 label: Optional[str] = None):
+        self.name = name
+        self.help = help
+        self.read = read
+        self.label = label
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        try:
+            value = self.read()
+            if self.label is None:
+                lines.append(f"{self.name} {_number(value)}")
+            else:
+                for label_value, number in sorted(value.items()):
+                    lines.append(f"{self.name}{_labels(((self.label, str(label_value)),))} {_number(number)}")
+        except Exception:
+            # упавший источник не должен ломать весь ответ
+            pass
+        return lines
+
+
+class Registry:
+    """
+    Метрики процесса: длительности этапов ответа (span) и gauge.
+
+    Этапы пишутся в одну гистограмму userbot_stage_seconds с меткой stage:
+    debounce, ai_queue_wait, create_thread, pow_challenge, pow_solve, completion_ttfb,
+    completion_stream, telegram_send, crm_flush, crm_create, crm_update, crm_find.
+    render() отдаёт всё в текстовом формате Prometheus.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.stages = Histogram(STAGE_HISTOGRAM, "Duration of reply stages", "stage", buckets)
+        self._metrics: Dict[str, object] = {STAGE_HISTOGRAM: self.stages}
+
+    def observe(self, stage: str, seconds: float) -> None:
+        self.stages.observe(stage, seconds)
+
+    def quantile(self, stage: str, q: float) -> Optional[float]:
+        return self.stages.quantile(stage, q)
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.observe(stage, time.perf_counter() - started)
+
+    def gauge(self, name: str, help: str, read: Callable[[], Union[float, Dict[str, float]]],
+              label: Optional[str] = None) -> Gauge:
+        """Регистрирует gauge; повторная регистрация с тем же именем заменяет источник"""
+        metric = self._metrics[name] = Gauge(name, help, read, label)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# короткие имена для кода бота
+span = registry.span
+observe = registry.observe
+gauge = registry.gauge
+quantile = registry.quantile
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    registry: Registry = registry
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header("content-type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("content-length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_server(port: int, host: str = "0.0.0.0", logger: Optional[logging.Logger] = None) -> http.server.ThreadingHTTPServer:
+    """
+    Поднимает /metrics в фоновом потоке и подключает этапы dsk (PoW, completion) к гистограмме.
+    """
+    logger = logger or logging.getLogger(__name__)
+    dsk.tracing.set_tracer(registry.observe)
+
+    server = http.server.ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logger.info("[metrics] Serving /metrics on %s:%d", host, server.server_address[1])
+    return server
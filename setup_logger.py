@@ -1,18 +1,130 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import os
+import queue as queue_module
+import threading
+from typing import Dict, Optional, Union
 
-def setup_logger(name: str, get_handler: bool = True, file_handler: bool = True):
+Level = Union[int, str]
+
+FORMAT = "%(asctime)s %(levelname)s %(message)s"
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись — одна строка JSON: время, уровень, логгер, сообщение, исключение"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            data["stack_info"] = self.formatStack(record.stack_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Пропускает одну из every записей для частых сообщений.
+
+    Ключ — начало шаблона сообщения (record.msg до подстановки аргументов),
+    например "[DeepSeek][%s] Attempt". WARNING и выше проходят всегда.
+    """
+
+    def __init__(self, every: Dict[str, int]):
+        super().__init__()
+        self.every = {prefix: max(int(n), 1) for prefix, n in every.items()}
+        self._seen: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.every:
+            return True
+        msg = record.msg if isinstance(record.msg, str) else str(record.msg)
+        for prefix, n in self.every.items():
+            if msg.startswith(prefix):
+                with self._lock:
+                    seen = self._seen.get(prefix, 0)
+                    self._seen[prefix] = seen + 1
+                return seen % n == 0
+        return True
+
+
+def _file_handler(path: str, max_bytes: int, backup_count: int, when: Optional[str]) -> logging.Handler:
+    if when:
+        return logging.handlers.TimedRotatingFileHandler(path, when=when, backupCount=backup_count, encoding="utf-8")
+    if max_bytes:
+        return logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+    return logging.FileHandler(path, mode="w", encoding="utf-8")
+
+
+def setup_logger(name: str,
+                 get_handler: bool = True,
+                 file_handler: bool = True,
+                 queue: bool = True,
+                 max_bytes: int = 0,
+                 backup_count: int = 5,
+                 when: Optional[str] = None,
+                 json_format: bool = False,
+                 level: Level = logging.DEBUG,
+                 levels: Optional[Dict[str, Level]] = None,
+                 sample: Optional[Dict[str, int]] = None,
+                 log_dir: str = "log"):
+    """
+    Логгер приложения.
+
+    queue: вызовы логгера только кладут запись в очередь, а в консоль и файл
+        пишет отдельный поток (QueueListener), так что медленный диск не
+        останавливает event loop. Очередь разбирается до конца при выходе.
+    max_bytes / when: ротация файла по размеру или по времени
+        (when — как у TimedRotatingFileHandler: "midnight", "H", ...),
+        backup_count старых файлов; без них файл перезаписывается при запуске.
+    json_format: одна запись — одна строка JSON.
+    levels: уровни для других логгеров, например {"telethon": "WARNING"};
+        их записи идут в те же консоль и файл.
+    sample: {начало шаблона сообщения: N} — из частых сообщений пишется каждое N-е.
+    """
     logger = logging.getLogger(name)
-    logger.setLevel(logging.DEBUG)
+    logger.setLevel(level)
+
+    formatter = JsonFormatter() if json_format else logging.Formatter(FORMAT)
+    handlers = []
 
     if get_handler:
-        formatter = logging.Formatter("%(asctime)s %(levelname)s %(message)s")
-        logger.addHandler(logging.StreamHandler())
-        logger.handlers[0].setFormatter(formatter)
+        handlers.append(logging.StreamHandler())
 
     if file_handler:
-        file_handler = logging.FileHandler(f"log/{name}.log", mode="w")
-        formatter = logging.Formatter("%(asctime)s %(levelname)s %(message)s")
-        file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
-        
+        os.makedirs(log_dir, exist_ok=True)
+        handlers.append(_file_handler(os.path.join(log_dir, f"{name}.log"), max_bytes, backup_count, when))
+
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    if queue and handlers:
+        records = queue_module.SimpleQueue()
+        listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
+        handlers = [logging.handlers.QueueHandler(records)]
+
+    sampling = SamplingFilter(sample or {})
+    for handler in handlers:
+        handler.addFilter(sampling)
+        logger.addHandler(handler)
+
+    for module, module_level in (levels or {}).items():
+        module_logger = logging.getLogger(module)
+        module_logger.setLevel(module_level)
+        if not module.startswith(name + "."):
+            # чужой логгер не доходит до нашего по иерархии, подключаем те же обработчики
+            for handler in handlers:
+                module_logger.addHandler(handler)
+            module_logger.propagate = False
+
     return logger
@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+Record = Dict[str, Any]  # session_id, next_parent_id, account_id, lead_created
+
+
+class StateStore:
+    """Хранилище состояния пользователей: точечное чтение при первом сообщении и upsert после ответа"""
+
+    def start(self) -> None:
+        pass
+
+    def get(self, user_id: int) -> Optional[Record]:
+        raise NotImplementedError("Subclasses must implement this method")
+
+    def put(self, user_id: int, record: Record) -> None:
+        raise NotImplementedError("Subclasses must implement this method")
+
+    def put_many(self, records: Iterable[Tuple[int, Record]]) -> None:
+        for user_id, record in records:
+            self.put(user_id, record)
+
+    async def flush(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+class SQLiteStateStore(StateStore):
+    """
+    Состояние пользователей в SQLite (WAL).
+
+    put() только кладёт запись в память; фоновая задача раз в commit_interval
+    (или как только набралось max_batch записей) пишет все накопленные
+    изменения одной транзакцией. Несколько изменений одного пользователя между
+    коммитами схлопываются в одно. get() сначала смотрит в ещё не записанные
+    изменения, потом делает чтение по первичному ключу.
+    """
+
+    def __init__(self,
+                 path: str = "users.db",
+                 commit_interval: float = 0.5,
+                 max_batch: int = 500,
+                 logger: Optional[logging.Logger] = None):
+        self.logger: logging.Logger = logger or logging.getLogger(__name__)
+        self.path = path
+        self.commit_interval = commit_interval
+        self.max_batch = max_batch
+
+        # autocommit-режим: транзакции открываем сами, по одной на пачку
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # колонки без типа: next_parent_id приходит числом и должен числом и вернуться
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS users ("
+            "user_id INTEGER PRIMARY KEY, session_id, next_parent_id, account_id, updated_at REAL, lead_created INTEGER)"
+        )
+        # базы, созданные до появления lead_created
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(users)")}
+        if "lead_created" not in columns:
+            self._conn.execute("ALTER TABLE users ADD COLUMN lead_created INTEGER")
+        self._lock = threading.Lock()
+
+        self._pending: Dict[int, Record] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.commits = 0
+        self.rows_written = 0
+        self.last_commit_ms = 0.0
+
+    def start(self) -> None:
+        """Запускает групповой коммит; вызывать из работающего event loop"""
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._commit_loop())
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def get(self, user_id: int) -> Optional[Record]:
+        if (record := self._pending.get(user_id)) is not None:
+            return dict(record)
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT session_id, next_parent_id, account_id, lead_created FROM users WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"session_id": row[0], "next_parent_id": row[1], "account_id": row[2], "lead_created": row[3]}
+
+    def put(self, user_id: int, record: Record) -> None:
+        self._pending[user_id] = dict(record)
+        if len(self._pending) >= self.max_batch and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _commit_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.commit_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.logger.exception("[StateStore] Group commit failed, will retry")
+
+    async def flush(self) -> None:
+        """Пишет все накопленные изменения одной транзакцией"""
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, {}
+        try:
+            await asyncio.to_thread(self._write, batch)
+        except BaseException:
+            # возвращаем несохранённое, не затирая то, что успело обновиться
+            for user_id, record in batch.items():
+                self._pending.setdefault(user_id, record)
+            raise
+
+    def _write(self, batch: Dict[int, Record]) -> None:
+        now = time.time()
+        rows = [
+            (user_id, record.get("session_id"), record.get("next_parent_id"), record.get("account_id"),
+             int(bool(record.get("lead_created"))), now)
+            for user_id, record in batch.items()
+        ]
+
+        start = time.perf_counter()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO users (user_id, session_id, next_parent_id, account_id, lead_created, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(user_id) DO UPDATE SET session_id = excluded.session_id, "
+                    "next_parent_id = excluded.next_parent_id, account_id = excluded.account_id, "
+                    "lead_created = excluded.lead_created, updated_at = excluded.updated_at",
+                    rows,
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        self.commits += 1
+        self.rows_written += len(rows)
+        self.last_commit_ms = (time.perf_counter() - start) * 1000
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        try:
+            await self.flush()
+        finally:
+            with self._lock:
+                self._conn.close()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "pending": len(self._pending),
+            "commits": self.commits,
+            "rows_written": self.rows_written,
+            "last_commit_ms": self.last_commit_ms,
+        }
@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+from dsk.api import AsyncDeepSeekAPI
+from dsk.cookies import CookieManager
+from dsk.errors import AuthenticationError
+
+
+class FixedSolver:
+    async def solve_challenge_async(self, config) -> str:
+        return "pow"
+
+
+def test_pool_stops_challenge_requests_after_401(tmp_path):
+    async def run():
+        api = AsyncDeepSeekAPI(
+            "token",
+            pow_pool_size=2,
+            pow_refill_interval=0.01,
+            pow_solver=FixedSolver(),
+            cookie_manager=CookieManager(tmp_path / "cookies.json"),
+        )
+        challenges = []
+
+        async def make_request(method, endpoint, json_data, pow_required=False):
+            challenges.append(endpoint)
+            raise AuthenticationError("Invalid or expired authentication token")
+
+        api._make_request = make_request
+
+        with pytest.raises(AuthenticationError):
+            await api._solve_pow()
+        await asyncio.sleep(0.1)
+        after_401 = len(challenges)
+        assert api.pow_pool.auth_failed
+
+        for _ in range(5):
+            with pytest.raises(AuthenticationError):
+                await api._solve_pow()
+            await asyncio.sleep(0.02)
+        assert len(challenges) == after_401
+
+        # new cookies: the pool tries again
+        api.cookie_manager.version += 1
+        with pytest.raises(AuthenticationError):
+            await api._solve_pow()
+        await asyncio.sleep(0.1)
+        assert len(challenges) > after_401
+
+        await api.close()
+
+    asyncio.run(run())
@@ -0,0 +1,49 @@
+import asyncio
+
+from dsk.sse import SSEParser
+from UserBot import UserBot, UserState
+
+from benchmarks.bench_sse import FIXTURE, chunked
+from benchmarks.stand_ins import FakeTelegram
+
+
+class FixtureAI:
+    """Отдаёт записанный поток completion_ru.sse и считает, сколько событий уже выдано"""
+
+    def __init__(self):
+        self.given = 0
+        self.total = 0
+
+    async def send_stream(self, message, session_id, parent_id=None):
+        parser = SSEParser()
+        events = []
+        for chunk in chunked(FIXTURE.read_bytes(), 64):
+            events.extend(parser.feed(chunk))
+        events.extend(parser.close())
+        self.total = len(events)
+
+        for event in events:
+            self.given += 1
+            yield event
+            await asyncio.sleep(0)
+
+
+def test_first_sentence_is_sent_before_stream_ends():
+    ai = FixtureAI()
+    sent_at = []
+    telegram = FakeTelegram(on_message=lambda user_id, text, at: sent_at.append((ai.given, text)))
+
+    bot = UserBot.__new__(UserBot)
+    bot.ai = ai
+    bot.client = telegram
+    bot.stream_edit_seconds = 1.5
+
+    entity = FakeTelegram.new_message(1, "").message.peer_id
+    state = UserState(session_id="session", buffer="Здравствуйте")
+    response = asyncio.run(bot.stream_reply(entity, state, state.buffer))
+
+    assert sent_at, "nothing was sent"
+    given, text = sent_at[0]
+    assert given < ai.total
+    assert text.startswith("Привет!")
+    assert response["content"].startswith("Привет! Это Арнольд")
@@ -0,0 +1,113 @@
+import asyncio
+import logging
+import shutil
+from pathlib import Path
+
+from state_store import SQLiteStateStore
+from UserBot import UserBot
+
+from benchmarks.stand_ins import FakeTelegram
+
+REPO = Path(__file__).resolve().parent.parent
+
+
+class CachedAI:
+    """Первый вопрос есть в кэше, первый прогрев сессии падает"""
+
+    retry_policy = None  # send не падает, повторы не нужны
+
+    def __init__(self):
+        self.warmed = []
+        self.cached = 0
+
+    def cached_reply(self, message):
+        self.cached += 1
+        return "Ответ из кэша"
+
+    def remember_reply(self, message, content):
+        pass
+
+    async def warm_thread(self, message):
+        self.warmed.append(message)
+        if len(self.warmed) == 1:
+            raise RuntimeError("warm-up failed")
+        return "session", 1
+
+    async def create_thread(self):
+        raise AssertionError("the failed warm-up should be retried instead")
+
+    async def send(self, message, session_id, parent_id=None):
+        return {"content": "Ответ", "next_parent_id": 2}
+
+    def account_of(self, session_id):
+        return None
+
+    def bind_session(self, session_id, account_id):
+        pass
+
+
+class CRMQueue:
+    def __init__(self):
+        self.created = []
+
+    def create(self, user_id):
+        self.created.append(user_id)
+
+    def update(self, user_id, **fields):
+        pass
+
+
+def test_failed_warm_up_does_not_create_a_second_lead(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    async def run():
+        ai = CachedAI()
+        crm_queue = CRMQueue()
+        bot = UserBot(logger=logging.getLogger("test"), api_id=0, api_hash="", session="test",
+                      debounce_seconds=1, inactivity_seconds=600, ai=ai, crm=None,
+                      store=SQLiteStateStore(":memory:"), crm_queue=crm_queue, client=FakeTelegram())
+        entity = FakeTelegram.new_message(1, "").message.peer_id
+
+        for text in ("Сколько стоит?", "А доставка?"):
+            state = bot.load_user(1)
+            state.buffer = text
+            await bot.debounce_and_reply(entity, 1)
+            if state.warmup_task is not None:
+                await asyncio.gather(state.warmup_task, return_exceptions=True)
+
+        state = bot.users[1]
+        assert crm_queue.created == [1]
+        assert ai.cached == 1
+        assert ai.warmed == ["Сколько стоит?", "Сколько стоит?"]
+        assert state.session_id == "session" and state.lead_created
+        assert bot.state_record(state)["lead_created"]
+
+    asyncio.run(run())
+
+
+def test_migrates_checked_in_users_pickle(tmp_path, monkeypatch):
+    shutil.copy(REPO / "users.pickle", tmp_path / "users.pickle")
+    monkeypatch.chdir(tmp_path)
+    store = SQLiteStateStore(":memory:")
+
+    UserBot(logger=logging.getLogger("test"), api_id=0, api_hash="", session="test",
+            debounce_seconds=1, inactivity_seconds=600, ai=CachedAI(), crm=None,
+            store=store, crm_queue=CRMQueue(), client=FakeTelegram())
+
+    record = store.get(253848239)
+    assert record["session_id"] == "8f07b14e-5bc1-4f0f-b0a4-ddb3bb81fe1c"
+    assert record["next_parent_id"] == 4
+    assert not (tmp_path / "users.pickle").exists()
+    assert (tmp_path / "users.pickle.migrated").exists()
+
+
+def test_unreadable_pickle_is_moved_aside(tmp_path, monkeypatch):
+    (tmp_path / "users.pickle").write_bytes(b"not a pickle")
+    monkeypatch.chdir(tmp_path)
+
+    UserBot(logger=logging.getLogger("test"), api_id=0, api_hash="", session="test",
+            debounce_seconds=1, inactivity_seconds=600, ai=CachedAI(), crm=None,
+            store=SQLiteStateStore(":memory:"), crm_queue=CRMQueue(), client=FakeTelegram())
+
+    assert not (tmp_path / "users.pickle").exists()
+    assert (tmp_path / "users.pickle.failed").exists()
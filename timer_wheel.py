@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set
+
+
+class Timer:
+    __slots__ = ("key", "tick", "callback", "args")
+
+    def __init__(self, key: Hashable, tick: int, callback: Callable, args: tuple):
+        self.key = key
+        self.tick = tick
+        self.callback = callback
+        self.args = args
+
+
+class TimerWheel:
+    """
+    Хэшированное колесо таймеров: один цикл на все отложенные действия вместо задачи на каждого.
+
+    Таймер лежит в слоте `tick % slots` словаря по ключу, поэтому постановка,
+    перестановка и отмена — O(1). Каждый тик цикл забирает созревшие таймеры
+    своего слота (дальние, с тиком на следующих оборотах, остаются) и вызывает
+    их пачкой; корутины запускаются задачами. Точность — один tick.
+    """
+
+    def __init__(self, tick: float = 0.1, slots: int = 1024, logger: Optional[logging.Logger] = None):
+        self.logger: logging.Logger = logger or logging.getLogger(__name__)
+        self.tick = tick
+        self.slots = slots
+
+        self._wheel: List[Dict[Hashable, Timer]] = [{} for _ in range(slots)]
+        self._timers: Dict[Hashable, Timer] = {}
+        # kind -> число таймеров с ключом (kind, ...): метрики читают его из другого потока без обхода словаря
+        self._kinds: Dict[Hashable, int] = {}
+        self._started_at = time.monotonic()
+        self._cursor = 0  # последний обработанный тик
+        self._task: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+
+        self.fired = 0
+        self.cancelled = 0
+        self.max_batch = 0
+
+    def _now_tick(self) -> int:
+        return int((time.monotonic() - self._started_at) / self.tick)
+
+    def __len__(self) -> int:
+        return len(self._timers)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._timers
+
+    def count(self, kind: Hashable) -> int:
+        """Сколько таймеров с ключом вида (kind, ...); O(1), можно звать из потока метрик"""
+        return self._kinds.get(kind, 0)
+
+    @staticmethod
+    def _kind(key: Hashable) -> Optional[Hashable]:
+        return key[0] if isinstance(key, tuple) and key else None
+
+    def _forget(self, key: Hashable) -> None:
+        kind = self._kind(key)
+        if kind is not None:
+            self._kinds[kind] -= 1
+
+    def schedule(self, key: Hashable, delay: float, callback: Callable, *args: Any) -> None:
+        """Ставит таймер; таймер с тем же ключом переносится"""
+        self.cancel(key, count=False)
+        # не раньше следующего тика, иначе таймер попадёт в уже пройденный слот
+        tick = max(self._now_tick() + max(round(delay / self.tick), 1), self._cursor + 1)
+        timer = Timer(key, tick, callback, args)
+        self._timers[key] = timer
+        self._wheel[tick % self.slots][key] = timer
+        kind = self._kind(key)
+        if kind is not None:
+            self._kinds[kind] = self._kinds.get(kind, 0) + 1
+
+    def cancel(self, key: Hashable, count: bool = True) -> bool:
+        timer = self._timers.pop(key, None)
+        if timer is None:
+            return False
+        del self._wheel[timer.tick % self.slots][key]
+        self._forget(key)
+        if count:
+            self.cancelled += 1
+        return True
+
+    def start(self) -> None:
+        """Запускает цикл колеса; вызывать из работающего event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            target = self._now_tick()
+            due: List[Timer] = []
+            # после долгой блокировки цикла догоняем все пропущенные тики, но не больше оборота
+            for tick in range(max(self._cursor + 1, target - self.slots + 1), target + 1):
+                slot = self._wheel[tick % self.slots]
+                if not slot:
+                    continue
+                ripe = [timer for timer in slot.values() if timer.tick <= target]
+                for timer in ripe:
+                    del slot[timer.key]
+                    del self._timers[timer.key]
+                    self._forget(timer.key)
+                due.extend(ripe)
+            self._cursor = max(self._cursor, target)
+
+            if due:
+                self._fire(due)
+
+            next_at = self._started_at + (self._cursor + 1) * self.tick
+            await asyncio.sleep(max(next_at - time.monotonic(), 0))
+
+    def _fire(self, due: List[Timer]) -> None:
+        self.fired += len(due)
+        self.max_batch = max(self.max_batch, len(due))
+        for timer in due:
+            try:
+                result = timer.callback(*timer.args)
+            except Exception:
+                self.logger.exception("[TimerWheel] Timer %s failed", timer.key)
+                continue
+            if asyncio.iscoroutine(result):
+                task = asyncio.create_task(result)
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": len(self._timers),
+            "running": len(self._running),
+            "fired": self.fired,
+            "cancelled": self.cancelled,
+            "max_batch": self.max_batch,
+        }